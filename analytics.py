@@ -0,0 +1,355 @@
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, or_, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import User, Ticket, ArchivedTicket, TicketDailyRollup, AnalyticsWatermark
+from stats import RESOLVED_STATUSES
+
+ROLLUP_WATERMARK = 'ticket_daily_rollups'
+DIMENSIONS = ('category', 'priority', 'assignee')
+UNASSIGNED = 'unassigned'
+
+ACTIVE_STATUSES = ('Open', 'In Progress')
+
+DEFAULT_INTERVAL_SECONDS = 300
+FETCH_BATCH_SIZE = 5000
+INSERT_BATCH_SIZE = 1000
+
+
+def _start_of(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def _resolution_time(status, resolved_at):
+    """When the ticket was resolved or closed, or None while it is open"""
+    if status not in RESOLVED_STATUSES:
+        return None
+    return resolved_at
+
+
+def _rollup_keys(category, priority, assigned_to):
+    return (('all', ''), ('category', category), ('priority', priority),
+            ('assignee', str(assigned_to) if assigned_to else UNASSIGNED))
+
+
+def _percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def _stream(where):
+    """Hot and archived tickets matching where(model), read in batches"""
+    query = union_all(*(select(model.created_at, model.resolved_at, model.status,
+                               model.category, model.priority, model.assigned_to).where(*where(model))
+                        for model in (Ticket, ArchivedTicket)))
+    return db.session.execute(query.execution_options(yield_per=FETCH_BATCH_SIZE))
+
+
+def compute_rollups(start_day, end_day):
+    """Rollup rows for every day from start_day to end_day inclusive.
+
+    The backlog at the start of the window is counted from the tickets that
+    are still open (grouped in SQL) plus those opened earlier but resolved
+    within the window. Only tickets created or resolved within the window
+    are read row by row, from both the hot and the archive tables (archived
+    tickets are never open). Each day's backlog is the previous day's plus the
+    tickets opened, minus those resolved that day.
+    """
+    start, end = _start_of(start_day), _start_of(end_day + timedelta(days=1))
+    backlog = defaultdict(int)  # (dimension, key) -> open tickets
+    opened = defaultdict(int)  # (day, dimension, key) -> count
+    change = defaultdict(int)  # (day, dimension, key) -> backlog change
+    durations = defaultdict(list)  # (day, dimension, key) -> resolution seconds
+
+    still_open = db.session.execute(
+        select(Ticket.category, Ticket.priority, Ticket.assigned_to, func.count(Ticket.id))
+        .where(Ticket.status.in_(ACTIVE_STATUSES), Ticket.created_at < start)
+        .group_by(Ticket.category, Ticket.priority, Ticket.assigned_to)
+    ).all()
+    for category, priority, assigned_to, count in still_open:
+        for key in _rollup_keys(category, priority, assigned_to):
+            backlog[key] += count
+
+    # Resolving a ticket also updates it (updated_at >= resolved_at), so
+    # (status, updated_at) finds the older tickets resolved within the
+    # window; the ones created within it are skipped here and read by the
+    # second query
+    resolved_in_window = _stream(lambda model: (model.status.in_(RESOLVED_STATUSES), model.updated_at >= start))
+    created_in_window = _stream(lambda model: (model.created_at >= start, model.created_at < end))
+
+    for rows, created_before_window in ((resolved_in_window, True), (created_in_window, False)):
+        for row in rows:
+            if (row.created_at < start) != created_before_window:
+                continue
+            resolved_at = _resolution_time(row.status, row.resolved_at)
+            keys = _rollup_keys(row.category, row.priority, row.assigned_to)
+            created_day = row.created_at.date()
+
+            if created_before_window:
+                if resolved_at is None or resolved_at < start:
+                    continue
+                for key in keys:
+                    backlog[key] += 1
+            else:
+                for key in keys:
+                    opened[(created_day,) + key] += 1
+                    change[(created_day,) + key] += 1
+
+            if resolved_at is not None and resolved_at < end:
+                resolved_day = max(resolved_at.date(), created_day)
+                seconds = max(0.0, (resolved_at - row.created_at).total_seconds())
+                for key in keys:
+                    durations[(resolved_day,) + key].append(seconds)
+                    change[(resolved_day,) + key] -= 1
+
+    all_keys = set(backlog) | {entry[1:] for entry in change}
+    rows = []
+    day = start_day
+    while day <= end_day:
+        for key in sorted(all_keys):
+            backlog[key] += change.get((day,) + key, 0)
+            times = sorted(durations.get((day,) + key, ()))
+            count = opened.get((day,) + key, 0)
+            if not (count or times or backlog[key]):
+                continue
+            rows.append(dict(
+                day=day, dimension=key[0], key=key[1], opened=count, resolved=len(times),
+                backlog=backlog[key],
+                median_resolution_seconds=_percentile(times, 0.5) if times else None,
+                p90_resolution_seconds=_percentile(times, 0.9) if times else None,
+            ))
+        day += timedelta(days=1)
+    return rows
+
+
+def _read_watermark():
+    return db.session.execute(select(AnalyticsWatermark.value, AnalyticsWatermark.updated_at)
+                              .where(AnalyticsWatermark.name == ROLLUP_WATERMARK)).first()
+
+
+def _claim_watermark(seen, started_at, first_day, min_interval=None):
+    """Begin the short write transaction that stores a run's rows; False when another run got there first.
+
+    Its first statement writes the watermark row, which holds it (SQLite:
+    the database) until commit, so concurrent runs store their rows one
+    after the other. With min_interval (scheduled runs) the row is only
+    claimed when no other run has written it since seen was read.
+    """
+    if seen is None:
+        try:
+            db.session.execute(insert(AnalyticsWatermark).values(name=ROLLUP_WATERMARK, value=_start_of(first_day),
+                                                                 updated_at=started_at))
+            return True
+        except IntegrityError:
+            # Created by a concurrent run
+            db.session.rollback()
+            if min_interval:
+                return False
+
+    claim = update(AnalyticsWatermark).where(AnalyticsWatermark.name == ROLLUP_WATERMARK) \
+        .values(updated_at=started_at).execution_options(synchronize_session=False)
+    if min_interval and seen is not None:
+        claim = claim.where(AnalyticsWatermark.updated_at == seen.updated_at if seen.updated_at is not None
+                            else AnalyticsWatermark.updated_at.is_(None))
+    return db.session.execute(claim).rowcount == 1
+
+
+def run_rollups(now=None, min_interval=None):
+    """Recompute the daily rollups from the watermark up to today.
+
+    Days before the watermark are final and left alone. Today is still
+    in progress, so the watermark stays at the start of today and the
+    next run recomputes it. The rollups are computed by reads alone; only
+    storing them takes a write transaction (see _claim_watermark), so a
+    long first run does not hold up ticket writes. With min_interval, a
+    run is skipped when another one stored rollups less than that many
+    seconds ago. Returns the number of rollup rows written, or None when
+    skipped.
+    """
+    today = (now or datetime.utcnow()).date()
+    firsts = [db.session.execute(select(func.min(model.created_at))).scalar() for model in (Ticket, ArchivedTicket)]
+    if not any(firsts):
+        return 0
+    first = min(value for value in firsts if value is not None)
+    first_day = min(first.date(), today)
+    seen = _read_watermark()
+    started_at = datetime.utcnow()
+    if min_interval and seen is not None and seen.updated_at is not None \
+            and seen.updated_at > started_at - timedelta(seconds=min_interval):
+        db.session.rollback()
+        return None
+    start_day = min(seen.value.date(), today) if seen is not None else first_day
+
+    rows = compute_rollups(start_day, today)
+    # End the read transaction, so the write below starts a fresh one
+    db.session.rollback()
+
+    if not _claim_watermark(seen, started_at, first_day, min_interval):
+        db.session.rollback()
+        return None
+    db.session.execute(delete(TicketDailyRollup).where(TicketDailyRollup.day >= start_day)
+                       .execution_options(synchronize_session=False))
+    for i in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.session.execute(insert(TicketDailyRollup), rows[i:i + INSERT_BATCH_SIZE])
+    db.session.execute(update(AnalyticsWatermark).where(AnalyticsWatermark.name == ROLLUP_WATERMARK)
+                       .values(value=_start_of(today), updated_at=started_at)
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+    logging.info(f"Ticket rollups updated from {start_day} to {today}: {len(rows)} rows")
+    return len(rows)
+
+
+def reset_rollups():
+    """Drop the rollups and the watermark so the next run starts from the first ticket"""
+    db.session.execute(delete(TicketDailyRollup))
+    db.session.execute(delete(AnalyticsWatermark).where(AnalyticsWatermark.name == ROLLUP_WATERMARK))
+    db.session.commit()
+
+
+# Reading the rollups for the reports page
+
+@dataclass
+class RollupSummary:
+    """Totals of one rollup key over a range of days"""
+    key: str
+    label: str
+    opened: int = 0
+    resolved: int = 0
+    backlog: int = 0
+    # Daily medians / p90s averaged, weighted by tickets resolved each day
+    median_seconds: float = None
+    p90_seconds: float = None
+    _median_total: float = 0.0
+    _p90_total: float = 0.0
+
+    def add(self, row, latest_day):
+        self.opened += row.opened
+        self.resolved += row.resolved
+        if row.day == latest_day:
+            self.backlog = row.backlog
+        if row.resolved:
+            self._median_total += row.median_resolution_seconds * row.resolved
+            self._p90_total += row.p90_resolution_seconds * row.resolved
+            self.median_seconds = self._median_total / self.resolved
+            self.p90_seconds = self._p90_total / self.resolved
+
+    @property
+    def median_hours(self):
+        return self.median_seconds / 3600 if self.median_seconds is not None else None
+
+    @property
+    def p90_hours(self):
+        return self.p90_seconds / 3600 if self.p90_seconds is not None else None
+
+
+@dataclass
+class TicketReport:
+    start_day: object
+    end_day: object
+    computed_until: object = None
+    totals: RollupSummary = None
+    daily: list = field(default_factory=list)
+    by_dimension: dict = field(default_factory=dict)
+
+
+def _assignee_labels(keys):
+    ids = [int(key) for key in keys if key != UNASSIGNED]
+    labels = {UNASSIGNED: 'Unassigned'}
+    if ids:
+        labels.update({str(user_id): f"{first_name} {last_name}" for user_id, first_name, last_name in
+                       db.session.execute(select(User.id, User.first_name, User.last_name)
+                                          .where(User.id.in_(ids))).all()})
+    return labels
+
+
+def build_report(days, today=None):
+    """Summaries for the last `days` days, read only from the rollup tables"""
+    end_day = today or datetime.utcnow().date()
+    start_day = end_day - timedelta(days=days - 1)
+    watermark = db.session.get(AnalyticsWatermark, ROLLUP_WATERMARK)
+    report = TicketReport(start_day, end_day, computed_until=watermark.updated_at if watermark else None)
+
+    rows = db.session.execute(select(TicketDailyRollup)
+                              .where(TicketDailyRollup.day >= start_day, TicketDailyRollup.day <= end_day)
+                              .order_by(TicketDailyRollup.day)).scalars().all()
+    latest_day = max((row.day for row in rows), default=None)
+
+    report.totals = RollupSummary('', 'All tickets')
+    summaries = {dimension: {} for dimension in DIMENSIONS}
+    for row in rows:
+        if row.dimension == 'all':
+            report.totals.add(row, latest_day)
+            daily = RollupSummary(row.day.isoformat(), row.day.strftime('%d %b %Y'))
+            daily.add(row, row.day)
+            report.daily.append(daily)
+        elif row.dimension in summaries:
+            summary = summaries[row.dimension].get(row.key)
+            if summary is None:
+                summary = summaries[row.dimension][row.key] = RollupSummary(row.key, row.key)
+            summary.add(row, latest_day)
+
+    labels = _assignee_labels(summaries['assignee'])
+    for summary in summaries['assignee'].values():
+        summary.label = labels.get(summary.key, f"User #{summary.key}")
+
+    report.daily.reverse()
+    report.by_dimension = {dimension: sorted(values.values(), key=lambda s: (-s.opened, s.label))
+                           for dimension, values in summaries.items()}
+    return report
+
+
+# Keeping the rollups current
+
+class RollupScheduler:
+    """Run run_rollups every interval seconds in a background thread.
+
+    Every process runs one; a process skips its turn when another one
+    stored rollups within the last half interval, so the rollups are
+    recomputed about once per interval however many workers there are.
+    """
+
+    def __init__(self, app, interval_seconds=DEFAULT_INTERVAL_SECONDS):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        while True:
+            with self.app.app_context():
+                try:
+                    run_rollups(min_interval=self.interval_seconds / 2)
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Ticket rollup failed: {e}")
+                finally:
+                    db.session.remove()
+            time.sleep(self.interval_seconds)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='analytics-rollups', daemon=True)
+                self._thread.start()
+
+
+def init_analytics(app):
+    """Refresh the rollups in the background once the first request arrives.
+
+    ANALYTICS_ROLLUP_SECONDS=0 turns this off; run `flask rollup-analytics`
+    from cron instead.
+    """
+    interval = app.config.get('ANALYTICS_ROLLUP_SECONDS', DEFAULT_INTERVAL_SECONDS)
+    if not interval:
+        return
+    scheduler = RollupScheduler(app, interval)
+
+    @app.before_request
+    def start_analytics_rollups():
+        scheduler.start()
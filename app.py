@@ -4,39 +4,208 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from db_routing import RoutingSession, REPLICA_BIND, init_db_routing
+from sqlite_tuning import init_sqlite_tuning
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging; DEBUG logs every request detail and is costly, so opt in with LOG_LEVEL
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
-
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET") or "dev-secret-key-change-in-production"
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure the database - Use SQLite for local development
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///gtn_helpdesk.db"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize the app with the extension
-db.init_app(app)
-
-# Add custom Jinja2 filter for line breaks
-@app.template_filter('nl2br')
-def nl2br_filter(s):
-    """Convert newlines to <br> tags"""
-    return s.replace('\n', '<br>\n') if s else s
-
-with app.app_context():
-    # Make sure to import the models here or their tables won't be created
-    import models  # noqa: F401
-    db.create_all()
-    logging.info("Database tables created")
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
+
+def engine_options(url):
+    """Connection pool settings; sizing options only apply to server databases"""
+    options = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    if not url.startswith("sqlite"):
+        options.update({
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+            "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+            "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        })
+    return options
+
+def load_config(app):
+    """Read the application settings from the environment"""
+    # Configure the database - Use SQLite for local development
+    database_url = os.environ.get("HELPDESK_DATABASE_URL", "sqlite:///gtn_helpdesk.db")
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_url)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Optional read replica for dashboard and search reads
+    replica_url = os.environ.get("HELPDESK_REPLICA_URL")
+    if replica_url:
+        app.config["SQLALCHEMY_BINDS"] = {
+            REPLICA_BIND: {"url": replica_url, **engine_options(replica_url)},
+        }
+
+    # Seconds a client keeps reading from the primary after it writes
+    app.config["DB_STICKY_SECONDS"] = int(os.environ.get("DB_STICKY_SECONDS", 5))
+
+    # Number of tickets per dashboard / API page
+    app.config["TICKETS_PAGE_SIZE"] = int(os.environ.get("TICKETS_PAGE_SIZE", 25))
+
+    # Warn (in debug mode) when a single request runs more queries than this
+    app.config["QUERY_BUDGET"] = int(os.environ.get("QUERY_BUDGET", 20))
+
+    # Seconds a user's role/admin flag may be served from the process cache
+    app.config["AUTH_CACHE_TTL"] = int(os.environ.get("AUTH_CACHE_TTL", 30))
+
+    # Rows fetched per round trip when streaming ticket exports
+    app.config["EXPORT_BATCH_SIZE"] = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+
+    # Upper bound on tickets changed by one bulk operation
+    app.config["BULK_MAX_TICKETS"] = int(os.environ.get("BULK_MAX_TICKETS", 1000))
+
+    # Password hashing cost (werkzeug method string) and the pool size for batch
+    # hashing (seeding); stored hashes made with other parameters are upgraded
+    # on the next login
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+
+    # SQLite production mode: WAL journaling and pragmas applied on connect,
+    # plus an optional in-process queue that serializes and batches writes
+    app.config["SQLITE_TUNING"] = os.environ.get("SQLITE_TUNING", "1") == "1"
+    app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    app.config["SQLITE_CACHE_SIZE_KB"] = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 20000))
+    app.config["SQLITE_MMAP_SIZE"] = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    app.config["SQLITE_WRITE_QUEUE"] = os.environ.get("SQLITE_WRITE_QUEUE", "0") == "1"
+    app.config["SQLITE_WRITE_BATCH_SIZE"] = int(os.environ.get("SQLITE_WRITE_BATCH_SIZE", 50))
+    app.config["SQLITE_WRITE_BATCH_WAIT_MS"] = int(os.environ.get("SQLITE_WRITE_BATCH_WAIT_MS", 2))
+
+    # Rendered page cache: seconds an entry lives, in-process LRU size, and an
+    # optional Redis-compatible server shared by all workers (redis://host:port/db)
+    app.config["PAGE_CACHE_TTL"] = int(os.environ.get("PAGE_CACHE_TTL", 30))
+    app.config["PAGE_CACHE_SIZE"] = int(os.environ.get("PAGE_CACHE_SIZE", 1024))
+    app.config["PAGE_CACHE_URL"] = os.environ.get("PAGE_CACHE_URL")
+
+    # Request/SQL/template metrics served at /metrics, the slow query log
+    # threshold, where admins' ?profile=1 requests write cProfile dumps (unset:
+    # off) and how many of those dumps are kept
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+    app.config["SLOW_QUERY_MS"] = int(os.environ.get("SLOW_QUERY_MS", 200))
+    app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR")
+    app.config["PROFILE_MAX_FILES"] = int(os.environ.get("PROFILE_MAX_FILES", 50))
+
+    # Ticket notifications: events are written to an outbox in the same
+    # transaction and mailed by a background worker with retry/backoff, which
+    # deletes delivered events after OUTBOX_RETENTION_DAYS (0: keep them)
+    app.config["MAIL_SERVER"] = os.environ.get("MAIL_SERVER", "localhost")
+    app.config["MAIL_PORT"] = int(os.environ.get("MAIL_PORT", 1025))
+    app.config["MAIL_FROM"] = os.environ.get("MAIL_FROM", "helpdesk@gtnengineering.com")
+    app.config["OUTBOX_WORKER"] = os.environ.get("OUTBOX_WORKER", "1") == "1"
+    app.config["OUTBOX_BATCH_SIZE"] = int(os.environ.get("OUTBOX_BATCH_SIZE", 50))
+    app.config["OUTBOX_POLL_SECONDS"] = float(os.environ.get("OUTBOX_POLL_SECONDS", 2))
+    app.config["OUTBOX_MAX_ATTEMPTS"] = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", 8))
+    app.config["OUTBOX_BACKOFF_SECONDS"] = float(os.environ.get("OUTBOX_BACKOFF_SECONDS", 10))
+    app.config["OUTBOX_RETENTION_DAYS"] = float(os.environ.get("OUTBOX_RETENTION_DAYS", 7))
+
+    # Seconds between checks of the outbox for live dashboard (SSE) events
+    app.config["LIVE_EVENTS_POLL_SECONDS"] = float(os.environ.get("LIVE_EVENTS_POLL_SECONDS", 1))
+    # Seconds before a live event stream ends and the browser reconnects, and
+    # the most streams one process serves at once (each holds a worker thread)
+    app.config["LIVE_EVENTS_STREAM_SECONDS"] = float(os.environ.get("LIVE_EVENTS_STREAM_SECONDS", 45))
+    app.config["LIVE_EVENTS_MAX_STREAMS"] = int(os.environ.get("LIVE_EVENTS_MAX_STREAMS", 16))
+
+    # Automatic routing of new tickets to the least-loaded admin: category ->
+    # departments rules as JSON ({"Hardware": ["IT Hardware"]}, unset: built-in
+    # rules) and seconds between reloads of the per-admin load counts
+    app.config["AUTO_ASSIGN"] = os.environ.get("AUTO_ASSIGN", "1") == "1"
+    app.config["ROUTING_RULES"] = os.environ.get("ROUTING_RULES")
+    app.config["ROUTING_REFRESH_SECONDS"] = float(os.environ.get("ROUTING_REFRESH_SECONDS", 30))
+
+    # Seconds between background updates of the daily analytics rollups
+    # behind the reports page (0: only via `flask rollup-analytics`)
+    app.config["ANALYTICS_ROLLUP_SECONDS"] = int(os.environ.get("ANALYTICS_ROLLUP_SECONDS", 300))
+
+    # `flask archive-tickets`: move tickets resolved or closed this many days
+    # ago (and their comments) to the archive tables, this many per transaction
+    app.config["ARCHIVE_AFTER_DAYS"] = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+    app.config["ARCHIVE_BATCH_SIZE"] = int(os.environ.get("ARCHIVE_BATCH_SIZE", 500))
+
+    # Near-duplicate detection for new tickets: link a new ticket to an open
+    # ticket from the last DUPLICATE_WINDOW_DAYS whose title and description
+    # score at least DUPLICATE_THRESHOLD (0-1) against it; the in-memory index
+    # picks up tickets from other workers every DUPLICATE_REFRESH_SECONDS
+    app.config["DUPLICATE_DETECTION"] = os.environ.get("DUPLICATE_DETECTION", "1") == "1"
+    app.config["DUPLICATE_THRESHOLD"] = float(os.environ.get("DUPLICATE_THRESHOLD", 0.55))
+    app.config["DUPLICATE_WINDOW_DAYS"] = int(os.environ.get("DUPLICATE_WINDOW_DAYS", 14))
+    app.config["DUPLICATE_REFRESH_SECONDS"] = float(os.environ.get("DUPLICATE_REFRESH_SECONDS", 10))
+
+    # Profile images: where they are stored (default: instance/avatars), the
+    # largest upload accepted in bytes and the side of the square thumbnails
+    app.config["AVATAR_DIR"] = os.environ.get("AVATAR_DIR")
+    app.config["AVATAR_MAX_BYTES"] = int(os.environ.get("AVATAR_MAX_BYTES", 5 * 1024 * 1024))
+    app.config["AVATAR_THUMBNAIL_SIZE"] = int(os.environ.get("AVATAR_THUMBNAIL_SIZE", 128))
+
+    # Most tickets, and most comments, accepted in one POST /api/ingest batch
+    app.config["INGEST_MAX_BATCH"] = int(os.environ.get("INGEST_MAX_BATCH", 1000))
+
+def create_app(config=None):
+    """Create and configure the application.
+
+    Does no database work: run `flask init-db` and `flask seed` to create
+    the schema and the default accounts.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET") or "dev-secret-key-change-in-production"
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    load_config(app)
+    if config:
+        app.config.update(config)
+        if "SQLALCHEMY_DATABASE_URI" in config and "SQLALCHEMY_ENGINE_OPTIONS" not in config:
+            app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(config["SQLALCHEMY_DATABASE_URI"])
+
+    init_sqlite_tuning(app)
+
+    # Initialize the app with the extension
+    db.init_app(app)
+
+    # Add custom Jinja2 filter for line breaks
+    @app.template_filter('nl2br')
+    def nl2br_filter(s):
+        """Convert newlines to <br> tags"""
+        return s.replace('\n', '<br>\n') if s else s
+
+    # Request hooks: metrics, query budget, primary stickiness after writes,
+    # the SQLite write queue, the rendered page cache, the outbox worker,
+    # the live event feed, the ticket routing load tracker, the
+    # analytics rollup refresher and the duplicate ticket index; then the
+    # profile image store
+    from instrumentation import init_instrumentation
+    from loading import init_query_counter
+    from write_queue import init_write_queue
+    from page_cache import init_page_cache
+    from notifications import init_notifications
+    from live_events import init_live_events
+    from routing import init_routing
+    from analytics import init_analytics
+    from duplicates import init_duplicates
+    from avatars import init_avatars
+    init_instrumentation(app)
+    init_query_counter(app)
+    init_db_routing(app)
+    init_write_queue(app)
+    init_page_cache(app)
+    init_notifications(app)
+    init_live_events(app)
+    init_routing(app)
+    init_analytics(app)
+    init_duplicates(app)
+    init_avatars(app)
+
+    # Views and CLI commands are imported here so that importing this module
+    # (models, scripts, benchmarks) does not pull in forms, exports and routes
+    from routes import bp
+    app.register_blueprint(bp)
+
+    from commands import register_commands
+    register_commands(app)
+
+    return app
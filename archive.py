@@ -0,0 +1,136 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, exists, func, insert, literal, select
+from app import db
+from models import Ticket, TicketComment, ArchivedTicket, ArchivedTicketComment, OutboxEvent
+
+ARCHIVABLE_STATUSES = ('Resolved', 'Closed')
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 180
+DEFAULT_BATCH_SIZE = 500
+
+# Columns copied as-is; the archive tables mirror the hot ones plus archived_at
+TICKET_COLUMNS = [column.name for column in Ticket.__table__.columns]
+COMMENT_COLUMNS = [column.name for column in TicketComment.__table__.columns]
+
+
+@dataclass
+class ArchiveResult:
+    tickets: int = 0
+    comments: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    # Hot-table sizes and scan timings before and after the run
+    before: dict = field(default_factory=dict)
+    after: dict = field(default_factory=dict)
+
+
+def _archivable_query(cutoff):
+    """Ids of tickets that can be archived: resolved or closed before cutoff.
+
+    Skips tickets with notifications the outbox worker will still retry
+    (it gives up after OUTBOX_MAX_ATTEMPTS), and the newest ticket and
+    comment: SQLite hands out max(id) + 1 for new rows, so archiving them
+    would let the next insert reuse an id that is already in the archive.
+    """
+    newest_ticket = select(func.max(Ticket.id)).scalar_subquery()
+    newest_comment_ticket = select(TicketComment.ticket_id) \
+        .order_by(TicketComment.id.desc()).limit(1).scalar_subquery()
+    pending_events = exists().where(OutboxEvent.ticket_id == Ticket.id, OutboxEvent.sent_at.is_(None),
+                                    OutboxEvent.attempts < current_app.config['OUTBOX_MAX_ATTEMPTS'])
+
+    return select(Ticket.id).where(Ticket.status.in_(ARCHIVABLE_STATUSES), Ticket.updated_at < cutoff,
+                                   Ticket.id < newest_ticket, Ticket.id != func.coalesce(newest_comment_ticket, 0),
+                                   ~pending_events)
+
+
+def _archivable_ids(cutoff, limit):
+    """Next batch of archivable tickets"""
+    return db.session.execute(_archivable_query(cutoff).order_by(Ticket.id).limit(limit)).scalars().all()
+
+
+def archive_batch(ticket_ids, now=None):
+    """Move tickets and their comments to the archive tables in one transaction.
+
+    Copies are inserted before the hot rows are deleted, which is what
+    keeps the search index entries (see search.SQLITE_SETUP). Delivered
+    and abandoned outbox events for the tickets are dropped with them.
+    Returns the number of comments moved.
+    """
+    now = now or datetime.utcnow()
+    db.session.execute(insert(ArchivedTicket).from_select(
+        TICKET_COLUMNS + ['archived_at'],
+        select(*[Ticket.__table__.c[name] for name in TICKET_COLUMNS], literal(now, db.DateTime))
+        .where(Ticket.id.in_(ticket_ids))
+    ))
+    db.session.execute(insert(ArchivedTicketComment).from_select(
+        COMMENT_COLUMNS,
+        select(*[TicketComment.__table__.c[name] for name in COMMENT_COLUMNS])
+        .where(TicketComment.ticket_id.in_(ticket_ids))
+    ))
+    db.session.execute(delete(OutboxEvent).where(OutboxEvent.ticket_id.in_(ticket_ids))
+                       .execution_options(synchronize_session=False))
+    comments = db.session.execute(delete(TicketComment).where(TicketComment.ticket_id.in_(ticket_ids))
+                                  .execution_options(synchronize_session=False)).rowcount
+    db.session.execute(delete(Ticket).where(Ticket.id.in_(ticket_ids))
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+    return comments
+
+
+def _best_time_ms(work, runs=3):
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        value = work()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return value, best
+
+
+def measure_hot_tables():
+    """Row counts of the hot tables and the time of the dashboards' full-table scans"""
+    from stats import get_system_stats
+
+    tickets, stats_ms = _best_time_ms(lambda: get_system_stats().total_tickets)
+    comments, comments_ms = _best_time_ms(
+        lambda: db.session.execute(select(func.count(TicketComment.id))).scalar())
+    return {'tickets': tickets, 'comments': comments, 'stats_ms': stats_ms, 'comment_count_ms': comments_ms}
+
+
+def archive_tickets(older_than_days=DEFAULT_ARCHIVE_AFTER_DAYS, batch_size=DEFAULT_BATCH_SIZE, measure=True):
+    """Archive every ticket resolved or closed more than older_than_days ago, batch by batch"""
+    result = ArchiveResult()
+    if measure:
+        result.before = measure_hot_tables()
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    started = time.perf_counter()
+    while True:
+        ticket_ids = _archivable_ids(cutoff, batch_size)
+        if not ticket_ids:
+            break
+        result.comments += archive_batch(ticket_ids)
+        result.tickets += len(ticket_ids)
+        result.batches += 1
+    result.elapsed = time.perf_counter() - started
+
+    logging.info(f"Archived {result.tickets} tickets and {result.comments} comments "
+                 f"in {result.batches} batches ({result.elapsed:.1f}s)")
+    if measure:
+        result.after = measure_hot_tables()
+    return result
+
+
+def count_archivable(older_than_days=DEFAULT_ARCHIVE_AFTER_DAYS):
+    """How many tickets archive_tickets would move now (the same selection, counted)"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    return db.session.execute(select(func.count()).select_from(_archivable_query(cutoff).subquery())).scalar()
+
+
+def find_ticket(ticket_id):
+    """The ticket with this id from the hot table, or else from the archive"""
+    return db.session.get(Ticket, ticket_id) or db.session.get(ArchivedTicket, ticket_id)
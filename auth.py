@@ -0,0 +1,119 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+from flask import current_app, flash, g, jsonify, redirect, request, session, url_for
+from app import db
+from sqlalchemy import select
+from models import User, ApiToken
+
+DEFAULT_AUTH_CACHE_TTL = 30
+
+AuthInfo = namedtuple('AuthInfo', ['user_id', 'role', 'is_admin'])
+
+# user id -> (expires_at, AuthInfo), shared by the requests of this process
+_auth_cache = {}
+_auth_cache_lock = threading.Lock()
+
+
+def is_logged_in():
+    return 'user_id' in session
+
+
+def get_current_user():
+    """Return the logged-in user, loading it at most once per request"""
+    if 'current_user' not in g:
+        g.current_user = db.session.get(User, session['user_id']) if is_logged_in() else None
+    return g.current_user
+
+
+def get_auth_info():
+    """Role and admin flag of the logged-in user.
+
+    Served from the per-request user when it is already loaded, otherwise
+    from a short-lived process cache (AUTH_CACHE_TTL seconds), so access
+    checks on routes that never touch the user cost no query.
+    """
+    if not is_logged_in():
+        return None
+
+    user_id = session['user_id']
+    if g.get('current_user') is not None:
+        user = g.current_user
+        return AuthInfo(user.id, user.role, user.is_admin)
+
+    ttl = current_app.config.get('AUTH_CACHE_TTL', DEFAULT_AUTH_CACHE_TTL)
+    now = time.monotonic()
+    with _auth_cache_lock:
+        cached = _auth_cache.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    # Cache miss: load the user for the rest of the request as well
+    user = get_current_user()
+    info = AuthInfo(user.id, user.role, bool(user.is_admin)) if user else None
+    if info and ttl > 0:
+        with _auth_cache_lock:
+            _auth_cache[user_id] = (now + ttl, info)
+    return info
+
+
+def invalidate_user(user_id):
+    """Drop cached auth data for a user after their profile or role changes"""
+    with _auth_cache_lock:
+        _auth_cache.pop(user_id, None)
+    if g.get('current_user') is not None and g.current_user.id == user_id:
+        g.pop('current_user')
+
+
+def login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_logged_in():
+            flash('Please log in to access this page.', 'warning')
+            return redirect(url_for('main.user_login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_logged_in():
+            flash('Please log in to access this page.', 'warning')
+            return redirect(url_for('main.admin_login'))
+        info = get_auth_info()
+        if not info or not info.is_admin:
+            flash('Admin access required.', 'error')
+            return redirect(url_for('main.index'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def hash_token(token):
+    """API tokens are stored only as their SHA-256"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def find_api_token(token):
+    """The active (not revoked) ApiToken for a bearer token, or None"""
+    if not token:
+        return None
+    return db.session.execute(select(ApiToken).where(ApiToken.token_hash == hash_token(token),
+                                                     ApiToken.revoked_at.is_(None))).scalar()
+
+
+def api_token_required(f):
+    """For JSON API routes: needs an Authorization: Bearer <token> header; sets g.api_token"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        api_token = find_api_token(token.strip()) if scheme.lower() == 'bearer' else None
+        if api_token is None:
+            response = jsonify({'error': 'A valid API token is required'})
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response, 401
+        g.api_token = api_token
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,256 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from flask import abort, send_file, url_for
+from sqlalchemy import select
+from app import db
+from models import User
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_THUMBNAIL_SIZE = 128
+CHUNK_SIZE = 64 * 1024
+# Images are named by their content, so a URL never changes meaning
+CACHE_SECONDS = 365 * 24 * 3600
+# Larger images are refused by thumbnail generation (decompression bombs)
+MAX_PIXELS = 40_000_000
+# Leading bytes read before an upload's type is checked
+SIGNATURE_BYTES = 16
+# Pruning leaves images this recent alone: their owner's row may not be committed yet
+PRUNE_GRACE_SECONDS = 3600
+
+# Leading bytes of the image types accepted as profile images
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+_DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+
+
+class ImageUploadError(Exception):
+    """Upload refused; the message is shown to the user"""
+
+
+def image_type(head):
+    """MIME type from the first bytes of a file, or None when it is not an accepted image"""
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def is_image_key(value):
+    """Whether a User.profile_image value names a stored image (older rows hold bare filenames)"""
+    return bool(value) and _DIGEST_RE.fullmatch(value) is not None
+
+
+def thumbnails_available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ImageStore:
+    """Content-addressed image files under root.
+
+    Each image is stored once as images/<2 hex>/<sha256>, however many users
+    upload it, and its square thumbnail as thumbs-<size>/<2 hex>/<sha256>.
+    Uploads are copied to a temporary file chunk by chunk while they are
+    hashed and renamed into place, so a partial or oversized upload never
+    becomes visible. Thumbnails need Pillow; without it the original is
+    served in their place.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, thumbnail_size=DEFAULT_THUMBNAIL_SIZE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self._lock = threading.Lock()
+
+    def path(self, digest):
+        return os.path.join(self.root, 'images', digest[:2], digest)
+
+    def thumbnail_path(self, digest):
+        return os.path.join(self.root, f"thumbs-{self.thumbnail_size}", digest[:2], digest)
+
+    def _temporary_file(self):
+        directory = os.path.join(self.root, 'tmp')
+        os.makedirs(directory, exist_ok=True)
+        return tempfile.mkstemp(dir=directory)
+
+    def _write(self, path, data):
+        fd, temporary = self._temporary_file()
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(data)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+
+    def save(self, stream):
+        """Store an uploaded image and its thumbnail; returns its sha256 hex digest"""
+        fd, temporary = self._temporary_file()
+        hasher = hashlib.sha256()
+        size = 0
+        head = b''
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    # Streams may return fewer bytes than asked for; check the type once the head is complete
+                    if len(head) < SIGNATURE_BYTES:
+                        head += chunk[:SIGNATURE_BYTES - len(head)]
+                        if len(head) == SIGNATURE_BYTES and image_type(head) is None:
+                            raise ImageUploadError('Upload a PNG, JPEG, GIF or WebP image.')
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageUploadError(f"Images can be at most {self.max_bytes // 1024} KB.")
+                    hasher.update(chunk)
+                    out.write(chunk)
+            if size == 0:
+                raise ImageUploadError('The uploaded file is empty.')
+            if image_type(head) is None:
+                raise ImageUploadError('Upload a PNG, JPEG, GIF or WebP image.')
+
+            digest = hasher.hexdigest()
+            path = self.path(digest)
+            created = not os.path.exists(path)
+            if created:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temporary, path)
+            else:
+                # Counts as new for prune_images' grace period
+                os.utime(path)
+        finally:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+
+        if thumbnails_available() and self.thumbnail(digest) is None:
+            if created:
+                os.unlink(path)
+            raise ImageUploadError('The uploaded file is not a readable image.')
+        return digest
+
+    def thumbnail(self, digest):
+        """Path of the image's thumbnail, made on first use; None if it cannot be made"""
+        path = self.thumbnail_path(digest)
+        if os.path.exists(path):
+            return path
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:
+            return None
+
+        with self._lock:
+            if os.path.exists(path):
+                return path
+            size = (self.thumbnail_size, self.thumbnail_size)
+            try:
+                with Image.open(self.path(digest)) as image:
+                    if image.width * image.height > MAX_PIXELS:
+                        raise ValueError(f"{image.width}x{image.height} image is too large")
+                    image.draft('RGB', size)
+                    image = ImageOps.fit(ImageOps.exif_transpose(image), size, Image.LANCZOS)
+                    transparent = image.mode in ('RGBA', 'LA', 'P')
+                    image = image.convert('RGBA' if transparent else 'RGB')
+                    data = io.BytesIO()
+                    if transparent:
+                        image.save(data, 'PNG', optimize=True)
+                    else:
+                        image.save(data, 'JPEG', quality=85, optimize=True)
+                self._write(path, data.getvalue())
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                logging.warning(f"Cannot make a thumbnail of image {digest}: {e}")
+                return None
+        return path
+
+    def stored(self, older_than=None):
+        """Digests of every stored image, or of those last saved more than older_than seconds ago"""
+        images = os.path.join(self.root, 'images')
+        if not os.path.isdir(images):
+            return set()
+        digests = {name for prefix in os.listdir(images)
+                   for name in os.listdir(os.path.join(images, prefix)) if _DIGEST_RE.fullmatch(name)}
+        if older_than is not None:
+            cutoff = time.time() - older_than
+            digests = {digest for digest in digests if os.path.getmtime(self.path(digest)) < cutoff}
+        return digests
+
+    def delete(self, digest):
+        for path in (self.path(digest), self.thumbnail_path(digest)):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+_store = None
+
+
+def init_avatars(app):
+    """Create the profile image store (AVATAR_DIR) and the avatar_url template helper"""
+    global _store
+    root = app.config.get('AVATAR_DIR') or os.path.join(app.instance_path, 'avatars')
+    _store = ImageStore(root, app.config.get('AVATAR_MAX_BYTES', DEFAULT_MAX_BYTES),
+                        app.config.get('AVATAR_THUMBNAIL_SIZE', DEFAULT_THUMBNAIL_SIZE))
+    if not thumbnails_available():
+        logging.info("Pillow is not installed; profile images are served without thumbnails")
+    app.add_template_global(avatar_url)
+
+
+def get_store():
+    return _store
+
+
+def avatar_url(user, thumbnail=True):
+    """URL of a user's profile image (its thumbnail by default), or None when they have none"""
+    if user is None or not is_image_key(user.profile_image):
+        return None
+    return url_for('main.avatar', digest=user.profile_image, variant='thumb' if thumbnail else 'full')
+
+
+def send_image(digest, thumbnail=True):
+    """Response for a stored image, cacheable for a year and answered with 304 on a matching ETag"""
+    if not _DIGEST_RE.fullmatch(digest):
+        abort(404)
+    path = _store.thumbnail(digest) if thumbnail else None
+    variant = 'thumb' if path else 'full'
+    path = path or _store.path(digest)
+    if not os.path.exists(path):
+        abort(404)
+    with open(path, 'rb') as image:
+        mimetype = image_type(image.read(16)) or 'application/octet-stream'
+
+    response = send_file(path, mimetype=mimetype, max_age=CACHE_SECONDS, conditional=True,
+                         etag=f"{digest}-{variant}")
+    # Only signed-in users fetch them, so shared caches must not keep them
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
+def prune_images(grace_seconds=PRUNE_GRACE_SECONDS):
+    """Delete stored images no user has as their profile image any more; returns how many.
+
+    Images saved in the last grace_seconds are kept, since the upload that
+    saved them may not have committed its user row yet.
+    """
+    candidates = _store.stored(older_than=grace_seconds)
+    in_use = set(db.session.execute(select(User.profile_image).where(User.profile_image.isnot(None))).scalars())
+    unused = candidates - in_use
+    for digest in unused:
+        _store.delete(digest)
+    return len(unused)
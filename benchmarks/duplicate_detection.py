@@ -0,0 +1,169 @@
+"""Measure near-duplicate detection for new tickets against a large open backlog.
+
+Usage:
+    python benchmarks/duplicate_detection.py [--open-tickets 100000] [--lookups 2000]
+                                             [--threshold 0.55] [--seed 42]
+
+Creates a temporary SQLite database and fills it with open tickets
+created over the last week (as many as --open-tickets says). Their
+titles and descriptions are generated the same way seed_data.py makes
+them. It then builds the app's DuplicateDetector from that database, as
+a worker does at startup. It then submits --lookups new tickets: half are
+reworded copies of indexed tickets (synonyms swapped, words dropped and
+reordered), half describe unrelated requests. Each lookup is the same
+call create_ticket makes, including the query that checks the matches
+are still open.
+
+Reports the index build time and size, the lookup time (p50/p99), and
+how many of each kind of submission were linked to an open ticket.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Rewordings a user might type for the same problem
+REWORDINGS = [('not working', 'down'), ('Wi-Fi', 'wireless'), ('Internet', 'network'),
+              ('very slow', 'sluggish'), ('cannot log in', 'password not accepted'),
+              ('keeps disconnecting', 'disconnects'), ('Laptop', 'notebook'), ('Desktop', 'PC')]
+# Vocabulary the generated tickets never use
+UNRELATED = ['ergonomic', 'chair', 'canteen', 'parking', 'badge', 'visitor', 'courier', 'invoice', 'travel',
+             'booking', 'stationery', 'shredder', 'whiteboard', 'air', 'conditioning', 'locker', 'uniform',
+             'library', 'training', 'calendar', 'budget', 'approval', 'furniture', 'camera', 'license']
+
+
+def _insert_open_tickets(count, rng):
+    from sqlalchemy import insert
+    from app import db
+    from models import Ticket, User
+    from seed_data import CATEGORIES, _ticket_text
+
+    requester = db.session.query(User.id).first()[0]
+    now = datetime.utcnow()
+    texts = []
+    batch = []
+    for _ in range(count):
+        category = rng.choice(CATEGORIES)
+        title, description = _ticket_text(rng, category)
+        texts.append((title, description))
+        created_at = now - timedelta(seconds=rng.uniform(0, 7 * 86400))
+        batch.append(dict(title=title, description=description, category=category, priority='Medium',
+                          status='Open', user_id=requester, user_name='Load Test',
+                          created_at=created_at, updated_at=created_at))
+        if len(batch) >= 10000:
+            db.session.execute(insert(Ticket), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Ticket), batch)
+    db.session.commit()
+    return texts
+
+
+def _reword(rng, title, description):
+    for old, new in REWORDINGS:
+        if old in title and rng.random() < 0.7:
+            title = title.replace(old, new)
+            description = description.replace(old.lower(), new.lower())
+    words = title.split()
+    if len(words) > 4 and rng.random() < 0.5:
+        del words[rng.randrange(1, len(words))]
+    # Users rarely write the same sentence twice; keep the first one only
+    return ' '.join(words), description.split('. ')[0]
+
+
+def _unrelated(rng):
+    title = ' '.join(rng.sample(UNRELATED, 4)).capitalize()
+    return title, f"Request about {' '.join(rng.sample(UNRELATED, 6))} for the team."
+
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+def run(open_tickets, lookups, threshold, seed):
+    from duplicates import DuplicateDetector
+
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    texts = _insert_open_tickets(open_tickets, rng)
+    insert_time = time.perf_counter() - started
+
+    rss_before = _rss_mb()
+    detector = DuplicateDetector()
+    started = time.perf_counter()
+    detector.build()
+    build_time = time.perf_counter() - started
+    rss_after = _rss_mb()
+
+    results = {'reworded': [], 'unrelated': []}
+    times = {'reworded': [], 'unrelated': []}
+    for n in range(lookups):
+        kind = 'reworded' if n % 2 == 0 else 'unrelated'
+        title, description = _reword(rng, *rng.choice(texts)) if kind == 'reworded' else _unrelated(rng)
+        started = time.perf_counter()
+        matches = detector.find(title, description, limit=1, threshold=threshold)
+        times[kind].append(time.perf_counter() - started)
+        results[kind].append(bool(matches))
+
+    return {
+        'insert_time': insert_time,
+        'build_time': build_time,
+        'indexed': len(detector.index),
+        'memory_mb': rss_after - rss_before if rss_before is not None else None,
+        'times': times,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--open-tickets', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--threshold', type=float, default=0.55, help='similarity needed to link (0-1)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HELPDESK_DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'duplicates.db')}"
+        from app import create_app
+        from migrations import init_database
+        from seed import create_default_admin
+        app = create_app({'OUTBOX_WORKER': False, 'ANALYTICS_ROLLUP_SECONDS': 0})
+        with app.app_context():
+            init_database()
+            create_default_admin()
+            result = run(args.open_tickets, args.lookups, args.threshold, args.seed)
+
+    memory = f"  (~{result['memory_mb']:.0f} MB)" if result['memory_mb'] is not None else ''
+    print(f"open tickets: {result['indexed']} indexed in {result['build_time']:.1f}s{memory}  "
+          f"(inserted in {result['insert_time']:.1f}s)")
+    all_times = result['times']['reworded'] + result['times']['unrelated']
+    print(f"lookup: p50 {_quantile(all_times, 0.5) * 1000:.2f}ms  p99 {_quantile(all_times, 0.99) * 1000:.2f}ms  "
+          f"mean {statistics.mean(all_times) * 1000:.2f}ms over {len(all_times)} submissions")
+    for kind, linked in result['results'].items():
+        times = result['times'][kind]
+        print(f"{kind:<10} linked {sum(linked):>5} of {len(linked):<5} ({sum(linked) / len(linked):.0%})  "
+              f"p50 {_quantile(times, 0.5) * 1000:.2f}ms  p99 {_quantile(times, 0.99) * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Measure sustained ticket ingestion through POST /api/ingest.
+
+Usage:
+    python benchmarks/ingest_throughput.py [--tickets 50000] [--batch-size 500]
+                                           [--comments-per-batch 100] [--write-queue] [--no-duplicates]
+                                           [--single 2000] [--seed 42]
+
+Creates a temporary SQLite database with the seeded users and an API token
+for the super admin, then posts --tickets generated tickets (the same
+titles and descriptions as seed_data.py) in batches of --batch-size, each
+with --comments-per-batch comments on tickets of the same batch, through
+the Flask test client: token check, validation, routing, duplicate
+linking, outbox events and the single bulk transaction all run as in
+production. Every item carries an idempotency key, and each batch is sent
+a second time to check that retries create nothing.
+
+Reports sustained tickets per second, batch latency (p50/p99) and the
+cost of the retried batches. For comparison, --single posts that many
+more tickets one per request. The generated tickets come from a few
+templates, so nearly all of them are linked as duplicates, which is the
+most expensive case for detection; --no-duplicates turns detection off
+to show the cost of the rest of the path.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _batches(count, batch_size, comments_per_batch, rng, prefix='alert'):
+    from seed_data import CATEGORIES, _ticket_text
+
+    priorities = ['Low', 'Medium', 'High', 'Critical']
+    for start in range(0, count, batch_size):
+        tickets = []
+        for n in range(start, min(count, start + batch_size)):
+            category = rng.choice(CATEGORIES)
+            title, description = _ticket_text(rng, category)
+            tickets.append({'title': title, 'description': description, 'category': category,
+                            'priority': rng.choice(priorities), 'system_name': f"HOST-{n % 500:03d}",
+                            'idempotency_key': f"{prefix}-{n}"})
+        comments = [{'ticket_key': rng.choice(tickets)['idempotency_key'],
+                     'comment': f"Monitoring update {n}: condition still present.",
+                     'idempotency_key': f"{prefix}-update-{start}-{n}"}
+                    for n in range(comments_per_batch)]
+        yield {'tickets': tickets, 'comments': comments}
+
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(app, token, tickets, batch_size, comments_per_batch, seed):
+    from sqlalchemy import func, select
+    from app import db
+    from models import Ticket, TicketComment, OutboxEvent
+
+    client = app.test_client()
+    headers = {'Authorization': f"Bearer {token}"}
+    rng = random.Random(seed)
+    latencies = []
+    retry_latencies = []
+    created = {'tickets': 0, 'comments': 0}
+    recreated = 0
+
+    started = time.perf_counter()
+    for batch in _batches(tickets, batch_size, comments_per_batch, rng):
+        sent = time.perf_counter()
+        response = client.post('/api/ingest', json=batch, headers=headers)
+        latencies.append(time.perf_counter() - sent)
+        if response.status_code != 201:
+            raise SystemExit(f"ingest failed ({response.status_code}): {response.get_data(as_text=True)[:500]}")
+        for kind, number in response.get_json()['created'].items():
+            created[kind] += number
+    elapsed = time.perf_counter() - started
+
+    # Retry every batch: nothing may be created twice
+    rng = random.Random(seed)
+    for batch in _batches(tickets, batch_size, comments_per_batch, rng):
+        sent = time.perf_counter()
+        response = client.post('/api/ingest', json=batch, headers=headers)
+        retry_latencies.append(time.perf_counter() - sent)
+        recreated += sum(response.get_json()['created'].values())
+
+    with app.app_context():
+        stored = {
+            'tickets': db.session.execute(select(func.count(Ticket.id))).scalar(),
+            'comments': db.session.execute(select(func.count(TicketComment.id))).scalar(),
+            'comment_count': db.session.execute(select(func.sum(Ticket.comment_count))).scalar() or 0,
+            'events': db.session.execute(select(func.count(OutboxEvent.id))).scalar(),
+            'linked': db.session.execute(select(func.count(Ticket.id))
+                                         .where(Ticket.duplicate_of.isnot(None))).scalar(),
+        }
+    return {'elapsed': elapsed, 'latencies': latencies, 'retry_latencies': retry_latencies,
+            'created': created, 'recreated': recreated, 'stored': stored}
+
+
+def run_single(app, token, tickets, seed):
+    client = app.test_client()
+    headers = {'Authorization': f"Bearer {token}"}
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    for batch in _batches(tickets, 1, 0, rng, prefix='single'):
+        response = client.post('/api/ingest', json=batch, headers=headers)
+        if response.status_code != 201:
+            raise SystemExit(f"ingest failed ({response.status_code}): {response.get_data(as_text=True)[:500]}")
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickets', type=int, default=50000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--comments-per-batch', type=int, default=100)
+    parser.add_argument('--write-queue', action='store_true', help='run the writes through SQLITE_WRITE_QUEUE')
+    parser.add_argument('--no-duplicates', action='store_true', help='run with DUPLICATE_DETECTION off')
+    parser.add_argument('--single', type=int, default=2000, metavar='N',
+                        help='also post N tickets one per request for comparison (0 to skip)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HELPDESK_DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'ingest.db')}"
+        from app import create_app
+        from migrations import init_database
+        from seed import create_default_admin
+        app = create_app({'OUTBOX_WORKER': False, 'ANALYTICS_ROLLUP_SECONDS': 0,
+                          'SQLITE_WRITE_QUEUE': args.write_queue,
+                          'DUPLICATE_DETECTION': not args.no_duplicates,
+                          'INGEST_MAX_BATCH': max(args.batch_size, args.comments_per_batch)})
+        with app.app_context():
+            from ingest import create_api_token
+            from models import User
+            init_database()
+            create_default_admin()
+            _, token = create_api_token(User.query.filter_by(username='superadmin').first(), 'benchmark')
+
+        result = run(app, token, args.tickets, args.batch_size, args.comments_per_batch, args.seed)
+        single = run_single(app, token, args.single, args.seed + 1) if args.single else None
+
+    created, stored = result['created'], result['stored']
+    print(f"batches of {args.batch_size} tickets + {args.comments_per_batch} comments"
+          f"{' (write queue)' if args.write_queue else ''}{' (no duplicate detection)' if args.no_duplicates else ''}")
+    print(f"ingested {created['tickets']} tickets and {created['comments']} comments in {result['elapsed']:.1f}s: "
+          f"{created['tickets'] / result['elapsed']:.0f} tickets/s sustained")
+    latencies = result['latencies']
+    print(f"batch latency: p50 {_quantile(latencies, 0.5) * 1000:.0f}ms  p99 {_quantile(latencies, 0.99) * 1000:.0f}ms")
+    retries = result['retry_latencies']
+    print(f"retried batches: {result['recreated']} items created again  "
+          f"p50 {_quantile(retries, 0.5) * 1000:.0f}ms  p99 {_quantile(retries, 0.99) * 1000:.0f}ms")
+    print(f"stored: {stored['tickets']} tickets, {stored['comments']} comments "
+          f"(comment_count total {stored['comment_count']}), {stored['events']} outbox events, "
+          f"{stored['linked']} linked as duplicates")
+    if single is not None:
+        print(f"one ticket per request: {args.single / single:.0f} tickets/s")
+
+
+if __name__ == '__main__':
+    main()
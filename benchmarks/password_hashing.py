@@ -0,0 +1,62 @@
+"""Micro-benchmark of password verification (login) throughput.
+
+Usage:
+    python benchmarks/password_hashing.py [--method scrypt:32768:8:1] [--workers 1,2,4] [--seconds 3]
+
+Reports verifications per second for each worker count and per core, so
+PASSWORD_HASH_METHOD and PASSWORD_HASH_WORKERS can be sized for a host.
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHODS = ['scrypt:32768:8:1', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000']
+
+
+def measure(password_hash, password, workers, seconds):
+    """Run check_password_hash from `workers` threads for `seconds`; return verifications/second"""
+    deadline = time.perf_counter() + seconds
+    counts = [0] * workers
+    lock = threading.Lock()
+
+    def worker(index):
+        done = 0
+        while time.perf_counter() < deadline:
+            check_password_hash(password_hash, password)
+            done += 1
+        with lock:
+            counts[index] = done
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for index in range(workers):
+            pool.submit(worker, index)
+    elapsed = time.perf_counter() - started
+    return sum(counts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--method', action='append', help='werkzeug hash method (repeatable)')
+    parser.add_argument('--workers', default=None, help='comma separated worker counts')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    methods = args.method or DEFAULT_METHODS
+    worker_counts = [int(w) for w in args.workers.split(',')] if args.workers else sorted({1, cores})
+
+    print(f"{'method':<24} {'workers':>7} {'logins/s':>10} {'per core':>10} {'ms/login':>9}")
+    for method in methods:
+        password_hash = generate_password_hash('benchmark-password', method=method)
+        for workers in worker_counts:
+            rate = measure(password_hash, 'benchmark-password', workers, args.seconds)
+            per_core = rate / min(workers, cores)
+            print(f"{method:<24} {workers:>7} {rate:>10.1f} {per_core:>10.1f} {1000 * workers / rate:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Per-route latency and query-count benchmark over realistic data.
+
+Usage:
+    python benchmarks/request_latency.py [--iterations 200] [--users 200] [--tickets 20000]
+                                         [--comments 60000] [--database URL]
+                                         [--save results.json] [--compare results.json]
+
+Without --database a temporary SQLite database is created and filled by
+seed_data.generate(). With --database an existing, already seeded
+database is used as-is (generate a large one once with seed_data.py).
+
+Drives the Flask test client through login, create_ticket, add_comment,
+admin_dashboard with random filters, super_admin_dashboard and
+view_ticket, interleaved as a mixed workload, and reports p50/p95/p99
+latency and queries per request for each. --save writes the results;
+--compare fails (exit 1) when a route runs more queries per request than
+the saved run or its p95 is more than --tolerance slower.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SEARCH_WORDS = ['printer', 'vpn', 'sap', 'wi-fi', 'slow', 'error', 'laptop', 'outlook']
+
+
+def _percentile(cuts, p):
+    return cuts[p - 1]
+
+
+def _summarize(samples):
+    latencies = sorted(s[0] for s in samples)
+    queries = [s[1] for s in samples]
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(samples),
+        'p50_ms': _percentile(cuts, 50) * 1000,
+        'p95_ms': _percentile(cuts, 95) * 1000,
+        'p99_ms': _percentile(cuts, 99) * 1000,
+        'queries_avg': statistics.mean(queries),
+        'queries_max': max(queries),
+    }
+
+
+class Workload:
+    """Logged-in test clients and the request each scenario sends"""
+
+    def __init__(self, app, rng):
+        from app import db
+        from models import User, Ticket
+        from seed_data import LOAD_PASSWORD
+
+        self.app = app
+        self.rng = rng
+        with app.app_context():
+            users = db.session.query(User.username).filter(User.username.like('load%'), User.is_admin.is_(False)) \
+                .limit(500).all()
+            admin = db.session.query(User.username).filter(User.username.like('load%'), User.is_admin.is_(True)) \
+                .first()
+            self.max_ticket_id = db.session.query(db.func.max(Ticket.id)).scalar() or 1
+        if not users or admin is None:
+            raise SystemExit("The database needs generated load users, including an admin; "
+                             "run seed_data.py with more --users.")
+
+        self.password = LOAD_PASSWORD
+        self.usernames = [u.username for u in users]
+        self.user = self._login('/user-login', self.usernames[0], LOAD_PASSWORD)
+        self.admin = self._login('/admin-login', admin.username, LOAD_PASSWORD)
+        self.super_admin = self._login('/admin-login', 'superadmin', 'super123')
+
+    def _login(self, path, username, password):
+        client = self.app.test_client()
+        response = client.post(path, data={'username': username, 'password': password})
+        if response.status_code != 302:
+            raise SystemExit(f"Login failed for {username}")
+        # Consume the welcome flash so later pages are cacheable as in real use
+        client.get('/')
+        return client
+
+    def _random_ticket(self):
+        return self.rng.randint(1, self.max_ticket_id)
+
+    def login(self):
+        client = self.app.test_client()
+        return client.post('/user-login', data={'username': self.rng.choice(self.usernames),
+                                                'password': self.password})
+
+    def create_ticket(self):
+        return self.user.post('/create-ticket', data={
+            'title': f"Benchmark ticket {self.rng.randint(1, 10**6)}",
+            'description': 'Created by the request latency benchmark',
+            'category': self.rng.choice(['Hardware', 'Software', 'Network', 'Other']),
+            'priority': self.rng.choice(['Low', 'Medium', 'High', 'Critical']),
+        })
+
+    def add_comment(self):
+        return self.admin.post(f"/ticket/{self._random_ticket()}/comment",
+                               data={'comment': 'Benchmark follow-up comment'})
+
+    def admin_dashboard(self):
+        params = {}
+        if self.rng.random() < 0.5:
+            params['status'] = self.rng.choice(['Open', 'In Progress', 'Resolved', 'Closed'])
+        if self.rng.random() < 0.3:
+            params['priority'] = self.rng.choice(['Low', 'Medium', 'High', 'Critical'])
+        if self.rng.random() < 0.3:
+            params['category'] = self.rng.choice(['Hardware', 'Software', 'Network', 'Other'])
+        if self.rng.random() < 0.2:
+            params['search'] = self.rng.choice(SEARCH_WORDS)
+        return self.admin.get('/admin-dashboard', query_string=params)
+
+    def super_admin_dashboard(self):
+        return self.super_admin.get('/super-admin-dashboard')
+
+    def view_ticket(self):
+        return self.admin.get(f"/ticket/{self._random_ticket()}")
+
+    SCENARIOS = ['login', 'create_ticket', 'add_comment', 'admin_dashboard', 'super_admin_dashboard', 'view_ticket']
+
+
+def run(app, iterations, seed, warmup=5):
+    rng = random.Random(seed)
+    workload = Workload(app, rng)
+    samples = {name: [] for name in Workload.SCENARIOS}
+
+    for i in range(warmup + iterations):
+        for name in Workload.SCENARIOS:
+            started = time.perf_counter()
+            response = getattr(workload, name)()
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise SystemExit(f"{name} returned {response.status_code}")
+            if i >= warmup:
+                samples[name].append((elapsed, int(response.headers.get('X-Query-Count', 0))))
+
+    return {name: _summarize(values) for name, values in samples.items()}
+
+
+def _report(results):
+    print(f"{'route':<24}{'requests':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'max q':>7}")
+    for name, r in results.items():
+        print(f"{name:<24}{r['requests']:>9}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+              f"{r['queries_avg']:>9.1f}{r['queries_max']:>7}")
+
+
+def _compare(results, baseline, tolerance):
+    failures = []
+    for name, r in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if r['queries_max'] > before['queries_max']:
+            failures.append(f"{name}: {r['queries_max']} queries per request (was {before['queries_max']})")
+        if r['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            failures.append(f"{name}: p95 {r['p95_ms']:.1f}ms (was {before['p95_ms']:.1f}ms)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200, help='requests per route')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tickets', type=int, default=20000)
+    parser.add_argument('--comments', type=int, default=60000)
+    parser.add_argument('--database', help='existing seeded database URL (skips generation)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='write results as JSON')
+    parser.add_argument('--compare', help='fail on regressions against saved JSON results')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown for --compare')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HELPDESK_DATABASE_URL'] = args.database or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from app import create_app
+        # No outbox worker or rollup refresher: they would share the database with the measured requests
+        app = create_app({'WTF_CSRF_ENABLED': False, 'QUERY_COUNTER_ENABLED': True, 'QUERY_BUDGET': 10**6,
+                          'OUTBOX_WORKER': False, 'ANALYTICS_ROLLUP_SECONDS': 0})
+
+        if not args.database:
+            from migrations import init_database
+            from seed import create_default_admin
+            from seed_data import generate
+            with app.app_context():
+                init_database()
+                create_default_admin()
+                generate(args.users, args.tickets, args.comments, seed=args.seed)
+
+        results = run(app, args.iterations, args.seed)
+
+    _report(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            failures = _compare(results, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
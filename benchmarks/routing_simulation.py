@@ -0,0 +1,201 @@
+"""Simulate automatic ticket routing at a sustained arrival rate.
+
+Usage:
+    python benchmarks/routing_simulation.py [--rate 3000] [--minutes 15] [--admins 40]
+                                            [--refresh-seconds 30] [--policy least-loaded]
+                                            [--seed 42]
+
+Creates a temporary SQLite database with --admins admins spread over the
+IT Hardware, IT Software and IT departments, then replays --minutes of
+simulated time with --rate new tickets per minute. Each ticket is routed
+with the app's LoadTracker (or, for comparison, plain round-robin or
+random choice among the same candidates) and inserted; every admin
+resolves their oldest tickets at their own speed, between half and one
+and a half times the average, so the team as a whole keeps up with the
+arrivals. The tracker reloads its counts from the database every
+--refresh-seconds of simulated time, as it would in the app.
+
+Reports the time to pick an assignee (p50/p99), the refresh time, and how
+evenly the open backlog is spread within each department.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = (['Hardware', 'Software', 'Network', 'Other'], [35, 35, 20, 10])
+DEPARTMENTS = (['IT Hardware', 'IT Software', 'IT'], [40, 40, 20])
+POLICIES = ['least-loaded', 'round-robin', 'random']
+
+
+def _create_admins(count, rng):
+    from sqlalchemy import insert
+    from app import db
+    from models import User
+
+    rows = []
+    for n in range(1, count + 1):
+        rows.append(dict(username=f"route{n}", email=f"route{n}@example.com", password_hash='-',
+                         first_name='Route', last_name=str(n), department=rng.choices(*DEPARTMENTS)[0],
+                         role='admin', is_admin=True))
+    db.session.execute(insert(User), rows)
+    db.session.commit()
+    return [admin_id for (admin_id,) in db.session.query(User.id).filter(User.role == 'admin').all()]
+
+
+def _baseline_chooser(tracker, policy, rng):
+    turns = defaultdict(int)
+
+    def choose(category):
+        candidates = sorted(tracker.candidates(category))
+        if policy == 'random':
+            return rng.choice(candidates)
+        turns[category] += 1
+        return candidates[turns[category] % len(candidates)]
+    return choose
+
+
+def simulate(rate, minutes, admins, refresh_seconds, policy, seed):
+    from sqlalchemy import insert, update
+    from app import db
+    from models import Ticket
+    from routing import LoadTracker
+
+    rng = random.Random(seed)
+    admin_ids = _create_admins(admins, rng)
+
+    # Team capacity slightly above the arrival rate, unevenly split
+    speeds = {admin_id: rng.uniform(0.5, 1.5) for admin_id in admin_ids}
+    scale = rate * 1.05 / sum(speeds.values())
+    capacity = {admin_id: speed * scale for admin_id, speed in speeds.items()}
+    carry = defaultdict(float)
+
+    # Refreshed explicitly on the simulated clock below
+    tracker = LoadTracker(refresh_seconds=float('inf'))
+    tracker.refresh()
+    choose = tracker.choose if policy == 'least-loaded' else _baseline_chooser(tracker, policy, rng)
+
+    active = defaultdict(deque)  # admin id -> open ticket ids, oldest first
+    next_id = 1
+    choose_times = []
+    refresh_times = []
+    spreads = []
+    start = datetime(2025, 1, 1)
+    refresh_every = max(1, int(round(refresh_seconds)))
+    second_rate = rate / 60
+
+    for minute in range(minutes):
+        for second in range(60):
+            now = start + timedelta(minutes=minute, seconds=second)
+            arrivals = int(second_rate * (second + 1)) - int(second_rate * second)
+            rows = []
+            for _ in range(arrivals):
+                category = rng.choices(*CATEGORIES)[0]
+                started = time.perf_counter()
+                admin_id = choose(category)
+                choose_times.append(time.perf_counter() - started)
+                rows.append(dict(id=next_id, title='Simulated ticket', description='Routing simulation',
+                                 category=category, priority='Medium', status='Open', user_id=admin_ids[0],
+                                 user_name='Simulation', assigned_to=admin_id, created_at=now, updated_at=now))
+                active[admin_id].append(next_id)
+                next_id += 1
+            if rows:
+                db.session.execute(insert(Ticket), rows)
+
+            # Each admin works through their queue at their own pace
+            resolved = []
+            for admin_id in admin_ids:
+                carry[admin_id] += capacity[admin_id] / 60
+                while carry[admin_id] >= 1 and active[admin_id]:
+                    carry[admin_id] -= 1
+                    resolved.append(active[admin_id].popleft())
+                carry[admin_id] = min(carry[admin_id], 1)
+            if resolved:
+                db.session.execute(update(Ticket).where(Ticket.id.in_(resolved))
+                                   .values(status='Resolved', resolved_at=now)
+                                   .execution_options(synchronize_session=False))
+            db.session.commit()
+
+            if (minute * 60 + second + 1) % refresh_every == 0:
+                started = time.perf_counter()
+                tracker.refresh()
+                refresh_times.append(time.perf_counter() - started)
+
+        spreads.append(_department_spread(active, tracker))
+
+    return {
+        'tickets': next_id - 1,
+        'choose_times': choose_times,
+        'refresh_times': refresh_times,
+        'spreads': spreads,
+        'final': _department_loads(active, tracker),
+    }
+
+
+def _department_loads(active, tracker):
+    by_department = defaultdict(list)
+    for admin_id, department in tracker._departments.items():
+        by_department[department].append(len(active[admin_id]))
+    return by_department
+
+
+def _department_spread(active, tracker):
+    """Largest max-min open backlog gap within any department"""
+    return max(max(loads) - min(loads) for loads in _department_loads(active, tracker).values())
+
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=int, default=3000, help='new tickets per minute')
+    parser.add_argument('--minutes', type=int, default=15, help='simulated minutes')
+    parser.add_argument('--admins', type=int, default=40)
+    parser.add_argument('--refresh-seconds', type=float, default=30, help='load count reload interval')
+    parser.add_argument('--policy', choices=POLICIES, default='least-loaded')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HELPDESK_DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'routing.db')}"
+        from app import create_app
+        from migrations import init_database
+        app = create_app({'OUTBOX_WORKER': False})
+        with app.app_context():
+            init_database()
+            started = time.perf_counter()
+            result = simulate(args.rate, args.minutes, args.admins, args.refresh_seconds, args.policy, args.seed)
+            elapsed = time.perf_counter() - started
+
+    choose_times = result['choose_times']
+    print(f"policy: {args.policy}  tickets: {result['tickets']} over {args.minutes} simulated minutes "
+          f"({args.rate}/min)  wall time: {elapsed:.1f}s")
+    print(f"assignment: p50 {_quantile(choose_times, 0.5) * 1e6:.1f}us  "
+          f"p99 {_quantile(choose_times, 0.99) * 1e6:.1f}us  "
+          f"({len(choose_times) / sum(choose_times):.0f} assignments/s)")
+    if result['refresh_times']:
+        print(f"load refresh: {len(result['refresh_times'])} reloads, "
+              f"avg {statistics.mean(result['refresh_times']) * 1000:.1f}ms  "
+              f"max {max(result['refresh_times']) * 1000:.1f}ms")
+    print(f"backlog spread (max - min open tickets within a department): "
+          f"avg {statistics.mean(result['spreads']):.1f}  worst {max(result['spreads'])}")
+    print(f"{'department':<14}{'admins':>8}{'min open':>10}{'avg open':>10}{'max open':>10}")
+    for department, loads in sorted(result['final'].items()):
+        print(f"{department:<14}{len(loads):>8}{min(loads):>10}{statistics.mean(loads):>10.1f}{max(loads):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""Fill the database with realistic helpdesk data for load testing.
+
+Usage:
+    python benchmarks/seed_data.py [--users 1000] [--tickets 1000000] [--comments 5000000]
+                                   [--batch-size 10000] [--seed 42]
+
+Targets the database named by HELPDESK_DATABASE_URL (the app default
+otherwise), creating the schema and default accounts first. Rows are
+written with Core bulk INSERTs, batch_size rows per transaction; the
+per-ticket comment counters are then recomputed in one batched pass.
+The search index triggers are dropped during the load and the index
+is rebuilt once at the end. Generated accounts are named load<N> and share the password 'loadtest';
+about 2% of them are admins, always including load1.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LOAD_PASSWORD = 'loadtest'
+ADMIN_SHARE = 0.02
+
+FIRST_NAMES = ['Arun', 'Priya', 'Karthik', 'Divya', 'Suresh', 'Meena', 'Rahul', 'Anitha', 'Vijay', 'Lakshmi',
+               'Ganesh', 'Kavya', 'Ramesh', 'Deepa', 'Manoj', 'Sowmya', 'Prakash', 'Revathi', 'Hari', 'Nisha']
+LAST_NAMES = ['Kumar', 'Raman', 'Iyer', 'Nair', 'Reddy', 'Pillai', 'Subramanian', 'Krishnan', 'Menon', 'Rao']
+DEPARTMENTS = ['Engineering', 'Production', 'Quality', 'Finance', 'HR', 'Purchase', 'Stores', 'Design', 'Sales']
+
+# Weighted like a real queue: mostly closed-out history, a live open backlog
+STATUSES = (['Open', 'In Progress', 'Resolved', 'Closed'], [15, 10, 25, 50])
+PRIORITIES = (['Low', 'Medium', 'High', 'Critical'], [35, 40, 20, 5])
+SUBJECTS = {
+    'Hardware': ['Printer', 'Laptop', 'Monitor', 'Keyboard', 'Docking station', 'Scanner', 'UPS', 'Desktop'],
+    'Software': ['SAP', 'Outlook', 'AutoCAD', 'Excel', 'VPN client', 'Antivirus', 'Windows update', 'Teams'],
+    'Network': ['Wi-Fi', 'LAN port', 'Internet', 'Shared drive', 'Firewall', 'DNS', 'Switch', 'Proxy'],
+    'Other': ['Access card', 'Phone extension', 'Email group', 'Account', 'Projector', 'Meeting room'],
+}
+PROBLEMS = ['not working', 'very slow', 'keeps disconnecting', 'shows an error', 'needs replacement',
+            'cannot log in', 'not responding', 'access request', 'crashes on startup', 'setup required']
+LOCATIONS = ['plant 1', 'plant 2', 'first floor', 'second floor', 'design office', 'stores', 'main office']
+REPLIES = ['Checked the issue, looking into it.', 'Can you share a screenshot of the error?',
+           'Restarted the service, please try again.', 'Replacement has been requested.',
+           'Working fine now, thanks.', 'Still facing the same problem.', 'Escalated to the vendor.',
+           'Please restart your system and check.', 'Issue resolved after driver update.']
+
+CATEGORIES = list(SUBJECTS)
+HISTORY_DAYS = 365
+
+
+def _ticket_text(rng, category):
+    subject = rng.choice(SUBJECTS[category])
+    problem = rng.choice(PROBLEMS)
+    location = rng.choice(LOCATIONS)
+    title = f"{subject} {problem} in {location}"
+    description = (f"The {subject.lower()} in {location} is {problem}. "
+                   f"{rng.choice(REPLIES)} Reported from {rng.choice(DEPARTMENTS)}.")
+    return title, description
+
+
+def _insert_batches(rows, table, batch_size):
+    """Insert an iterable of dicts in batch_size executemany transactions"""
+    from sqlalchemy import insert
+    from app import db
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(table), batch)
+            db.session.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(table), batch)
+        db.session.commit()
+        total += len(batch)
+    return total
+
+
+def generate(users=1000, tickets=1000000, comments=5000000, batch_size=10000, seed=42):
+    """Generate users, tickets and comments; returns the number of rows of each.
+
+    Must run inside an application context with the schema created.
+    """
+    from sqlalchemy import func
+    from app import db
+    from migrations import backfill_comment_activity
+    from models import User, Ticket, TicketComment
+    from passwords import hash_password
+    from search import drop_search_triggers, install_search, rebuild_search_index, search_enabled
+
+    # Per-row index triggers dominate bulk load time; rebuild once instead
+    reindex = search_enabled()
+    if reindex:
+        drop_search_triggers()
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = hash_password(LOAD_PASSWORD)
+
+    # Users: continue numbering after any earlier load run
+    first = db.session.query(func.count(User.id)).filter(User.username.like('load%')).scalar() + 1
+
+    def user_rows():
+        for n in range(first, first + users):
+            # load1 is always an admin, so even a small run has one
+            is_admin = rng.random() < ADMIN_SHARE or n == 1
+            yield dict(
+                username=f"load{n}", email=f"load{n}@example.com", password_hash=password_hash,
+                first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                department='IT' if is_admin else rng.choice(DEPARTMENTS),
+                role='admin' if is_admin else 'user', is_admin=is_admin,
+                ip_address=f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                system_name=rng.choice(['Windows System', 'Mac System', 'Linux System']),
+                created_at=now - timedelta(days=rng.uniform(HISTORY_DAYS, 2 * HISTORY_DAYS)),
+            )
+
+    _insert_batches(user_rows(), User, batch_size)
+
+    people = db.session.query(User.id, User.first_name, User.last_name, User.is_admin).all()
+    requesters = [(p.id, f"{p.first_name} {p.last_name}") for p in people if not p.is_admin]
+    admins = [p.id for p in people if p.is_admin]
+
+    # Tickets: remember each ticket's creation time (epoch seconds) for its comments
+    first_ticket_id = (db.session.query(func.max(Ticket.id)).scalar() or 0) + 1
+    created_times = array('d')
+
+    def ticket_rows():
+        for _ in range(tickets):
+            category = rng.choice(CATEGORIES)
+            status = rng.choices(*STATUSES)[0]
+            requester_id, requester_name = rng.choice(requesters)
+            title, description = _ticket_text(rng, category)
+            created_at = now - timedelta(seconds=rng.uniform(0, HISTORY_DAYS * 86400))
+            created_times.append(created_at.timestamp())
+            assigned = status != 'Open' or rng.random() < 0.3
+            resolved_at = None
+            if status in ('Resolved', 'Closed'):
+                resolved_at = min(now, created_at + timedelta(hours=rng.expovariate(1 / 36)))
+            yield dict(
+                title=title, description=description, category=category,
+                priority=rng.choices(*PRIORITIES)[0], status=status,
+                user_id=requester_id, user_name=requester_name,
+                user_ip_address=f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                user_system_name='Windows System',
+                assigned_to=rng.choice(admins) if assigned and admins else None,
+                created_at=created_at, updated_at=resolved_at or created_at, resolved_at=resolved_at,
+            )
+
+    ticket_count = _insert_batches(ticket_rows(), Ticket, batch_size)
+
+    # Comments: a third land on 1% of tickets, the long-running threads
+    commenters = [p.id for p in people]
+
+    def comment_rows():
+        for _ in range(comments):
+            if rng.random() < 0.33:
+                index = rng.randrange(0, ticket_count, 100)
+            else:
+                index = rng.randrange(ticket_count)
+            created = datetime.fromtimestamp(created_times[index]) + timedelta(hours=rng.expovariate(1 / 12))
+            yield dict(
+                ticket_id=first_ticket_id + index, user_id=rng.choice(commenters),
+                comment=rng.choice(REPLIES), created_at=min(created, now),
+            )
+
+    comment_count = _insert_batches(comment_rows(), TicketComment, batch_size) if ticket_count else 0
+    backfill_comment_activity(batch_size=batch_size)
+
+    if reindex:
+        install_search()
+        rebuild_search_index()
+
+    return {'users': users, 'tickets': ticket_count, 'comments': comment_count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tickets', type=int, default=1000000)
+    parser.add_argument('--comments', type=int, default=5000000)
+    parser.add_argument('--batch-size', type=int, default=10000, help='rows per INSERT transaction')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from app import create_app
+    from migrations import init_database
+    from seed import create_default_admin
+
+    app = create_app()
+    with app.app_context():
+        init_database()
+        create_default_admin()
+        started = time.perf_counter()
+        counts = generate(args.users, args.tickets, args.comments, args.batch_size, args.seed)
+        elapsed = time.perf_counter() - started
+
+    rows = sum(counts.values())
+    print(f"users: {counts['users']}  tickets: {counts['tickets']}  comments: {counts['comments']}")
+    print(f"elapsed: {elapsed:.1f}s  ({rows / elapsed:.0f} rows/s including counter backfill)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Multi-process write load test for the SQLite production mode.
+
+Usage:
+    python benchmarks/sqlite_write_load.py [--workers 4] [--threads 4] [--requests 100]
+                                           [--readers 0] [--write-queue] [--no-tuning]
+
+Starts several processes (standing in for gunicorn workers) against one
+fresh SQLite file. Each process drives the Flask test client from several
+threads, alternating create_ticket and add_comment, and the run reports
+throughput and how many requests failed with "database is locked".
+With --readers, each process also runs that many threads reading the
+ticket list API for as long as the writers run, which is where WAL
+matters: without it a reader holds off the commit of every writer.
+
+On a single-core host with 4 workers x 2 writer threads x 40 requests
++ 2 readers, the baseline (--no-tuning) lost 3-8 writes per run to
+"database is locked" and the tuned mode 0-1. Writes alone showed no
+difference there. The write queue only orders writes inside each
+process, so it does not remove contention between workers.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _configure_env(db_path, args):
+    os.environ['HELPDESK_DATABASE_URL'] = f"sqlite:///{db_path}"
+    os.environ['SQLITE_TUNING'] = '0' if args.no_tuning else '1'
+    os.environ['SQLITE_WRITE_QUEUE'] = '1' if args.write_queue else '0'
+    # Keep login cheap; this test is about write contention, not hashing
+    os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    sys.path.insert(0, ROOT)
+
+
+def _load_app():
+    import logging
+    logging.disable(logging.WARNING)
+    from flask import got_request_exception
+    from main import app
+    app.config['WTF_CSRF_ENABLED'] = False
+    return app, got_request_exception
+
+
+def _worker(db_path, args, results):
+    _configure_env(db_path, args)
+    app, got_request_exception = _load_app()
+
+    counts = {'ok': 0, 'failed': 0, 'locked': 0, 'reads': 0, 'read_failed': 0}
+    lock = threading.Lock()
+    writing = threading.Event()
+    writing.set()
+
+    def on_exception(sender, exception, **extra):
+        if 'database is locked' in str(exception):
+            with lock:
+                counts['locked'] += 1
+
+    got_request_exception.connect(on_exception, app)
+
+    def client_loop():
+        client = app.test_client()
+        client.post('/user-login', data={'username': 'testuser', 'password': 'test123'})
+        for i in range(args.requests):
+            if i % 2 == 0:
+                response = client.post('/create-ticket', data={
+                    'title': f'Load test ticket {i}',
+                    'description': 'Generated by the SQLite write load test',
+                    'category': 'Network',
+                    'priority': 'Low',
+                })
+            else:
+                response = client.post('/ticket/1/comment', data={'comment': f'Load test comment {i}'})
+            with lock:
+                counts['ok' if response.status_code == 302 else 'failed'] += 1
+
+    def reader_loop():
+        client = app.test_client()
+        client.post('/user-login', data={'username': 'testuser', 'password': 'test123'})
+        while writing.is_set():
+            response = client.get('/api/tickets?sort=updated_at')
+            with lock:
+                counts['reads' if response.status_code == 200 else 'read_failed'] += 1
+
+    readers = [threading.Thread(target=reader_loop) for _ in range(args.readers)]
+    threads = [threading.Thread(target=client_loop) for _ in range(args.threads)]
+    for thread in readers + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writing.clear()
+    for thread in readers:
+        thread.join()
+
+    results.put(counts)
+
+
+def _prepare_database(db_path, args):
+    """Create the schema, seed users and one ticket to comment on"""
+    _configure_env(db_path, args)
+    app, _ = _load_app()
+    from app import db
+    from migrations import init_database
+    from models import User, Ticket
+    from seed import create_default_admin
+    with app.app_context():
+        init_database()
+        create_default_admin()
+        user = User.query.filter_by(username='testuser').first()
+        user.set_password('test123')
+        db.session.add(Ticket(title='Load test target', description='Comments land here',
+                              category='Other', priority='Low', user_id=user.id, user_name=user.full_name))
+        db.session.commit()
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='processes')
+    parser.add_argument('--threads', type=int, default=4, help='client threads per process')
+    parser.add_argument('--requests', type=int, default=100, help='requests per thread')
+    parser.add_argument('--readers', type=int, default=0, help='reading threads per process')
+    parser.add_argument('--write-queue', action='store_true', help='enable SQLITE_WRITE_QUEUE')
+    parser.add_argument('--no-tuning', action='store_true', help='disable WAL/pragmas (baseline)')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'load_test.db')
+        setup = context.Process(target=_prepare_database, args=(db_path, args))
+        setup.start()
+        setup.join()
+
+        results = context.Queue()
+        workers = [context.Process(target=_worker, args=(db_path, args, results)) for _ in range(args.workers)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        totals = {'ok': 0, 'failed': 0, 'locked': 0, 'reads': 0, 'read_failed': 0}
+        for _ in workers:
+            for key, value in results.get().items():
+                totals[key] += value
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+    total = totals['ok'] + totals['failed']
+    mode = 'baseline' if args.no_tuning else 'tuned' + (' + write queue' if args.write_queue else '')
+    print(f"mode: {mode}, {args.workers} workers x {args.threads} threads x {args.requests} requests"
+          f"{f' + {args.readers} readers' if args.readers else ''}")
+    print(f"requests: {total}  ok: {totals['ok']}  failed: {totals['failed']}  "
+          f"database is locked: {totals['locked']}")
+    print(f"elapsed: {elapsed:.2f}s  throughput (incl. worker boot): {total / elapsed:.1f} writes/s")
+    if args.readers:
+        print(f"reads: {totals['reads']} ok, {totals['read_failed']} failed  "
+              f"({totals['reads'] / elapsed:.1f} reads/s alongside the writes)")
+    if totals['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Cold-import and worker-boot timing.
+
+Usage:
+    python benchmarks/startup_time.py [--baseline <git-ref>] [--runs 5]
+
+Each run starts a fresh interpreter (as a gunicorn worker or CLI call
+would), imports main and serves one request through the test client.
+It reports the median import time, first-request time and whole process
+time, against an existing database and against an empty one.
+
+With --baseline, the same measurements are taken for that commit (for
+example the last commit before the application factory) so the two can
+be compared side by side.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import logging, time, json
+logging.disable(logging.CRITICAL)
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.app.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({'import': imported - started, 'first_request': served - imported}))
+"""
+
+PREPARE = """
+import logging
+logging.disable(logging.CRITICAL)
+from app import create_app
+from migrations import init_database
+from seed import create_default_admin
+app = create_app()
+with app.app_context():
+    init_database()
+    create_default_admin()
+"""
+
+
+def _env(db_path):
+    env = dict(os.environ)
+    env['HELPDESK_DATABASE_URL'] = f"sqlite:///{db_path}"
+    env.pop('PYTHONPATH', None)
+    return env
+
+
+def _export_tree(ref, dest):
+    """Check out ref into dest without touching the working tree"""
+    archive = subprocess.run(['git', 'archive', ref], cwd=ROOT, check=True, capture_output=True).stdout
+    subprocess.run(['tar', '-x', '-C', dest], input=archive, check=True)
+
+
+def _measure(tree, db_path):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', MEASURE], cwd=tree, env=_env(db_path),
+                            check=True, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process'] = elapsed
+    return timings
+
+
+def _run_scenario(tree, prepared_db, tmp, runs):
+    """Median timings against a copy of the prepared database and an empty one"""
+    results = {}
+    for scenario in ('existing database', 'empty database'):
+        samples = []
+        for i in range(runs):
+            db_path = os.path.join(tmp, f"run_{i}.db")
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            if scenario == 'existing database':
+                shutil.copy(prepared_db, db_path)
+            samples.append(_measure(tree, db_path))
+        results[scenario] = {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+    return results
+
+
+def _report(label, results):
+    print(label)
+    for scenario, timings in results.items():
+        print(f"  {scenario:<18} import {timings['import'] * 1000:8.1f} ms   "
+              f"first request {timings['first_request'] * 1000:8.1f} ms   "
+              f"process {timings['process'] * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', help='git ref to compare against')
+    parser.add_argument('--runs', type=int, default=5, help='runs per scenario (median reported)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # One database created by the current code, copied for every run
+        prepared_db = os.path.join(tmp, 'prepared.db')
+        subprocess.run([sys.executable, '-c', PREPARE], cwd=ROOT, env=_env(prepared_db),
+                       check=True, capture_output=True)
+
+        trees = []
+        if args.baseline:
+            baseline_tree = os.path.join(tmp, 'baseline')
+            os.mkdir(baseline_tree)
+            _export_tree(args.baseline, baseline_tree)
+            trees.append((f"baseline ({args.baseline})", baseline_tree))
+        trees.append(('current tree', ROOT))
+
+        for label, tree in trees:
+            _report(label, _run_scenario(tree, prepared_db, tmp, args.runs))
+
+
+if __name__ == '__main__':
+    main()
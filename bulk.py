@@ -0,0 +1,147 @@
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import case, update
+from app import db
+from models import User, Ticket
+from notifications import enqueue_events
+from routing import ACTIVE_STATUSES, record_reassignments
+from stats import RESOLVED_STATUSES, TICKET_STATUSES
+from ticket_listing import apply_filters
+
+DEFAULT_BULK_LIMIT = 1000
+
+
+class BulkOperationError(ValueError):
+    """Raised when a bulk request is malformed or not allowed"""
+
+
+def select_ticket_ids(ticket_ids=None, filters=None, limit=DEFAULT_BULK_LIMIT):
+    """Resolve an explicit id list or a dashboard filter set to existing ticket ids.
+
+    Returns (found_ids, missing_ids).
+    """
+    if ticket_ids:
+        # A string would otherwise be read digit by digit
+        if not isinstance(ticket_ids, (list, tuple)) or any(isinstance(i, bool) for i in ticket_ids):
+            raise BulkOperationError("ticket_ids must be a list of integers")
+        try:
+            requested = sorted({int(ticket_id) for ticket_id in ticket_ids})
+        except (TypeError, ValueError):
+            raise BulkOperationError("ticket_ids must be a list of integers")
+        if len(requested) > limit:
+            raise BulkOperationError(f"At most {limit} tickets can be changed at once")
+        found = {row.id for row in db.session.query(Ticket.id).filter(Ticket.id.in_(requested))}
+        return [i for i in requested if i in found], [i for i in requested if i not in found]
+
+    if filters:
+        query = apply_filters(db.session.query(Ticket.id), **filters)
+        ids = [row.id for row in query.order_by(Ticket.id).limit(limit + 1)]
+        if len(ids) > limit:
+            raise BulkOperationError(f"Filter matches more than {limit} tickets; narrow it down")
+        return ids, []
+
+    raise BulkOperationError("Provide ticket_ids or filters")
+
+
+def _apply(ticket_ids, values):
+    if ticket_ids:
+        statement = update(Ticket).where(Ticket.id.in_(ticket_ids)).values(**values) \
+            .execution_options(synchronize_session=False)
+        db.session.execute(statement)
+
+
+def bulk_assign(ticket_ids, assignee_id):
+    """Assign tickets to an admin; Open tickets move to In Progress (as assign_ticket does).
+
+    Only Open and In Progress tickets are reassigned; Resolved and Closed
+    ones are left alone. Returns the assignee's id as an integer and the
+    (id, assigned_to) rows of the reassigned tickets, with their previous
+    assignee.
+    """
+    try:
+        assignee_id = None if isinstance(assignee_id, bool) else int(assignee_id)
+    except (TypeError, ValueError):
+        assignee_id = None
+    assignee = db.session.get(User, assignee_id) if assignee_id is not None else None
+    if not assignee or not assignee.is_admin:
+        raise BulkOperationError("assigned_to must be an admin user")
+
+    reassigned = db.session.query(Ticket.id, Ticket.assigned_to) \
+        .filter(Ticket.id.in_(ticket_ids), Ticket.status.in_(ACTIVE_STATUSES)).all() if ticket_ids else []
+    _apply([row.id for row in reassigned], {
+        'assigned_to': assignee_id,
+        'status': case((Ticket.status == 'Open', 'In Progress'), else_=Ticket.status),
+        'updated_at': datetime.utcnow(),
+    })
+    return assignee_id, reassigned
+
+
+def bulk_set_status(ticket_ids, status):
+    """Change status, maintaining resolved_at the same way edit_ticket does"""
+    if status not in TICKET_STATUSES:
+        raise BulkOperationError(f"status must be one of {', '.join(TICKET_STATUSES)}")
+
+    now = datetime.utcnow()
+    if status in RESOLVED_STATUSES:
+        # Keep the original resolution time for tickets that were already resolved or closed
+        resolved_at = case((Ticket.status.in_(RESOLVED_STATUSES) & Ticket.resolved_at.isnot(None),
+                            Ticket.resolved_at), else_=now)
+    else:
+        resolved_at = None
+
+    _apply(ticket_ids, {
+        'status': status,
+        'resolved_at': resolved_at,
+        'updated_at': now,
+    })
+
+
+def _status_changing(ticket_ids, status):
+    """The subset of ticket_ids not already in status, with their current status"""
+    if not ticket_ids:
+        return []
+    return db.session.query(Ticket.id, Ticket.status) \
+        .filter(Ticket.id.in_(ticket_ids), Ticket.status != status).all()
+
+
+def _enqueue_status_events(changing, status, actor_id):
+    for old_status, group in groupby(sorted(changing, key=lambda row: row.status), key=lambda row: row.status):
+        enqueue_events('status_changed', [row.id for row in group],
+                       old_status=old_status, new_status=status, by=actor_id)
+
+
+def run_bulk_operation(action, ticket_ids=None, filters=None, assigned_to=None, status=None,
+                       limit=DEFAULT_BULK_LIMIT, actor_id=None):
+    """Apply one bulk action in a single transaction and return per-ticket results.
+
+    Results are 'updated', 'skipped' (a Resolved or Closed ticket in an
+    assign) or 'not_found'. Notification events for the changed tickets are
+    written in the same transaction.
+    """
+    found, missing = select_ticket_ids(ticket_ids, filters, limit)
+    updated = found
+
+    try:
+        if action == 'assign':
+            assigned_to, reassigned = bulk_assign(found, assigned_to)
+            updated = [row.id for row in reassigned]
+            enqueue_events('ticket_assigned', updated, assigned_to=assigned_to, by=actor_id)
+        elif action in ('status', 'close'):
+            status = 'Closed' if action == 'close' else status
+            changing = _status_changing(found, status)
+            bulk_set_status(found, status)
+            _enqueue_status_events(changing, status, actor_id)
+        else:
+            raise BulkOperationError("action must be one of assign, status, close")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if action == 'assign':
+        record_reassignments([row.assigned_to for row in reassigned], assigned_to)
+
+    results = {ticket_id: 'skipped' for ticket_id in found}
+    results.update({ticket_id: 'updated' for ticket_id in updated})
+    results.update({ticket_id: 'not_found' for ticket_id in missing})
+    return results
@@ -0,0 +1,192 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from analytics import reset_rollups, run_rollups
+from archive import archive_tickets, count_archivable
+from avatars import prune_images
+from ingest import create_api_token, revoke_api_token
+from migrations import (add_missing_columns, backfill_comment_activity, create_missing_indexes,
+                        check_dashboard_indexes, init_database)
+from notifications import create_worker
+from search import install_search, rebuild_search_index
+from seed import create_default_admin
+from models import User
+from smtp_sink import SMTPSink
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create tables, add missing columns and install the search index"""
+    if init_database():
+        click.echo("Database initialized.")
+    else:
+        click.echo("Database initialized (full-text search unavailable, using LIKE search).")
+
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Create the default super admin, admins and test user"""
+    if create_default_admin():
+        click.echo("Default accounts created.")
+    else:
+        click.echo("Default accounts already exist.")
+
+
+@click.command('add-columns')
+@with_appcontext
+def add_columns_command():
+    """Add model columns missing from an existing database"""
+    added = add_missing_columns()
+    if added:
+        for name in added:
+            click.echo(f"Added {name}")
+    else:
+        click.echo("All columns already exist.")
+
+
+@click.command('create-indexes')
+@with_appcontext
+def create_indexes_command():
+    """Create missing ticket/comment indexes on an existing database"""
+    created = create_missing_indexes()
+    if created:
+        for name in created:
+            click.echo(f"Created {name}")
+    else:
+        click.echo("All indexes already exist.")
+
+
+@click.command('check-indexes')
+@with_appcontext
+@click.option('--verbose', '-v', is_flag=True, help='Print the full query plans.')
+def check_indexes_command(verbose):
+    """EXPLAIN the dashboard queries and verify they use an index"""
+    failures = 0
+    for label, (indexed, plan) in check_dashboard_indexes().items():
+        click.echo(f"{'ok  ' if indexed else 'SCAN'} {label}")
+        if verbose or not indexed:
+            for line in plan:
+                click.echo(f"       {line}")
+        if not indexed:
+            failures += 1
+
+    if failures:
+        raise SystemExit(1)
+
+
+@click.command('rebuild-search')
+@with_appcontext
+def rebuild_search_command():
+    """Rebuild the full-text ticket search index from existing data"""
+    if not install_search():
+        raise click.ClickException("Full-text search is not available on this database.")
+    count = rebuild_search_index()
+    click.echo(f"Indexed {count} tickets.")
+
+
+@click.command('backfill-comment-activity')
+@with_appcontext
+@click.option('--batch-size', default=10000, show_default=True, help='Tickets updated per transaction.')
+def backfill_comment_activity_command(batch_size):
+    """Recompute per-ticket comment counts and last-reply columns"""
+    updated = backfill_comment_activity(batch_size=batch_size)
+    click.echo(f"Updated {updated} tickets.")
+
+
+@click.command('rollup-analytics')
+@click.option('--rebuild', is_flag=True, help='Discard existing rollups and recompute all history.')
+@with_appcontext
+def rollup_analytics_command(rebuild):
+    """Update the daily ticket analytics rollups from the last watermark"""
+    if rebuild:
+        reset_rollups()
+    rows = run_rollups()
+    click.echo(f"Wrote {rows} rollup rows.")
+
+
+@click.command('archive-tickets')
+@click.option('--older-than-days', type=int, help='Age since resolution or closing (default ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, help='Tickets moved per transaction (default ARCHIVE_BATCH_SIZE).')
+@click.option('--dry-run', is_flag=True, help='Only count the tickets that would be archived.')
+@with_appcontext
+def archive_tickets_command(older_than_days, batch_size, dry_run):
+    """Move old resolved/closed tickets and their comments to the archive tables"""
+    older_than_days = older_than_days or current_app.config['ARCHIVE_AFTER_DAYS']
+    if dry_run:
+        click.echo(f"{count_archivable(older_than_days)} tickets resolved or closed more than "
+                   f"{older_than_days} days ago can be archived.")
+        return
+
+    result = archive_tickets(older_than_days, batch_size or current_app.config['ARCHIVE_BATCH_SIZE'])
+    click.echo(f"Archived {result.tickets} tickets and {result.comments} comments "
+               f"in {result.batches} batches ({result.elapsed:.1f}s).")
+    before, after = result.before, result.after
+    for label, key in (('Hot tickets', 'tickets'), ('Hot comments', 'comments')):
+        shrink = 100 * (1 - after[key] / before[key]) if before[key] else 0
+        click.echo(f"{label:<28}{before[key]:>10} -> {after[key]:<10} (-{shrink:.0f}%)")
+    for label, key in (('Dashboard stats scan', 'stats_ms'), ('Comment count scan', 'comment_count_ms')):
+        click.echo(f"{label:<28}{before[key]:>8.1f}ms -> {after[key]:.1f}ms")
+
+
+@click.command('prune-avatars')
+@with_appcontext
+def prune_avatars_command():
+    """Delete stored profile images that no user has any more"""
+    click.echo(f"Deleted {prune_images()} unused profile images.")
+
+
+@click.command('create-api-token')
+@click.argument('username')
+@click.option('--name', required=True, help='What the token is for, e.g. the monitoring system.')
+@with_appcontext
+def create_api_token_command(username, name):
+    """Create a token for POST /api/ingest that acts as USERNAME"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No user named {username}.")
+    api_token, token = create_api_token(user, name)
+    click.echo(f"Created API token {api_token.id} ({name}) for {username}. It is shown only once:")
+    click.echo(token)
+
+
+@click.command('revoke-api-token')
+@click.argument('token_id', type=int)
+@with_appcontext
+def revoke_api_token_command(token_id):
+    """Revoke an API token by id"""
+    if not revoke_api_token(token_id):
+        raise click.ClickException(f"No API token {token_id}.")
+    click.echo(f"Revoked API token {token_id}.")
+
+
+@click.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Exit when no events are due instead of polling.')
+@with_appcontext
+def outbox_worker_command(once):
+    """Deliver pending notification events from the outbox"""
+    worker = create_worker(current_app._get_current_object())
+    click.echo(f"Delivering to {current_app.config['MAIL_SERVER']}:{current_app.config['MAIL_PORT']}")
+    worker.run(once=once)
+
+
+@click.command('smtp-sink')
+@click.option('--host', default='localhost', show_default=True)
+@click.option('--port', default=1025, show_default=True)
+@click.option('--directory', default='instance/mail', show_default=True, help='Where to save received messages.')
+def smtp_sink_command(host, port, directory):
+    """Run a local SMTP server that stores every message it receives"""
+    click.echo(f"SMTP sink listening on {host}:{port}, saving to {directory}")
+    with SMTPSink(host, port, directory) as server:
+        server.serve_forever()
+
+
+def register_commands(app):
+    """Add the helpdesk CLI commands to app"""
+    for command in (init_db_command, seed_command, add_columns_command, create_indexes_command,
+                    check_indexes_command, rebuild_search_command, backfill_comment_activity_command,
+                    rollup_analytics_command, archive_tickets_command, prune_avatars_command,
+                    create_api_token_command, revoke_api_token_command,
+                    outbox_worker_command, smtp_sink_command):
+        app.cli.add_command(command)
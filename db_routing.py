@@ -0,0 +1,68 @@
+import time
+from functools import wraps
+from flask import g, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+DEFAULT_STICKY_SECONDS = 5
+
+# Flask session key holding the time until which this client reads from the primary
+_STICKY_KEY = 'db_primary_until'
+
+
+def _wants_replica():
+    """True when the current request opted into replica reads and has no recent write"""
+    if not has_request_context() or not g.get('db_use_replica'):
+        return False
+    if g.get('db_wrote'):
+        return False
+    return flask_session.get(_STICKY_KEY, 0) <= time.time()
+
+
+def mark_write():
+    """Record that the current request wrote to the primary"""
+    if has_request_context():
+        g.db_wrote = True
+
+
+class RoutingSession(Session):
+    """Session that sends reads of replica-enabled requests to the 'replica' bind.
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary
+    and make the writing client sticky to the primary for a few seconds,
+    so it reads its own writes despite replication lag.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+
+        is_write = self._flushing or (clause is not None and getattr(clause, 'is_dml', False))
+        if is_write:
+            mark_write()
+        elif _wants_replica():
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_reads(f):
+    """Route the read queries of a view to the replica bind when one is configured"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.db_use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def init_db_routing(app):
+    """Make clients that just wrote read from the primary for DB_STICKY_SECONDS"""
+    app.config.setdefault('DB_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+
+    @app.after_request
+    def remember_primary_write(response):
+        if g.get('db_wrote') and REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+            flask_session[_STICKY_KEY] = time.time() + app.config['DB_STICKY_SECONDS']
+        return response
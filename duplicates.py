@@ -0,0 +1,382 @@
+import heapq
+import logging
+import math
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from operator import itemgetter
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from models import Ticket
+
+# Tickets that can still be duplicated
+ACTIVE_STATUSES = ('Open', 'In Progress')
+
+DEFAULT_THRESHOLD = 0.55
+DEFAULT_WINDOW_DAYS = 14
+DEFAULT_REFRESH_SECONDS = 10
+
+# Only the start of long descriptions is indexed
+MAX_DESCRIPTION_TOKENS = 60
+# A title word counts this many times a description word
+TITLE_WEIGHT = 3
+# Candidates with the most shared weight that get a full score
+SCORED_CANDIDATES = 50
+# Tickets read from one token's postings, newest first: a word used by more
+# open tickets than this only nominates the most recent of them
+MAX_POSTING_SCAN = 2000
+LOAD_BATCH_SIZE = 5000
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can cannot could do does for from had has have i if in is it its me my
+of on or our please pls the their there this to was we were when which while with you your am any all
+also again after before since still get got getting unable able just some same now today need needs
+""".split())
+
+# Ways of saying the same thing in a helpdesk ticket, folded to one token
+PHRASES = [
+    (re.compile(r"\b(not|isn'?t|is not|stopped|stop) (working|responding|connecting)\b"), ' outage '),
+    (re.compile(r"\bwi-?fi\b"), ' network '),
+    (re.compile(r"\b(log ?in|sign ?in|log on)\b"), ' login '),
+    (re.compile(r"\be-?mail\b"), ' email '),
+]
+SYNONYMS = {
+    'internet': 'network', 'wireless': 'network', 'lan': 'network', 'ethernet': 'network',
+    'connectivity': 'network', 'connection': 'network',
+    'down': 'outage', 'offline': 'outage', 'dead': 'outage', 'broken': 'outage', 'disconnecting': 'outage',
+    'disconnected': 'outage', 'disconnects': 'outage',
+    'slow': 'slowness', 'sluggish': 'slowness', 'lagging': 'slowness',
+    'pc': 'computer', 'desktop': 'computer', 'laptop': 'computer', 'notebook': 'computer', 'system': 'computer',
+    'password': 'login', 'credentials': 'login', 'logon': 'login',
+    'outlook': 'email', 'mailbox': 'email', 'mail': 'email',
+    'crash': 'crashes', 'crashing': 'crashes', 'crashed': 'crashes', 'freezes': 'crashes', 'hangs': 'crashes',
+    'error': 'errors',
+}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _words(text, limit=None):
+    text = (text or '').lower()
+    for pattern, replacement in PHRASES:
+        text = pattern.sub(replacement, text)
+    for count, word in enumerate(_TOKEN_RE.findall(text)):
+        if limit is not None and count >= limit:
+            break
+        if word in STOPWORDS or (len(word) < 2 and not word.isdigit()):
+            continue
+        if word not in SYNONYMS and len(word) > 4 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        yield sys.intern(SYNONYMS.get(word, word))
+
+
+def tokenize(title, description=''):
+    """Normalised words of a ticket's title, and those only in the start of its description"""
+    title_tokens = frozenset(_words(title))
+    return title_tokens, frozenset(_words(description, MAX_DESCRIPTION_TOKENS)) - title_tokens
+
+
+@dataclass
+class DuplicateMatch:
+    ticket_id: int
+    score: float
+    assigned_to: int = None
+
+    @property
+    def ticket_number(self):
+        return Ticket.format_ticket_number(self.ticket_id)
+
+
+class DuplicateIndex:
+    """Inverted index from token to ticket ids, kept in memory.
+
+    A ticket's similarity to a submission is the weighted Jaccard of their
+    tokens, sum(min) / sum(max) of the token weights on either side. A
+    token weighs log(1 + N / df), so "printer" counts for more than
+    "plant", and TITLE_WEIGHT times that in a title, since the title says
+    what the problem is and the description mostly adds detail.
+    Candidates come from the (most recent) postings of the submission's
+    heaviest tokens, and only the best SCORED_CANDIDATES by shared weight
+    are scored in full.
+
+    Removal is lazy: ids are dropped from _tokens at once and from the
+    postings when compact() runs.
+    """
+
+    def __init__(self):
+        self._tokens = {}  # ticket id -> (title tokens, other description tokens)
+        self._created = {}  # ticket id -> created_at
+        self._postings = defaultdict(list)  # token -> ticket ids, in insertion order
+        self._stale = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def add(self, ticket_id, tokens, created_at=None):
+        title_tokens, body_tokens = tokens
+        with self._lock:
+            if ticket_id in self._tokens:
+                return
+            self._tokens[ticket_id] = (tuple(title_tokens), tuple(body_tokens))
+            self._created[ticket_id] = created_at
+            for token in title_tokens:
+                self._postings[token].append(ticket_id)
+            for token in body_tokens:
+                self._postings[token].append(ticket_id)
+
+    def remove(self, ticket_ids):
+        with self._lock:
+            for ticket_id in ticket_ids:
+                tokens = self._tokens.pop(ticket_id, None)
+                if tokens is not None:
+                    self._created.pop(ticket_id, None)
+                    self._stale += len(tokens[0]) + len(tokens[1])
+
+    def remove_older_than(self, cutoff):
+        with self._lock:
+            expired = [ticket_id for ticket_id, created_at in self._created.items()
+                       if created_at is not None and created_at < cutoff]
+        self.remove(expired)
+        return len(expired)
+
+    def compact(self, force=False):
+        """Drop removed ids from the postings once they make up a quarter of them"""
+        with self._lock:
+            live = sum(len(title) + len(body) for title, body in self._tokens.values())
+            if not self._stale or (not force and self._stale * 3 < live):
+                return
+            postings = defaultdict(list)
+            for ticket_id, (title_tokens, body_tokens) in self._tokens.items():
+                for token in title_tokens + body_tokens:
+                    postings[token].append(ticket_id)
+            self._postings = postings
+            self._stale = 0
+
+    def similar(self, tokens, limit=5, threshold=DEFAULT_THRESHOLD):
+        """Up to limit (ticket id, score) pairs scoring at least threshold, best first"""
+        return self.similar_many([tokens], limit, threshold)[0]
+
+    def similar_many(self, queries, limit=5, threshold=DEFAULT_THRESHOLD):
+        """similar() for each of many queries, computing each ticket's weights once for all of them"""
+        results = []
+        with self._lock:
+            total = len(self._tokens)
+            idf_cache = {}
+            ticket_weights = {}
+
+            def idf(token):
+                weight = idf_cache.get(token)
+                if weight is None:
+                    weight = idf_cache[token] = math.log(1 + total / (len(self._postings.get(token, ())) or 1))
+                return weight
+
+            def weights(title, body):
+                result = {token: idf(token) for token in body}
+                result.update((token, idf(token) * TITLE_WEIGHT) for token in title)
+                return result
+
+            for title_tokens, body_tokens in queries:
+                if not total or not (title_tokens or body_tokens):
+                    results.append([])
+                    continue
+                query = weights(title_tokens, body_tokens)
+                query_weight = sum(query.values())
+
+                # A ticket scores at most the weight it shares with the query over
+                # query_weight, so one sharing none of the heaviest tokens cannot
+                # reach the threshold once the rest weigh less than
+                # threshold * query_weight: their (long) postings are not read
+                shared = defaultdict(float)
+                remaining = query_weight
+                for token, weight in sorted(query.items(), key=itemgetter(1), reverse=True):
+                    if remaining < threshold * query_weight:
+                        break
+                    for ticket_id in self._postings.get(token, ())[-MAX_POSTING_SCAN:]:
+                        shared[ticket_id] += weight
+                    remaining -= weight
+                needed = threshold * query_weight - remaining
+                live = self._tokens
+                candidates = heapq.nlargest(SCORED_CANDIDATES,
+                                            ((ticket_id, weight) for ticket_id, weight in shared.items()
+                                             if weight >= needed and ticket_id in live),
+                                            key=itemgetter(1))
+
+                scored = []
+                for ticket_id, _ in candidates:
+                    cached = ticket_weights.get(ticket_id)
+                    if cached is None:
+                        other = weights(*live[ticket_id])
+                        cached = ticket_weights[ticket_id] = (other, sum(other.values()))
+                    other, other_weight = cached
+                    both = sum(min(weight, other[token]) for token, weight in query.items() if token in other)
+                    score = both / (query_weight + other_weight - both)
+                    if score >= threshold:
+                        scored.append((ticket_id, score))
+                scored.sort(key=lambda match: (-match[1], -match[0]))
+                results.append(scored[:limit])
+        return results
+
+
+class DuplicateDetector:
+    """The process's index of recent open tickets, built from the database.
+
+    The first build reads every Open / In Progress ticket created within
+    window_days; after that, refresh() every refresh_seconds only reads
+    tickets with a higher id (so tickets created by other workers show up)
+    and drops tickets that have aged out. Resolved tickets are dropped when
+    a lookup finds them.
+    """
+
+    def __init__(self, window_days=DEFAULT_WINDOW_DAYS, refresh_seconds=DEFAULT_REFRESH_SECONDS):
+        self.window_days = window_days
+        self.refresh_seconds = refresh_seconds
+        self.index = DuplicateIndex()
+        self.ready = False
+        self._last_id = 0
+        self._refreshed_at = None
+        self._build_lock = threading.Lock()
+
+    def _cutoff(self):
+        return datetime.utcnow() - timedelta(days=self.window_days)
+
+    def refresh(self):
+        with self._build_lock:
+            rows = db.session.execute(
+                select(Ticket.id, Ticket.title, Ticket.description, Ticket.created_at)
+                .where(Ticket.id > self._last_id, Ticket.status.in_(ACTIVE_STATUSES),
+                       Ticket.created_at >= self._cutoff())
+                .order_by(Ticket.id)
+                .execution_options(yield_per=LOAD_BATCH_SIZE)
+            )
+            added = 0
+            for ticket_id, title, description, created_at in rows:
+                self.index.add(ticket_id, tokenize(title, description), created_at)
+                self._last_id = max(self._last_id, ticket_id)
+                added += 1
+            self.index.remove_older_than(self._cutoff())
+            self.index.compact()
+            self._refreshed_at = time.monotonic()
+            self.ready = True
+            return added
+
+    def build(self):
+        started = time.perf_counter()
+        added = self.refresh()
+        logging.info(f"Duplicate index built with {added} open tickets in {time.perf_counter() - started:.1f}s")
+
+    def _ensure_fresh(self):
+        refreshed_at = self._refreshed_at
+        if refreshed_at is not None and time.monotonic() - refreshed_at >= self.refresh_seconds:
+            self.refresh()
+
+    def add(self, ticket_id, title, description, created_at=None):
+        self.index.add(ticket_id, tokenize(title, description), created_at or datetime.utcnow())
+
+    def find(self, title, description, limit=5, threshold=DEFAULT_THRESHOLD):
+        """Open tickets that look like the same issue, best first; [] until the first build is done"""
+        return self.find_many([(title, description)], limit, threshold)[0]
+
+    def find_many(self, texts, limit=5, threshold=DEFAULT_THRESHOLD):
+        """find() for each (title, description), checking every match is still open in one query"""
+        if not self.ready:
+            return [[] for _ in texts]
+        self._ensure_fresh()
+        found = self.index.similar_many([tokenize(title, description) for title, description in texts],
+                                        limit * 2, threshold)
+        ids = {ticket_id for matches in found for ticket_id, _ in matches}
+        if not ids:
+            return [[] for _ in texts]
+        active = dict(db.session.execute(
+            select(Ticket.id, Ticket.assigned_to)
+            .where(Ticket.id.in_(ids), Ticket.status.in_(ACTIVE_STATUSES))
+        ).all())
+        self.index.remove([ticket_id for ticket_id in ids if ticket_id not in active])
+        return [[DuplicateMatch(ticket_id, score, active[ticket_id])
+                 for ticket_id, score in matches if ticket_id in active][:limit]
+                for matches in found]
+
+
+class IndexBuilder:
+    """Build the detector's index in a background thread so startup is not held up"""
+
+    def __init__(self, app, detector):
+        self.app = app
+        self.detector = detector
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        with self.app.app_context():
+            try:
+                self.detector.build()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Building the duplicate index failed: {e}")
+            finally:
+                db.session.remove()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='duplicate-index', daemon=True)
+                self._thread.start()
+
+
+_detector = None
+
+
+def init_duplicates(app):
+    """Build the duplicate index in the background once the first request arrives.
+
+    DUPLICATE_DETECTION=0 turns detection off.
+    """
+    global _detector
+    if not app.config.get('DUPLICATE_DETECTION', True):
+        return
+    _detector = DuplicateDetector(app.config.get('DUPLICATE_WINDOW_DAYS', DEFAULT_WINDOW_DAYS),
+                                  app.config.get('DUPLICATE_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS))
+    builder = IndexBuilder(app, _detector)
+
+    @app.before_request
+    def start_duplicate_index():
+        builder.start()
+
+
+def get_detector():
+    return _detector
+
+
+def find_duplicates(title, description, limit=5):
+    """Likely duplicates of a new ticket among recent open tickets"""
+    if _detector is None:
+        return []
+    return _detector.find(title, description, limit,
+                          current_app.config.get('DUPLICATE_THRESHOLD', DEFAULT_THRESHOLD))
+
+
+def find_duplicates_many(texts, limit=5):
+    """find_duplicates() for a batch of (title, description) pairs"""
+    if _detector is None:
+        return [[] for _ in texts]
+    return _detector.find_many(texts, limit, current_app.config.get('DUPLICATE_THRESHOLD', DEFAULT_THRESHOLD))
+
+
+def record_ticket(ticket_id, title, description):
+    """Index a ticket just created in this process"""
+    if _detector is not None:
+        _detector.add(ticket_id, title, description)
+
+
+def linked_duplicates(ticket_id, limit=20):
+    """Tickets auto-linked as duplicates of this one, newest first"""
+    return db.session.execute(
+        select(Ticket.id, Ticket.title, Ticket.status)
+        .where(Ticket.duplicate_of == ticket_id)
+        .order_by(Ticket.id.desc())
+        .limit(limit)
+    ).all()
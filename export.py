@@ -0,0 +1,101 @@
+import csv
+import io
+import tempfile
+from sqlalchemy.orm import aliased
+from app import db
+from models import User, Ticket, ArchivedTicket
+from archive import ARCHIVABLE_STATUSES
+from ticket_listing import apply_filters
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Read the finished workbook back in chunks of this many bytes
+XLSX_CHUNK_SIZE = 64 * 1024
+
+EXPORT_HEADERS = [
+    'Ticket #', 'Title', 'Description', 'Category', 'Priority', 'Status',
+    'Submitted By', 'IP Address', 'System Name', 'Assigned To',
+    'Created', 'Updated', 'Resolved',
+]
+
+
+def _export_query(model, status, priority, category, search, assigned_to):
+    assignee = aliased(User)
+    query = db.session.query(
+        model.id, model.title, model.description, model.category, model.priority,
+        model.status, model.user_name, model.user_ip_address, model.user_system_name,
+        assignee.first_name, assignee.last_name,
+        model.created_at, model.updated_at, model.resolved_at
+    ).select_from(model).outerjoin(assignee, model.assigned_to == assignee.id)
+
+    if assigned_to:
+        query = query.filter(model.assigned_to == assigned_to)
+
+    return apply_filters(query, status=status, priority=priority, category=category, search=search, model=model)
+
+
+def build_export_query(status='all', priority='all', category='all', search='', assigned_to=None):
+    """Column-only ticket query for exports, with the admin dashboard filters.
+
+    Archived tickets are included unless the status filter rules them out.
+    """
+    query = _export_query(Ticket, status, priority, category, search, assigned_to)
+    if status == 'all' or status in ARCHIVABLE_STATUSES:
+        query = query.union_all(_export_query(ArchivedTicket, status, priority, category, search, assigned_to))
+    return query.order_by(Ticket.id)
+
+
+def _format_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+def iter_export_rows(query, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield export rows as lists, fetching batch_size rows at a time"""
+    for row in query.yield_per(batch_size):
+        assignee_name = f"{row.first_name} {row.last_name}" if row.first_name else ''
+        yield [
+            Ticket.format_ticket_number(row.id), row.title, row.description, row.category, row.priority,
+            row.status, row.user_name, row.user_ip_address or '', row.user_system_name or '',
+            assignee_name, _format_datetime(row.created_at), _format_datetime(row.updated_at),
+            _format_datetime(row.resolved_at),
+        ]
+
+
+def stream_csv(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield CSV text in chunks of batch_size rows, starting with the header"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def stream_xlsx(rows):
+    """Build an XLSX workbook in write-only mode and yield its bytes.
+
+    Write-only worksheets spool rows to disk, so memory stays flat, but the
+    zip container can only be read back once the last row is written.
+    """
+    # openpyxl is only needed for XLSX exports; keep it out of worker startup
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Tickets')
+    sheet.append(EXPORT_HEADERS)
+    for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(XLSX_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
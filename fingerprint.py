@@ -0,0 +1,60 @@
+from collections import namedtuple
+from functools import lru_cache
+from flask import g, request
+
+ClientFingerprint = namedtuple('ClientFingerprint', ['ip_address', 'system_name'])
+
+# Checked in order; the first marker found in the User-Agent wins
+_SYSTEM_MARKERS = [
+    ('Windows', 'Windows System'),
+    ('Mac', 'Mac System'),
+    ('Linux', 'Linux System'),
+]
+
+
+@lru_cache(maxsize=1024)
+def parse_user_agent(user_agent):
+    """Map a User-Agent string to a system name; results are LRU-cached"""
+    for marker, system_name in _SYSTEM_MARKERS:
+        if marker in user_agent:
+            return system_name
+    return 'Unknown System'
+
+
+def _client_ip():
+    forwarded_for = request.headers.get('X-Forwarded-For', '')
+    if forwarded_for:
+        # The left-most entry is the originating client
+        return forwarded_for.split(',')[0].strip()
+    return request.headers.get('X-Real-IP') or request.remote_addr
+
+
+def get_client_fingerprint():
+    """IP address and system name of the current client, parsed once per request"""
+    if 'client_fingerprint' not in g:
+        g.client_fingerprint = ClientFingerprint(
+            ip_address=_client_ip(),
+            system_name=parse_user_agent(request.headers.get('User-Agent', ''))
+        )
+    return g.client_fingerprint
+
+
+def client_info_changes(user, ip_address, system_name=None):
+    """Columns of the user row that differ from the given client details"""
+    changes = {}
+    if ip_address and user.ip_address != ip_address:
+        changes['ip_address'] = ip_address
+    if system_name and user.system_name != system_name:
+        changes['system_name'] = system_name
+    return changes
+
+
+def update_client_info(user, ip_address, system_name=None):
+    """Set the user's IP address and system name, touching only changed columns.
+
+    Returns True when the user row was modified and needs committing.
+    """
+    changes = client_info_changes(user, ip_address, system_name)
+    for column, value in changes.items():
+        setattr(user, column, value)
+    return bool(changes)
@@ -23,7 +23,7 @@ class TicketForm(FlaskForm):
         ('High', 'High'),
         ('Critical', 'Critical')
     ], validators=[DataRequired()])
-    system_name = StringField('System Name', render_kw={'placeholder': 'Enter your computer/system name'})
+    system_name = StringField('System Name', validators=[Length(max=100)], render_kw={'placeholder': 'Enter your computer/system name'})
     submit = SubmitField('Create Ticket')
 
 class UpdateTicketForm(FlaskForm):
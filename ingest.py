@@ -0,0 +1,369 @@
+import secrets
+from dataclasses import dataclass, field
+from datetime import datetime
+from operator import itemgetter
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+from app import db
+from auth import AuthInfo, hash_token
+from forms import TicketForm, CommentForm
+from models import User, Ticket, TicketComment, ApiToken, IngestKey, OutboxEvent
+from notifications import outbox_row
+from routing import auto_assign_enabled, choose_assignee, release_assignees
+from duplicates import find_duplicates_many, record_ticket
+from write_queue import run_write
+
+DEFAULT_MAX_BATCH = 1000
+TOKEN_PREFIX = 'gtn_'
+MAX_KEY_LENGTH = 200
+
+TICKET_FIELDS = ('title', 'description', 'category', 'priority', 'system_name')
+COMMENT_FIELDS = ('comment',)
+
+
+class IngestError(ValueError):
+    """Raised when an ingestion request is malformed or not allowed.
+
+    errors lists the rejected items as {'type', 'index', 'errors'}.
+    """
+
+    def __init__(self, message, errors=None, status=400):
+        super().__init__(message)
+        self.errors = errors or []
+        self.status = status
+
+
+class IngestConflict(IngestError):
+    """Another request created an item with the same idempotency key meanwhile; retry"""
+
+
+# Tokens
+
+def create_api_token(user, name):
+    """Create a token for user; returns (ApiToken, the token itself, shown only this once)"""
+    token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+    api_token = ApiToken(name=name, token_hash=hash_token(token), user_id=user.id)
+    db.session.add(api_token)
+    db.session.commit()
+    return api_token, token
+
+
+def revoke_api_token(token_id):
+    api_token = db.session.get(ApiToken, token_id)
+    if api_token is None:
+        return False
+    api_token.revoked_at = api_token.revoked_at or datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+# Validation
+
+@dataclass
+class TicketItem:
+    index: int
+    values: dict
+    key: str = None
+    requester: str = None
+
+
+@dataclass
+class CommentItem:
+    index: int
+    comment: str
+    ticket_id: int = None
+    ticket_key: str = None
+    key: str = None
+
+
+@dataclass
+class IngestResult:
+    tickets: list = field(default_factory=list)
+    comments: list = field(default_factory=list)
+
+    @property
+    def created(self):
+        return {'tickets': sum(1 for item in self.tickets if item['result'] == 'created'),
+                'comments': sum(1 for item in self.comments if item['result'] == 'created')}
+
+
+def _items(payload, name, limit):
+    items = payload.get(name) or []
+    if not isinstance(items, list):
+        raise IngestError(f"{name} must be a list")
+    if len(items) > limit:
+        raise IngestError(f"At most {limit} {name} can be sent at once")
+    return items
+
+
+def _form_errors(form, item, fields):
+    """Run a form's validators over a JSON object's fields; returns the errors by field"""
+    errors = {}
+    data = MultiDict()
+    for name in fields:
+        value = item.get(name)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            errors[name] = ['Must be a string.']
+        else:
+            data[name] = value
+    form.process(data)
+    if not form.validate():
+        errors.update({name: messages for name, messages in form.errors.items() if name in fields})
+    return errors
+
+
+def _key(item, errors, seen):
+    key = item.get('idempotency_key')
+    if key is None:
+        return None
+    if not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH:
+        errors['idempotency_key'] = [f"Must be a string of 1 to {MAX_KEY_LENGTH} characters."]
+    elif key in seen:
+        errors['idempotency_key'] = ['Used more than once in this request.']
+    seen.add(key)
+    return key
+
+
+def validate_payload(payload, limit=DEFAULT_MAX_BATCH):
+    """Check a request body against TicketForm / CommentForm; returns (tickets, comments).
+
+    Raises IngestError listing every rejected item, so a batch is stored
+    whole or not at all.
+    """
+    if not isinstance(payload, dict):
+        raise IngestError('Expected a JSON object')
+    raw_tickets = _items(payload, 'tickets', limit)
+    raw_comments = _items(payload, 'comments', limit)
+    if not raw_tickets and not raw_comments:
+        raise IngestError('Provide tickets or comments')
+
+    ticket_form = TicketForm(formdata=None, meta={'csrf': False})
+    comment_form = CommentForm(formdata=None, meta={'csrf': False})
+    rejected = []
+    keys = set()
+    tickets, comments = [], []
+
+    for index, item in enumerate(raw_tickets):
+        if not isinstance(item, dict):
+            rejected.append({'type': 'ticket', 'index': index, 'errors': {'': ['Expected a JSON object.']}})
+            continue
+        errors = _form_errors(ticket_form, item, TICKET_FIELDS)
+        key = _key(item, errors, keys)
+        requester = item.get('requester')
+        if requester is not None and not isinstance(requester, str):
+            errors['requester'] = ['Must be a username or email address.']
+        if errors:
+            rejected.append({'type': 'ticket', 'index': index, 'errors': errors})
+            continue
+        tickets.append(TicketItem(index, {name: ticket_form[name].data for name in TICKET_FIELDS}, key, requester))
+
+    for index, item in enumerate(raw_comments):
+        if not isinstance(item, dict):
+            rejected.append({'type': 'comment', 'index': index, 'errors': {'': ['Expected a JSON object.']}})
+            continue
+        errors = _form_errors(comment_form, item, COMMENT_FIELDS)
+        key = _key(item, errors, keys)
+        ticket_id, ticket_key = item.get('ticket_id'), item.get('ticket_key')
+        if (ticket_id is None) == (ticket_key is None):
+            errors['ticket_id'] = ['Give either ticket_id or ticket_key.']
+        elif ticket_id is not None and (not isinstance(ticket_id, int) or isinstance(ticket_id, bool)):
+            errors['ticket_id'] = ['Must be an integer.']
+        elif ticket_key is not None and not isinstance(ticket_key, str):
+            errors['ticket_key'] = ['Must be the idempotency_key of a ticket.']
+        if errors:
+            rejected.append({'type': 'comment', 'index': index, 'errors': errors})
+            continue
+        comments.append(CommentItem(index, comment_form.comment.data, ticket_id, ticket_key, key))
+
+    if rejected:
+        raise IngestError(f"{len(rejected)} items are invalid", rejected, status=422)
+    return tickets, comments
+
+
+# Storing
+
+def _existing_keys(token_id, keys):
+    """idempotency key -> (ticket_id, comment_id) for keys this token has used before"""
+    keys = list(keys)
+    if not keys:
+        return {}
+    return {key: (ticket_id, comment_id) for key, ticket_id, comment_id in db.session.execute(
+        select(IngestKey.key, IngestKey.ticket_id, IngestKey.comment_id)
+        .where(IngestKey.token_id == token_id, IngestKey.key.in_(keys))
+    ).all()}
+
+
+def _requesters(api_token, tickets):
+    """requester (username or email) -> User, plus None -> the token's user.
+
+    Only admins' tokens may file tickets on behalf of other users.
+    """
+    names = {item.requester for item in tickets if item.requester}
+    users = {None: api_token.user}
+    if names and not api_token.user.is_admin:
+        raise IngestError('Only an admin token can file tickets for other requesters', status=403)
+    if names:
+        for user in User.query.filter(User.username.in_(names) | User.email.in_(names)).all():
+            users[user.username] = users[user.email] = user
+    unknown = [{'type': 'ticket', 'index': item.index, 'errors': {'requester': ['No such user.']}}
+               for item in tickets if item.requester and item.requester not in users]
+    if unknown:
+        raise IngestError(f"{len(unknown)} items are invalid", unknown, status=422)
+    return users
+
+
+def _ticket_rows(tickets, users, now):
+    """Insert rows for tickets, and the admins choose_assignee counted them against"""
+    rows = []
+    routed = []
+    found = find_duplicates_many([(item.values['title'], item.values['description']) for item in tickets], limit=1)
+    for item, duplicates in zip(tickets, found):
+        values = item.values
+        requester = users[item.requester]
+        # Routed like create_ticket: to the admin of a likely duplicate, else the least loaded
+        original = duplicates[0] if duplicates else None
+        if original and original.assigned_to and auto_assign_enabled():
+            assigned_to = original.assigned_to
+        else:
+            assigned_to = choose_assignee(values['category'])
+            routed.append(assigned_to)
+        rows.append(dict(
+            title=values['title'], description=values['description'], category=values['category'],
+            priority=values['priority'], status='Open', user_id=requester.id, user_name=requester.full_name,
+            user_ip_address=requester.ip_address, user_system_name=values['system_name'] or requester.system_name,
+            assigned_to=assigned_to, duplicate_of=original.ticket_id if original else None,
+            created_at=now, updated_at=now,
+        ))
+    return rows, routed
+
+
+def _comment_targets(conn, comments, ticket_keys, user):
+    """ticket id of each comment, checking the tickets exist and user may comment on them"""
+    rejected = []
+    targets = []
+    for item in comments:
+        ticket_id = item.ticket_id if item.ticket_key is None else ticket_keys.get(item.ticket_key)
+        if ticket_id is None:
+            rejected.append({'type': 'comment', 'index': item.index, 'errors': {'ticket_key': ['No such ticket.']}})
+        targets.append(ticket_id)
+
+    owners = dict(conn.execute(select(Ticket.id, Ticket.user_id)
+                               .where(Ticket.id.in_({t for t in targets if t is not None}))).all())
+    for item, ticket_id in zip(comments, targets):
+        if ticket_id is None:
+            continue
+        if ticket_id not in owners:
+            rejected.append({'type': 'comment', 'index': item.index,
+                             'errors': {'ticket_id': ['No such open ticket (it may be archived).']}})
+        elif not user.is_admin and owners[ticket_id] != user.user_id:
+            rejected.append({'type': 'comment', 'index': item.index,
+                             'errors': {'ticket_id': ['Not allowed to comment on this ticket.']}})
+    if rejected:
+        rejected.sort(key=itemgetter('index'))
+        raise IngestError(f"{len(rejected)} items are invalid", rejected, status=422)
+    return targets
+
+
+def ingest(api_token, payload, limit=DEFAULT_MAX_BATCH):
+    """Validate and store a batch of tickets and comments in one transaction.
+
+    Items whose idempotency_key this token has used before are not stored
+    again; their earlier ids are returned with result 'existing'. Tickets
+    are routed and linked to duplicates as in create_ticket, the activity
+    columns of commented tickets are bumped as in add_comment, and the
+    same notification events are written to the outbox.
+    """
+    tickets, comments = validate_payload(payload, limit)
+    keys = _existing_keys(api_token.id, {item.key for item in tickets + comments if item.key}
+                          | {item.ticket_key for item in comments if item.ticket_key})
+    ticket_keys = {key: ticket_id for key, (ticket_id, comment_id) in keys.items() if comment_id is None}
+
+    result = IngestResult()
+    new_tickets = []
+    for item in tickets:
+        if item.key in keys:
+            result.tickets.append({'index': item.index, 'id': keys[item.key][0], 'result': 'existing'})
+        else:
+            new_tickets.append(item)
+    new_comments = []
+    for item in comments:
+        if item.key in keys:
+            ticket_id, comment_id = keys[item.key]
+            result.comments.append({'index': item.index, 'id': comment_id, 'ticket_id': ticket_id,
+                                    'result': 'existing'})
+        else:
+            new_comments.append(item)
+
+    now = datetime.utcnow()
+    # The job may run on the write queue's thread, away from this session
+    token_id, actor = api_token.id, api_token.user_id
+    user = AuthInfo(actor, api_token.user.role, bool(api_token.user.is_admin))
+    ticket_rows, routed = _ticket_rows(new_tickets, _requesters(api_token, new_tickets), now) \
+        if new_tickets else ([], [])
+
+    def store(conn):
+        ticket_ids = []
+        if ticket_rows:
+            ticket_ids = conn.execute(insert(Ticket).returning(Ticket.id, sort_by_parameter_order=True),
+                                      ticket_rows).scalars().all()
+            events = [outbox_row('ticket_created', ticket_id, by=actor) for ticket_id in ticket_ids]
+            events += [outbox_row('ticket_assigned', ticket_id, assigned_to=row['assigned_to'], auto=True)
+                       for ticket_id, row in zip(ticket_ids, ticket_rows) if row['assigned_to']]
+            conn.execute(insert(OutboxEvent), events)
+        created_keys = {item.key: ticket_id for item, ticket_id in zip(new_tickets, ticket_ids) if item.key}
+
+        comment_ids, targets = [], []
+        if new_comments:
+            targets = _comment_targets(conn, new_comments, {**ticket_keys, **created_keys}, user)
+            comment_ids = conn.execute(
+                insert(TicketComment).returning(TicketComment.id, sort_by_parameter_order=True),
+                [dict(ticket_id=ticket_id, user_id=actor, comment=item.comment, created_at=now)
+                 for item, ticket_id in zip(new_comments, targets)]
+            ).scalars().all()
+            # One UPDATE per commented ticket, as add_comment does for one comment
+            counts = {}
+            for ticket_id in targets:
+                counts[ticket_id] = counts.get(ticket_id, 0) + 1
+            conn.execute(
+                update(Ticket).where(Ticket.id == bindparam('target_id')).values(
+                    comment_count=Ticket.comment_count + bindparam('added'),
+                    last_comment_at=now, last_commenter_id=actor, updated_at=now),
+                [{'target_id': ticket_id, 'added': added} for ticket_id, added in counts.items()]
+            )
+            conn.execute(insert(OutboxEvent), [outbox_row('comment_added', ticket_id, by=actor, comment=item.comment)
+                                               for item, ticket_id in zip(new_comments, targets)])
+
+        key_rows = [dict(token_id=token_id, key=key, ticket_id=ticket_id, comment_id=None, created_at=now)
+                    for key, ticket_id in created_keys.items()]
+        key_rows += [dict(token_id=token_id, key=item.key, ticket_id=ticket_id, comment_id=comment_id,
+                          created_at=now)
+                     for item, ticket_id, comment_id in zip(new_comments, targets, comment_ids) if item.key]
+        if key_rows:
+            conn.execute(insert(IngestKey), key_rows)
+        conn.execute(update(ApiToken).where(ApiToken.id == token_id).values(last_used_at=now))
+        return ticket_ids, comment_ids, targets
+
+    try:
+        ticket_ids, comment_ids, targets = run_write(store)
+    except IntegrityError:
+        release_assignees(routed)
+        raise IngestConflict('An idempotency key was used by a concurrent request; retry', status=409)
+    except Exception:
+        release_assignees(routed)
+        raise
+
+    for item, row, ticket_id in zip(new_tickets, ticket_rows, ticket_ids):
+        record_ticket(ticket_id, row['title'], row['description'])
+        result.tickets.append({'index': item.index, 'id': ticket_id, 'result': 'created',
+                               'assigned_to': row['assigned_to'], 'duplicate_of': row['duplicate_of']})
+    for item, comment_id, ticket_id in zip(new_comments, comment_ids, targets):
+        result.comments.append({'index': item.index, 'id': comment_id, 'ticket_id': ticket_id, 'result': 'created'})
+
+    for entry in result.tickets:
+        entry['ticket_number'] = Ticket.format_ticket_number(entry['id'])
+    result.tickets.sort(key=lambda entry: entry['index'])
+    result.comments.sort(key=lambda entry: entry['index'])
+    return result
@@ -0,0 +1,226 @@
+import cProfile
+import logging
+import os
+import threading
+import time
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from auth import get_auth_info
+
+DEFAULT_SLOW_QUERY_MS = 200
+DEFAULT_PROFILE_MAX_FILES = 50
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts = self._values.setdefault(label_values, [0] * len(self.buckets) + [0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        for label_values, counts in sorted(values.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{_label_text(self.labels, label_values, [('le', bound)])} {count}"
+            yield f"{self.name}_bucket{_label_text(self.labels, label_values, [('le', '+Inf')])} {counts[-2]}"
+            yield f"{self.name}_sum{_label_text(self.labels, label_values)} {counts[-1]}"
+            yield f"{self.name}_count{_label_text(self.labels, label_values)} {counts[-2]}"
+
+
+# Metrics are per process; each gunicorn worker exposes its own
+REQUEST_LATENCY = Histogram('helpdesk_request_duration_seconds', 'Request latency by endpoint',
+                            ('endpoint', 'method'))
+REQUESTS = Counter('helpdesk_requests_total', 'Requests by endpoint and status',
+                   ('endpoint', 'method', 'status'))
+REQUEST_QUERIES = Histogram('helpdesk_request_queries', 'SQL statements per request',
+                            ('endpoint',), buckets=QUERY_COUNT_BUCKETS)
+REQUEST_SQL_TIME = Histogram('helpdesk_request_sql_seconds', 'Time spent in SQL per request',
+                             ('endpoint',))
+TEMPLATE_RENDER = Histogram('helpdesk_template_render_seconds', 'Template render time',
+                            ('template',))
+SLOW_QUERIES = Counter('helpdesk_slow_queries_total', 'Queries slower than SLOW_QUERY_MS',
+                       ('endpoint',))
+
+METRICS = (REQUEST_LATENCY, REQUESTS, REQUEST_QUERIES, REQUEST_SQL_TIME, TEMPLATE_RENDER, SLOW_QUERIES)
+
+_slow_query_seconds = DEFAULT_SLOW_QUERY_MS / 1000
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+# SQL timing for every engine; counted against the current request
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('instrumentation_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('instrumentation_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+
+    in_request = has_request_context()
+    if in_request and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_time += elapsed
+
+    if elapsed >= _slow_query_seconds:
+        route = f"{request.method} {request.path} ({_endpoint()})" if in_request else 'outside request'
+        if in_request:
+            SLOW_QUERIES.inc(_endpoint())
+        logging.warning(f"Slow query ({elapsed * 1000:.1f}ms) in {route}: {' '.join(statement.split())}")
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def _is_admin():
+    info = get_auth_info()
+    return bool(info and info.is_admin)
+
+
+def _prune_profiles(directory, keep):
+    """Delete all but the newest keep .prof files in directory"""
+    with os.scandir(directory) as entries:
+        profiles = [entry for entry in entries if entry.name.endswith('.prof')]
+    if len(profiles) <= keep:
+        return
+    # Requests in other threads or processes may be pruning too
+    dumps = []
+    for entry in profiles:
+        try:
+            dumps.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            pass
+    dumps.sort()
+    for _, path in dumps[:len(dumps) - keep]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def init_instrumentation(app):
+    """Record request, SQL and template timings; optionally cProfile requests.
+
+    Profiling is opt-in: with PROFILE_DIR set, an admin's request carrying
+    ?profile=1 writes <PROFILE_DIR>/<endpoint>-<timestamp>.prof for
+    pstats/snakeviz. Only the newest PROFILE_MAX_FILES dumps are kept.
+    """
+    global _slow_query_seconds
+    app.config.setdefault('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)
+    app.config.setdefault('PROFILE_MAX_FILES', DEFAULT_PROFILE_MAX_FILES)
+    _slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000
+
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+
+        # Profiling slows the request down a lot: admins only, as for /metrics
+        profile_dir = app.config.get('PROFILE_DIR')
+        if profile_dir and request.args.get('profile') == '1' and _is_admin():
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def record_request(response):
+        if 'request_started' not in g:
+            return response
+        endpoint = _endpoint()
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            path = os.path.join(app.config['PROFILE_DIR'], f"{endpoint}-{time.time() * 1000:.0f}.prof")
+            profiler.dump_stats(path)
+            logging.info(f"Wrote request profile {path}")
+            _prune_profiles(app.config['PROFILE_DIR'], app.config['PROFILE_MAX_FILES'])
+
+        REQUEST_LATENCY.observe(time.perf_counter() - g.request_started, endpoint, request.method)
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        REQUEST_QUERIES.observe(g.sql_count, endpoint)
+        REQUEST_SQL_TIME.observe(g.sql_time, endpoint)
+        return response
+
+    @before_render_template.connect_via(app)
+    def start_template_timer(sender, template, context, **extra):
+        g.setdefault('template_started', []).append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def record_template(sender, template, context, **extra):
+        started = g.get('template_started')
+        if started:
+            TEMPLATE_RENDER.observe(time.perf_counter() - started.pop(), template.name or 'string')
@@ -0,0 +1,242 @@
+import json
+import logging
+import queue
+import threading
+import time
+from sqlalchemy import func, select
+from app import db
+from models import Ticket, OutboxEvent
+
+DEFAULT_POLL_SECONDS = 1
+DEFAULT_KEEPALIVE_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# A stream ends after DEFAULT_STREAM_SECONDS and the browser reconnects, so
+# an open dashboard doesn't hold a worker thread for good; at most
+# DEFAULT_MAX_STREAMS are open at once per process
+DEFAULT_STREAM_SECONDS = 45
+DEFAULT_MAX_STREAMS = 16
+RECONNECT_MS = 5000
+BUSY_RETRY_MS = 15000
+
+# Events fetched per poll, and replayed to a client reconnecting with Last-Event-ID
+FETCH_LIMIT = 500
+REPLAY_LIMIT = 100
+
+
+class EventBroker:
+    """In-process pub/sub: every subscriber gets its own bounded queue.
+
+    A subscriber that falls SUBSCRIBER_QUEUE_SIZE events behind misses
+    events rather than slowing down publishing; the browser resynchronizes
+    with Last-Event-ID when it reconnects.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                pass
+
+
+def _event_query():
+    return select(OutboxEvent.id, OutboxEvent.event_type, OutboxEvent.payload, OutboxEvent.created_at,
+                  Ticket.id.label('ticket_id'), Ticket.title, Ticket.status, Ticket.priority, Ticket.category,
+                  Ticket.user_id, Ticket.assigned_to, Ticket.comment_count) \
+        .join(Ticket, Ticket.id == OutboxEvent.ticket_id)
+
+
+def _row_to_event(row):
+    payload = json.loads(row.payload or '{}')
+    payload.pop('comment', None)
+    return {
+        'id': row.id,
+        'type': row.event_type,
+        'ticket_id': row.ticket_id,
+        'ticket_number': Ticket.format_ticket_number(row.ticket_id),
+        'title': row.title,
+        'status': row.status,
+        'priority': row.priority,
+        'category': row.category,
+        'user_id': row.user_id,
+        'assigned_to': row.assigned_to,
+        'comment_count': row.comment_count,
+        'by': payload.get('by'),
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+def fetch_events_after(last_id, limit=FETCH_LIMIT):
+    rows = db.session.execute(_event_query().where(OutboxEvent.id > last_id)
+                              .order_by(OutboxEvent.id).limit(limit)).all()
+    return [_row_to_event(row) for row in rows]
+
+
+def is_relevant(event, user_id, role):
+    """Super admins see everything, admins their assigned tickets, users their own"""
+    if role == 'super_admin':
+        return True
+    if role == 'admin':
+        return event['assigned_to'] == user_id
+    return event['user_id'] == user_id
+
+
+class DatabaseEventFeed:
+    """Tail the outbox table and publish new events to this process's broker.
+
+    The outbox is written in the same transaction as every ticket change,
+    so polling it by id fans events out across all gunicorn workers without
+    a separate broker; each process runs one feed however many clients it
+    serves, and only polls while someone is subscribed.
+    """
+
+    def __init__(self, app, broker, poll_seconds=DEFAULT_POLL_SECONDS):
+        self.app = app
+        self.broker = broker
+        self.poll_seconds = poll_seconds
+        self._last_id = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='live-events', daemon=True)
+                self._thread.start()
+
+    def poll(self):
+        """Publish events written since the last poll; returns how many"""
+        if self._last_id is None:
+            self._last_id = db.session.execute(select(func.max(OutboxEvent.id))).scalar() or 0
+            return 0
+        events = fetch_events_after(self._last_id)
+        for event in events:
+            self.broker.publish(event)
+        if events:
+            self._last_id = events[-1]['id']
+        return len(events)
+
+    def _run(self):
+        while True:
+            if self.broker.has_subscribers():
+                with self.app.app_context():
+                    try:
+                        self.poll()
+                    except Exception as e:
+                        logging.error(f"Live event feed error: {e}")
+                    finally:
+                        db.session.remove()
+            else:
+                # Start again from the newest event when the next client connects
+                self._last_id = None
+            time.sleep(self.poll_seconds)
+
+
+class StreamSlots:
+    """Caps the event streams one process serves at the same time"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a slot; returns the callable that frees it, or None when all are in use"""
+        with self._lock:
+            if self._open >= self.limit:
+                return None
+            self._open += 1
+        return self._release
+
+    def _release(self):
+        with self._lock:
+            self._open -= 1
+
+
+broker = EventBroker()
+_feed = None
+_slots = StreamSlots(DEFAULT_MAX_STREAMS)
+
+
+def init_live_events(app):
+    global _feed, _slots
+    _feed = DatabaseEventFeed(app, broker, poll_seconds=app.config.get('LIVE_EVENTS_POLL_SECONDS',
+                                                                          DEFAULT_POLL_SECONDS))
+    _slots = StreamSlots(app.config.get('LIVE_EVENTS_MAX_STREAMS', DEFAULT_MAX_STREAMS))
+
+
+def acquire_stream_slot():
+    return _slots.acquire()
+
+
+def _format(event):
+    return f"id: {event['id']}\nevent: ticket\ndata: {json.dumps(event)}\n\n"
+
+
+def _cursor(last_id):
+    """Move the browser's Last-Event-ID past events this user was not sent"""
+    return f"id: {last_id}\nevent: cursor\ndata: {last_id}\n\n"
+
+
+def stream_events(user_id, role, last_event_id=None, keepalive_seconds=DEFAULT_KEEPALIVE_SECONDS,
+                  lifetime_seconds=DEFAULT_STREAM_SECONDS):
+    """Generate the text/event-stream body for one connected user.
+
+    Replays missed events after last_event_id first, then relays live ones
+    for lifetime_seconds. The stream starts and ends with a cursor at the
+    newest event seen, so the reconnecting browser's Last-Event-ID replays
+    whatever happened in between.
+    """
+    subscription = broker.subscribe()
+    _feed.start()
+    deadline = time.monotonic() + lifetime_seconds
+    try:
+        yield f"retry: {RECONNECT_MS}\n\n"
+        last_sent = 0
+        if last_event_id is None:
+            cursor = db.session.execute(select(func.max(OutboxEvent.id))).scalar() or 0
+        else:
+            cursor = last_event_id
+            for event in fetch_events_after(last_event_id, limit=REPLAY_LIMIT):
+                if is_relevant(event, user_id, role):
+                    yield _format(event)
+                last_sent = cursor = event['id']
+        # Don't hold a database connection for the life of the stream
+        db.session.remove()
+        yield _cursor(cursor)
+
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                event = subscription.get(timeout=min(keepalive_seconds, remaining))
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if event['id'] <= last_sent:
+                continue
+            cursor = max(cursor, event['id'])
+            if is_relevant(event, user_id, role):
+                yield _format(event)
+        yield _cursor(cursor)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,80 @@
+import logging
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, selectinload
+from models import Ticket, TicketComment, ArchivedTicket, ArchivedTicketComment
+
+DEFAULT_QUERY_BUDGET = 20
+
+
+# Loader profiles: the relationships each page's template walks
+
+def ticket_detail_options():
+    """view_ticket: submitter, assignee and every comment with its author"""
+    return (
+        joinedload(Ticket.user),
+        joinedload(Ticket.assignee),
+        selectinload(Ticket.comments).joinedload(TicketComment.user),
+    )
+
+
+def archived_ticket_detail_options():
+    """view_ticket for an archived ticket: the same, from the archive tables"""
+    return (
+        joinedload(ArchivedTicket.user),
+        joinedload(ArchivedTicket.assignee),
+        selectinload(ArchivedTicket.comments).joinedload(ArchivedTicketComment.user),
+    )
+
+
+def ticket_people_options():
+    """edit_ticket / assign_work: submitter and assignee"""
+    return (
+        joinedload(Ticket.user),
+        joinedload(Ticket.assignee),
+    )
+
+
+def ticket_list_options():
+    """Dashboard rows that show the assignee"""
+    return (
+        joinedload(Ticket.assignee),
+    )
+
+
+# Debug-mode query counter
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+
+
+def init_query_counter(app):
+    """Warn when a request issues more SQL statements than QUERY_BUDGET.
+
+    Active when the app runs in debug mode or QUERY_COUNTER_ENABLED is set.
+    """
+    app.config.setdefault('QUERY_BUDGET', DEFAULT_QUERY_BUDGET)
+
+    def enabled():
+        return app.debug or app.config.get('QUERY_COUNTER_ENABLED', False)
+
+    @app.before_request
+    def start_query_count():
+        if enabled():
+            g.query_count = 0
+            g.query_count_started = time.perf_counter()
+
+    @app.after_request
+    def check_query_budget(response):
+        if 'query_count' in g:
+            budget = app.config['QUERY_BUDGET']
+            elapsed_ms = (time.perf_counter() - g.query_count_started) * 1000
+            if g.query_count > budget:
+                logging.warning(f"{request.method} {request.path} ran {g.query_count} queries "
+                                f"(budget {budget}) in {elapsed_ms:.1f}ms")
+            response.headers['X-Query-Count'] = str(g.query_count)
+        return response
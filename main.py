@@ -1,5 +1,12 @@
-from app import app
-import routes  # noqa: F401
+from app import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
+    # Development server: create the schema and default accounts on first run
+    from migrations import init_database
+    from seed import create_default_admin
+    with app.app_context():
+        init_database()
+        create_default_admin()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,178 @@
+import logging
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.schema import CreateColumn
+from app import db
+from models import User, Ticket, TicketComment, ArchivedTicket
+from stats import RESOLVED_STATUSES
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def add_missing_columns():
+    """Add model columns that the live database tables are missing.
+
+    db.create_all() never alters existing tables, so columns added to a
+    model after the database was created are added here with ALTER TABLE.
+    """
+    inspector = inspect(db.engine)
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            added.append(f"{table.name}.{column.name}")
+            logging.info(f"Added column {table.name}.{column.name}")
+
+    return added
+
+
+def backfill_comment_activity(batch_size=BACKFILL_BATCH_SIZE):
+    """Recompute comment_count / last_comment_at / last_commenter_id from ticket_comments"""
+    comments = TicketComment.__table__
+    count_query = select(func.count()).where(comments.c.ticket_id == Ticket.id).scalar_subquery()
+    last_at_query = select(func.max(comments.c.created_at)).where(comments.c.ticket_id == Ticket.id).scalar_subquery()
+    last_user_query = select(comments.c.user_id).where(comments.c.ticket_id == Ticket.id) \
+        .order_by(comments.c.created_at.desc(), comments.c.id.desc()).limit(1).scalar_subquery()
+
+    max_id = db.session.query(func.max(Ticket.id)).scalar() or 0
+    updated = 0
+    for start in range(0, max_id, batch_size):
+        result = db.session.execute(
+            update(Ticket)
+            .where(Ticket.id > start, Ticket.id <= start + batch_size)
+            .values(comment_count=count_query, last_comment_at=last_at_query,
+                    last_commenter_id=last_user_query,
+                    # Recounting is not an edit: keep updated_at (onupdate would bump it)
+                    updated_at=Ticket.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        updated += result.rowcount
+
+    logging.info(f"Backfilled comment activity for {updated} tickets")
+    return updated
+
+
+def backfill_resolved_at():
+    """Give resolved and closed tickets without a resolved_at one.
+
+    Older versions only recorded resolved_at for Resolved tickets and
+    cleared it on close; their last update is the closest time on record.
+    """
+    updated = 0
+    for model in (Ticket, ArchivedTicket):
+        result = db.session.execute(
+            update(model)
+            .where(model.status.in_(RESOLVED_STATUSES), model.resolved_at.is_(None))
+            .values(resolved_at=model.updated_at, updated_at=model.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+    db.session.commit()
+
+    if updated:
+        logging.info(f"Backfilled resolved_at for {updated} tickets")
+    return updated
+
+
+def create_missing_indexes():
+    """Create any model-declared index that the live database is missing.
+
+    db.create_all() only creates indexes together with new tables, so
+    databases created before an index was added need this step.
+    """
+    inspector = inspect(db.engine)
+    created = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if index.name in existing:
+                continue
+            index.create(bind=db.engine)
+            created.append(index.name)
+            logging.info(f"Created index {index.name} on {table.name}")
+
+    return created
+
+
+def dashboard_queries(admin_id=1, user_id=1, ticket_id=1):
+    """Representative dashboard queries, keyed by a short label"""
+    return {
+        'admin_dashboard': Ticket.query.filter_by(assigned_to=admin_id, status='Open')
+            .order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(26),
+        'admin_stats': db.session.query(Ticket.status, db.func.count(Ticket.id))
+            .filter(Ticket.assigned_to == admin_id).group_by(Ticket.status),
+        'user_dashboard': Ticket.query.filter_by(user_id=user_id)
+            .order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(26),
+        'recent_tickets': Ticket.query.order_by(Ticket.created_at.desc()).limit(10),
+        'recent_activity': Ticket.query.filter(Ticket.last_comment_at.isnot(None))
+            .order_by(Ticket.last_comment_at.desc(), Ticket.id.desc()).limit(26),
+        'status_filter': Ticket.query.filter_by(status='Open')
+            .order_by(Ticket.created_at.desc()).limit(26),
+        'ticket_comments': TicketComment.query.filter_by(ticket_id=ticket_id)
+            .order_by(TicketComment.created_at),
+        'user_lookup': User.query.filter_by(username='superadmin'),
+    }
+
+
+def explain(query):
+    """Return the database's query plan for a SQLAlchemy query as text lines"""
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect.name == 'sqlite':
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        return [row[-1] for row in rows]
+
+    rows = db.session.execute(text(f"EXPLAIN {sql}")).all()
+    return [row[0] for row in rows]
+
+
+def uses_index(plan):
+    """Whether a query plan reads through an index instead of scanning the table"""
+    for line in plan:
+        upper = line.upper()
+        # SQLite reports "SEARCH ... USING INDEX", PostgreSQL "Index Scan"
+        if 'USING INDEX' in upper or 'USING COVERING INDEX' in upper or 'INDEX SCAN' in upper \
+                or 'INDEX ONLY SCAN' in upper or 'BITMAP INDEX SCAN' in upper \
+                or 'USING INTEGER PRIMARY KEY' in upper:
+            return True
+    return False
+
+
+def check_dashboard_indexes():
+    """Explain every dashboard query and report whether it uses an index"""
+    results = {}
+    for label, query in dashboard_queries().items():
+        plan = explain(query)
+        results[label] = (uses_index(plan), plan)
+    return results
+
+
+def init_database():
+    """Create missing tables, bring older ones up to date (columns and indexes) and install search.
+
+    Safe to run repeatedly; used by `flask init-db` and on deploy.
+    """
+    db.create_all()
+    logging.info("Database tables created")
+
+    # Bring tables created by older versions up to date
+    if 'tickets.comment_count' in add_missing_columns():
+        backfill_comment_activity()
+    create_missing_indexes()
+    backfill_resolved_at()
+
+    # Full-text search index over tickets and comments
+    from search import install_search
+    return install_search()
@@ -1,6 +1,6 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from passwords import hash_password, verify_password
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -25,11 +25,11 @@ class User(db.Model):
     
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check password against hash"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
     
     @property
     def full_name(self):
@@ -48,6 +48,24 @@ class User(db.Model):
 
 class Ticket(db.Model):
     __tablename__ = 'tickets'
+    __table_args__ = (
+        # Admin dashboard: assigned tickets filtered by status, newest first
+        db.Index('ix_tickets_assigned_status_created', 'assigned_to', 'status', 'created_at'),
+        # User dashboard: own tickets, newest first
+        db.Index('ix_tickets_user_created', 'user_id', 'created_at'),
+        # Status counts and status-filtered listings
+        db.Index('ix_tickets_status_created', 'status', 'created_at'),
+        db.Index('ix_tickets_category', 'category'),
+        db.Index('ix_tickets_priority', 'priority'),
+        # Recent tickets and keyset pagination over all tickets
+        db.Index('ix_tickets_created_id', 'created_at', 'id'),
+        # Listing by latest comment activity
+        db.Index('ix_tickets_last_comment_id', 'last_comment_at', 'id'),
+        # Analytics rollups: tickets resolved or closed since the watermark
+        db.Index('ix_tickets_status_updated', 'status', 'updated_at'),
+        # Tickets auto-linked to an earlier one as likely duplicates
+        db.Index('ix_tickets_duplicate_of', 'duplicate_of'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -70,18 +88,40 @@ class Ticket(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     resolved_at = db.Column(db.DateTime, nullable=True)
     
+    # Comment activity, maintained by add_comment (see migrations.backfill_comment_activity)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_comment_at = db.Column(db.DateTime, nullable=True)
+    last_commenter_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    
+    # Earlier open ticket this one looks like, set by create_ticket (see duplicates.py).
+    # Not a foreign key: the earlier ticket may be archived first
+    duplicate_of = db.Column(db.Integer, nullable=True)
+    
+    last_commenter = db.relationship('User', foreign_keys=[last_commenter_id])
+    
     # Relationship with comments
-    comments = db.relationship('TicketComment', backref='ticket', lazy=True, cascade='all, delete-orphan')
+    comments = db.relationship('TicketComment', backref='ticket', lazy=True, cascade='all, delete-orphan',
+                               order_by='TicketComment.created_at')
+    
+    # Tickets in the hot table can still change; see ArchivedTicket
+    is_archived = False
     
     @property
     def ticket_number(self):
-        return f"GTN-{self.id:06d}"
+        return self.format_ticket_number(self.id)
+    
+    @staticmethod
+    def format_ticket_number(ticket_id):
+        return f"GTN-{ticket_id:06d}"
     
     def __repr__(self):
         return f'<Ticket {self.ticket_number}: {self.title}>'
 
 class TicketComment(db.Model):
     __tablename__ = 'ticket_comments'
+    __table_args__ = (
+        db.Index('ix_ticket_comments_ticket_created', 'ticket_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
@@ -94,3 +134,178 @@ class TicketComment(db.Model):
     
     def __repr__(self):
         return f'<Comment {self.id} on Ticket {self.ticket_id}>'
+
+class ArchivedTicket(db.Model):
+    """Resolved or closed ticket moved out of `tickets` by archive.archive_tickets.
+
+    Keeps the original id and columns so ticket numbers, links and search
+    results stay valid; archived tickets are read-only.
+    """
+    __tablename__ = 'archived_tickets'
+    __table_args__ = (
+        # A user's own tickets in search results
+        db.Index('ix_archived_tickets_user_created', 'user_id', 'created_at'),
+        # Analytics rollups: tickets created or resolved within a window
+        db.Index('ix_archived_tickets_created', 'created_at'),
+        db.Index('ix_archived_tickets_updated', 'updated_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    priority = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    
+    user_name = db.Column(db.String(100), nullable=False)
+    user_ip_address = db.Column(db.String(45), nullable=True)
+    user_system_name = db.Column(db.String(100), nullable=True)
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    assigned_to = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+    
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_comment_at = db.Column(db.DateTime, nullable=True)
+    last_commenter_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    duplicate_of = db.Column(db.Integer, nullable=True)
+    
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    user = db.relationship('User', foreign_keys=[user_id])
+    assignee = db.relationship('User', foreign_keys=[assigned_to])
+    last_commenter = db.relationship('User', foreign_keys=[last_commenter_id])
+    comments = db.relationship('ArchivedTicketComment', backref='ticket', lazy=True,
+                               order_by='ArchivedTicketComment.created_at')
+    
+    is_archived = True
+    format_ticket_number = staticmethod(Ticket.format_ticket_number)
+    
+    @property
+    def ticket_number(self):
+        return self.format_ticket_number(self.id)
+    
+    def __repr__(self):
+        return f'<ArchivedTicket {self.ticket_number}: {self.title}>'
+
+class ArchivedTicketComment(db.Model):
+    """Comment of an archived ticket, with its original id"""
+    __tablename__ = 'archived_ticket_comments'
+    __table_args__ = (
+        db.Index('ix_archived_ticket_comments_ticket_created', 'ticket_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    ticket_id = db.Column(db.Integer, db.ForeignKey('archived_tickets.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    comment = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime)
+    
+    user = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<ArchivedComment {self.id} on Ticket {self.ticket_id}>'
+
+class OutboxEvent(db.Model):
+    """Ticket lifecycle event waiting to be delivered by the notification worker"""
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        db.Index('ix_outbox_events_pending', 'sent_at', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(40), nullable=False)  # ticket_created, ticket_assigned, status_changed, comment_added
+    ticket_id = db.Column(db.Integer, db.ForeignKey('tickets.id'), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Delivery state
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboxEvent {self.id} {self.event_type} on Ticket {self.ticket_id}>'
+
+class TicketDailyRollup(db.Model):
+    """Per-day ticket counts and resolution times for one category, priority or assignee.
+
+    Maintained by analytics.run_rollups; dimension 'all' (key '') holds the
+    daily totals.
+    """
+    __tablename__ = 'ticket_daily_rollups'
+    __table_args__ = (
+        db.Index('ix_ticket_daily_rollups_day_dimension_key', 'day', 'dimension', 'key', unique=True),
+        db.Index('ix_ticket_daily_rollups_dimension_day', 'dimension', 'day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)  # all, category, priority, assignee
+    key = db.Column(db.String(100), nullable=False)  # category/priority name, admin id or 'unassigned'
+    
+    opened = db.Column(db.Integer, nullable=False, default=0)
+    resolved = db.Column(db.Integer, nullable=False, default=0)
+    backlog = db.Column(db.Integer, nullable=False, default=0)  # still open at the end of the day
+    median_resolution_seconds = db.Column(db.Float, nullable=True)  # of tickets resolved that day
+    p90_resolution_seconds = db.Column(db.Float, nullable=True)
+    
+    def __repr__(self):
+        return f'<TicketDailyRollup {self.day} {self.dimension}={self.key}>'
+
+class AnalyticsWatermark(db.Model):
+    """How far a rollup has been computed; the next run starts from value"""
+    __tablename__ = 'analytics_watermarks'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AnalyticsWatermark {self.name}={self.value}>'
+
+class ApiToken(db.Model):
+    """Bearer token for the JSON ingestion API; only its SHA-256 is stored.
+
+    Tickets and comments sent with the token are created as its user.
+    """
+    __tablename__ = 'api_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # e.g. the sending system
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=True)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+    
+    user = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<ApiToken {self.id} {self.name}>'
+
+class IngestKey(db.Model):
+    """Idempotency key of a ticket or comment created through the ingestion API.
+
+    A retried item with the same key (per token) returns the row created the
+    first time instead of a second copy. The ids are not foreign keys: the
+    ticket may be archived later.
+    """
+    __tablename__ = 'ingest_keys'
+    __table_args__ = (
+        db.Index('ix_ingest_keys_token_key', 'token_id', 'key', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    token_id = db.Column(db.Integer, db.ForeignKey('api_tokens.id'), nullable=False)
+    key = db.Column(db.String(200), nullable=False)
+    ticket_id = db.Column(db.Integer, nullable=True)
+    comment_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<IngestKey {self.token_id}:{self.key}>'
@@ -0,0 +1,301 @@
+import json
+import logging
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from sqlalchemy import delete, insert, select, update
+from app import db
+from models import User, Ticket, OutboxEvent
+
+EVENT_TYPES = ('ticket_created', 'ticket_assigned', 'status_changed', 'comment_added')
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_POLL_SECONDS = 2
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_BACKOFF_SECONDS = 10
+MAX_BACKOFF_SECONDS = 3600
+
+# A claimed event is invisible to other workers for this long while it is sent
+CLAIM_LEASE_SECONDS = 60
+
+# Delivered events are kept this long (live dashboards replay from them),
+# then deleted in batches of PRUNE_BATCH_SIZE about once per PRUNE_INTERVAL_SECONDS
+DEFAULT_RETENTION_DAYS = 7
+PRUNE_BATCH_SIZE = 1000
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+# Writing events: always inside the transaction that changes the ticket
+
+def outbox_row(event_type, ticket_id, **payload):
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown event type {event_type}")
+    now = datetime.utcnow()
+    return dict(event_type=event_type, ticket_id=ticket_id, payload=json.dumps(payload),
+                created_at=now, next_attempt_at=now, attempts=0)
+
+
+def enqueue_event(event_type, ticket_id, conn=None, **payload):
+    """Record an event for the notification worker.
+
+    With conn (a write-queue job's connection) the row is inserted there;
+    otherwise it is added to the request's session and committed with it.
+    """
+    row = outbox_row(event_type, ticket_id, **payload)
+    if conn is not None:
+        conn.execute(insert(OutboxEvent).values(**row))
+    else:
+        db.session.add(OutboxEvent(**row))
+
+
+def enqueue_events(event_type, ticket_ids, **payload):
+    """Record the same event for many tickets with one executemany INSERT"""
+    if ticket_ids:
+        db.session.execute(insert(OutboxEvent), [outbox_row(event_type, ticket_id, **payload)
+                                                 for ticket_id in ticket_ids])
+
+
+# Turning events into messages (worker side, off the request path)
+
+def _recipients(event, ticket, payload, super_admin_emails):
+    submitter = ticket.user.email if ticket.user else None
+    assignee = ticket.assignee.email if ticket.assignee else None
+
+    if event.event_type == 'ticket_created':
+        recipients = [submitter] + super_admin_emails
+    elif event.event_type == 'ticket_assigned':
+        recipients = [assignee, submitter]
+    elif event.event_type == 'status_changed':
+        recipients = [submitter]
+    else:
+        recipients = [submitter, assignee]
+
+    actor = db.session.get(User, payload['by']) if payload.get('by') else None
+    return sorted({email for email in recipients if email and (actor is None or email != actor.email)})
+
+
+def _subject_and_body(event, ticket, payload):
+    number = ticket.ticket_number
+    if event.event_type == 'ticket_created':
+        return (f"[{number}] New ticket: {ticket.title}",
+                f"{ticket.user_name} opened {number} ({ticket.category}, {ticket.priority}).\n\n{ticket.description}")
+    if event.event_type == 'ticket_assigned':
+        assignee = ticket.assignee.full_name if ticket.assignee else 'nobody'
+        return (f"[{number}] Assigned to {assignee}",
+                f"{number} \"{ticket.title}\" is now assigned to {assignee}.")
+    if event.event_type == 'status_changed':
+        return (f"[{number}] Status: {payload.get('new_status', ticket.status)}",
+                f"{number} \"{ticket.title}\" changed from {payload.get('old_status', 'unknown')} "
+                f"to {payload.get('new_status', ticket.status)}.")
+    return (f"[{number}] New comment",
+            f"A new comment was added to {number} \"{ticket.title}\".\n\n{payload.get('comment', '')}")
+
+
+def build_messages(event, sender, super_admin_emails=()):
+    """Email messages for one outbox event"""
+    ticket = db.session.get(Ticket, event.ticket_id)
+    if ticket is None:
+        return []
+    payload = json.loads(event.payload or '{}')
+    recipients = _recipients(event, ticket, payload, list(super_admin_emails))
+    if not recipients:
+        return []
+
+    subject, body = _subject_and_body(event, ticket, payload)
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = ', '.join(recipients)
+    message['Subject'] = subject
+    message.set_content(body)
+    return [message]
+
+
+class SMTPMailer:
+    """Sends a batch of messages over one SMTP connection"""
+
+    def __init__(self, host, port, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def open(self):
+        return smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+
+
+class OutboxWorker:
+    """Drain the outbox in batches, retrying failed deliveries with exponential backoff.
+
+    Several workers (one per gunicorn process, or `flask outbox-worker`) can
+    run against one database; each claims events with a conditional UPDATE
+    so an event is only sent by the worker that claimed it. Workers also
+    delete events delivered more than retention_days ago.
+    """
+
+    def __init__(self, app, mailer, batch_size=DEFAULT_BATCH_SIZE, poll_seconds=DEFAULT_POLL_SECONDS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_seconds=DEFAULT_BACKOFF_SECONDS,
+                 retention_days=DEFAULT_RETENTION_DAYS):
+        self.app = app
+        self.mailer = mailer
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.retention_days = retention_days
+        self.sender = app.config.get('MAIL_FROM', 'helpdesk@localhost')
+        self._thread = None
+        self._pruned_at = None
+
+    def _backoff(self, attempts):
+        return timedelta(seconds=min(self.backoff_seconds * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+    def _claim_batch(self):
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=CLAIM_LEASE_SECONDS)
+        candidates = db.session.execute(
+            select(OutboxEvent.id, OutboxEvent.next_attempt_at)
+            .where(OutboxEvent.sent_at.is_(None), OutboxEvent.attempts < self.max_attempts,
+                   OutboxEvent.next_attempt_at <= now)
+            .order_by(OutboxEvent.next_attempt_at, OutboxEvent.id)
+            .limit(self.batch_size)
+        ).all()
+
+        claimed = []
+        for event_id, seen in candidates:
+            result = db.session.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id == event_id, OutboxEvent.next_attempt_at == seen)
+                .values(next_attempt_at=lease_until)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                claimed.append(event_id)
+        db.session.commit()
+
+        if not claimed:
+            return []
+        return db.session.execute(select(OutboxEvent).where(OutboxEvent.id.in_(claimed))
+                                  .order_by(OutboxEvent.id)).scalars().all()
+
+    def _deliver(self, events):
+        """Send every event; returns {event_id: error or None}"""
+        super_admin_emails = [email for (email,) in db.session.execute(
+            select(User.email).where(User.role == 'super_admin')).all()]
+        results = {}
+        try:
+            smtp = self.mailer.open()
+        except Exception as e:
+            return {event.id: f"connect: {e}" for event in events}
+
+        with smtp:
+            for event in events:
+                try:
+                    for message in build_messages(event, self.sender, super_admin_emails):
+                        smtp.send_message(message)
+                    results[event.id] = None
+                except Exception as e:
+                    results[event.id] = str(e)
+        return results
+
+    def process_batch(self):
+        """Claim, send and record one batch; returns the number of events handled"""
+        events = self._claim_batch()
+        if not events:
+            return 0
+
+        results = self._deliver(events)
+        now = datetime.utcnow()
+        for event in events:
+            error = results.get(event.id)
+            if error is None:
+                event.sent_at = now
+                event.last_error = None
+            else:
+                event.attempts += 1
+                event.next_attempt_at = now + self._backoff(event.attempts)
+                event.last_error = error[:1000]
+                if event.attempts >= self.max_attempts:
+                    logging.error(f"Giving up on outbox event {event.id} after {event.attempts} attempts: {error}")
+                else:
+                    logging.warning(f"Outbox event {event.id} failed (attempt {event.attempts}), "
+                                    f"retrying at {event.next_attempt_at:%H:%M:%S}: {error}")
+        db.session.commit()
+        return len(events)
+
+    def prune_sent(self, now=None):
+        """Delete events delivered more than retention_days ago; returns how many.
+
+        Deletes PRUNE_BATCH_SIZE rows per transaction so ticket writes are
+        not held up. Undelivered and abandoned events are kept.
+        """
+        if not self.retention_days:
+            return 0
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        deleted = 0
+        while True:
+            batch = select(OutboxEvent.id).where(OutboxEvent.sent_at < cutoff).limit(PRUNE_BATCH_SIZE)
+            count = db.session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(batch))
+                                       .execution_options(synchronize_session=False)).rowcount
+            db.session.commit()
+            deleted += count
+            if count < PRUNE_BATCH_SIZE:
+                break
+        if deleted:
+            logging.info(f"Pruned {deleted} outbox events delivered before {cutoff:%Y-%m-%d %H:%M}")
+        return deleted
+
+    def _prune_if_due(self):
+        now = time.monotonic()
+        if self._pruned_at is None or now - self._pruned_at >= PRUNE_INTERVAL_SECONDS:
+            self._pruned_at = now
+            self.prune_sent()
+
+    def run(self, once=False):
+        """Process batches until stopped (or until the outbox is empty with once=True)"""
+        while True:
+            with self.app.app_context():
+                try:
+                    self._prune_if_due()
+                    handled = self.process_batch()
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Outbox worker error: {e}")
+                    handled = 0
+            if once and not handled:
+                return
+            if handled < self.batch_size:
+                time.sleep(self.poll_seconds if not once else 0)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='outbox-worker', daemon=True)
+            self._thread.start()
+
+
+def create_worker(app):
+    return OutboxWorker(
+        app,
+        SMTPMailer(app.config.get('MAIL_SERVER', 'localhost'), app.config.get('MAIL_PORT', 1025)),
+        batch_size=app.config.get('OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+        poll_seconds=app.config.get('OUTBOX_POLL_SECONDS', DEFAULT_POLL_SECONDS),
+        max_attempts=app.config.get('OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+        backoff_seconds=app.config.get('OUTBOX_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS),
+        retention_days=app.config.get('OUTBOX_RETENTION_DAYS', DEFAULT_RETENTION_DAYS),
+    )
+
+
+def init_notifications(app):
+    """Start the in-process outbox worker with the first request when OUTBOX_WORKER is set.
+
+    Starting lazily keeps CLI commands and scripts from spawning it; set
+    OUTBOX_WORKER=0 and run `flask outbox-worker` to deliver from a
+    separate process instead.
+    """
+    if not app.config.get('OUTBOX_WORKER', True):
+        return
+    worker = create_worker(app)
+
+    @app.before_request
+    def start_outbox_worker():
+        worker.start()
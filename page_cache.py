@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from flask import g, make_response, request, session
+
+DEFAULT_TTL = 30
+DEFAULT_SIZE = 1024
+
+# Bumped after every request that writes; part of every dashboard cache key
+TICKETS_VERSION_KEY = 'tickets:version'
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, maxsize=DEFAULT_SIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            _, value = self._data.get(key, (None, 0))
+            self._data[key] = (None, value + 1)
+            return value + 1
+
+    def version(self, key):
+        """Current value of a counter kept with incr(); 0 before the first incr"""
+        return self.get(key) or 0
+
+
+class RedisCache:
+    """Same interface backed by a Redis-compatible server, shared by all workers"""
+
+    def __init__(self, url, ttl=DEFAULT_TTL, prefix='gtn:', client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def version(self, key):
+        """Current value of a counter kept with incr(); stored as a plain integer, not pickled"""
+        return int(self.client.get(self.prefix + key) or 0)
+
+
+_cache = None
+
+
+def init_page_cache(app):
+    """Create the page cache (PAGE_CACHE_URL selects Redis) and invalidate it after writes"""
+    global _cache
+    app.config.setdefault('PAGE_CACHE_TTL', DEFAULT_TTL)
+    ttl = app.config['PAGE_CACHE_TTL']
+
+    url = app.config.get('PAGE_CACHE_URL')
+    _cache = None
+    if url:
+        try:
+            _cache = RedisCache(url, ttl=ttl)
+        except ImportError:
+            logging.warning("PAGE_CACHE_URL is set but the redis package is not installed; "
+                            "using the in-process cache")
+    if _cache is None:
+        _cache = LRUCache(maxsize=app.config.get('PAGE_CACHE_SIZE', DEFAULT_SIZE), ttl=ttl)
+
+    @app.after_request
+    def invalidate_after_write(response):
+        if g.get('db_wrote'):
+            invalidate_tickets()
+        return response
+
+
+def get_cache():
+    return _cache
+
+
+def invalidate_tickets():
+    """Expire every cached dashboard; ticket pages are versioned by updated_at"""
+    if _cache is not None:
+        _cache.incr(TICKETS_VERSION_KEY)
+
+
+def _time_bucket():
+    # Bounds staleness of per-process caches and of rendered CSRF tokens to one TTL window
+    ttl = getattr(_cache, 'ttl', DEFAULT_TTL) or DEFAULT_TTL
+    return int(time.time() // ttl)
+
+
+def dashboard_cache_key(name, user_id, args=None):
+    """Key for a dashboard page: user, filters and the global tickets version"""
+    version = _cache.version(TICKETS_VERSION_KEY) if _cache is not None else 0
+    query = '&'.join(f"{k}={v}" for k, v in sorted((args or {}).items()))
+    return f"dashboard:{name}:{user_id}:{query}:{version}:{_time_bucket()}"
+
+
+def ticket_cache_key(ticket, user):
+    """Key for a ticket page: its update version plus the viewer and their CSRF session"""
+    version = f"{ticket.updated_at.isoformat() if ticket.updated_at else ''}:{ticket.comment_count}" \
+              f"{':archived' if ticket.is_archived else ''}"
+    return f"ticket:{ticket.id}:{version}:{user.id}:{session.get('csrf_token', '')}:{_time_bucket()}"
+
+
+def _etag(key):
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def cached_page(key, render):
+    """Serve a rendered page from the cache with an ETag, answering 304 when the browser has it.
+
+    Pages with pending flash messages are rendered fresh and not cached.
+    """
+    if session.get('_flashes') or _cache is None:
+        return make_response(render())
+
+    etag = _etag(key)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        html = _cache.get(key)
+        if html is None:
+            html = render()
+            _cache.set(key, html)
+        response = make_response(html)
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,81 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug's default; cost is encoded in the method string, e.g. scrypt:N:r:p or pbkdf2:sha256:iterations
+DEFAULT_HASH_METHOD = 'scrypt:32768:8:1'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _config(key, default):
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def hash_method():
+    return _config('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+
+
+def _get_executor():
+    """Bounded pool for batch hashing; hashlib releases the GIL so workers run in parallel.
+
+    Single passwords are hashed on the request thread: handing one job to
+    the pool and blocking on it only adds a thread switch.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = _config('PASSWORD_HASH_WORKERS', None) or os.cpu_count() or 1
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _executor
+
+
+def hash_password(password):
+    """Hash a password with the configured method, on the calling thread"""
+    return generate_password_hash(password, hash_method())
+
+
+def hash_passwords(passwords):
+    """Hash several passwords concurrently on the hashing pool, preserving order"""
+    method = hash_method()
+    futures = [_get_executor().submit(generate_password_hash, password, method) for password in passwords]
+    return [future.result() for future in futures]
+
+
+def verify_password(password_hash, password):
+    """Check a password against its hash"""
+    return check_password_hash(password_hash, password)
+
+
+@lru_cache(maxsize=None)
+def method_prefix(method):
+    """The method string werkzeug writes into hashes made with method.
+
+    werkzeug fills in defaults for short names ('scrypt' is stored as
+    'scrypt:32768:8:1'), so the prefix is taken from a hash made once.
+    """
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with a different method or cost than configured"""
+    return password_hash.split('$', 1)[0] != method_prefix(hash_method())
+
+
+def verify_and_update(user, password):
+    """Check a user's password and upgrade the stored hash if its parameters are stale.
+
+    Returns True on a match; the caller commits the session.
+    """
+    if not user.check_password(password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.set_password(password)
+    return True
@@ -1,260 +1,335 @@
-from flask import render_template, request, redirect, url_for, flash, session, abort
+from flask import Blueprint, current_app, g, render_template, request, redirect, url_for, flash, session, abort, jsonify, Response, stream_with_context
 from werkzeug.security import generate_password_hash
-from werkzeug.utils import secure_filename
-from app import app, db
-from models import User, Ticket, TicketComment
+from werkzeug.exceptions import RequestEntityTooLarge
+from app import db
+from models import User, Ticket, TicketComment, ArchivedTicket
 from forms import LoginForm, TicketForm, UpdateTicketForm, CommentForm, UserRegistrationForm, AssignTicketForm, UserProfileForm
+from stats import RESOLVED_STATUSES, get_system_stats, get_admin_stats
+from ticket_listing import InvalidCursor, read_filters, read_sort, apply_filters, paginate, get_page_size, ticket_to_dict
+from search import search_tickets
+from auth import is_logged_in, get_current_user, get_auth_info, invalidate_user, login_required, admin_required, api_token_required
+from export import build_export_query, iter_export_rows, stream_csv, stream_xlsx
+from bulk import BulkOperationError, run_bulk_operation
+from passwords import verify_and_update
+from fingerprint import get_client_fingerprint, client_info_changes, update_client_info
+from db_routing import replica_reads
+from write_queue import run_write
+from loading import ticket_detail_options, archived_ticket_detail_options, ticket_people_options, ticket_list_options
+from instrumentation import render_metrics
+from notifications import enqueue_event
+from live_events import BUSY_RETRY_MS, acquire_stream_slot, stream_events
+from routing import auto_assign_enabled, choose_assignee, get_tracker, release_assignees
+from analytics import build_report
+from archive import find_ticket
+from duplicates import find_duplicates, record_ticket, linked_duplicates
+from avatars import ImageUploadError, get_store, send_image
+from ingest import IngestError, ingest
+from page_cache import cached_page, dashboard_cache_key, ticket_cache_key
 from datetime import datetime
-import logging
+from sqlalchemy import insert, update
 import os
-import socket
-import platform
 
-# Helper function to check if user is logged in
-def is_logged_in():
-    return 'user_id' in session
+bp = Blueprint('main', __name__)
 
-# Helper function to get current user
-def get_current_user():
-    if is_logged_in():
-        return User.query.get(session['user_id'])
-    return None
-
-# Helper function to require login
-def login_required(f):
-    def decorated_function(*args, **kwargs):
-        if not is_logged_in():
-            flash('Please log in to access this page.', 'warning')
-            return redirect(url_for('user_login'))
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
+# Day ranges offered on the reports page
+REPORT_PERIODS = (7, 30, 90, 365)
 
-# Helper function to require admin
-def admin_required(f):
-    def decorated_function(*args, **kwargs):
-        if not is_logged_in():
-            flash('Please log in to access this page.', 'warning')
-            return redirect(url_for('admin_login'))
-        user = get_current_user()
-        if not user or not user.is_admin:
-            flash('Admin access required.', 'error')
-            return redirect(url_for('index'))
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
+# Room for the profile form's text fields on top of the image size cap
+PROFILE_FORM_OVERHEAD = 64 * 1024
 
-@app.route('/')
+@bp.route('/')
 def index():
     """Home page"""
     return render_template('index.html')
 
-@app.route('/user-login', methods=['GET', 'POST'])
+@bp.route('/user-login', methods=['GET', 'POST'])
 def user_login():
     """User login page"""
     if is_logged_in():
-        return redirect(url_for('user_dashboard'))
+        return redirect(url_for('main.user_dashboard'))
     
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data) and user.role == 'user':
+        if user and user.role == 'user' and verify_and_update(user, form.password.data):
             session['user_id'] = user.id
             session['is_admin'] = False
             session['role'] = user.role
             
-            # Update IP address and system info
-            user.ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR'))
-            try:
-                user.system_name = socket.gethostname()
-            except:
-                user.system_name = 'Unknown'
-            db.session.commit()
+            # Update IP address and system info (only written when changed)
+            client = get_client_fingerprint()
+            update_client_info(user, client.ip_address,
+                               None if user.system_name else client.system_name)
+            if db.session.dirty:
+                db.session.commit()
             
             flash(f'Welcome back, {user.first_name}!', 'success')
-            return redirect(url_for('user_dashboard'))
+            return redirect(url_for('main.user_dashboard'))
         else:
             flash('Invalid username or password.', 'error')
     
     return render_template('user_login.html', form=form)
 
-@app.route('/admin-login', methods=['GET', 'POST'])
+@bp.route('/admin-login', methods=['GET', 'POST'])
 def admin_login():
     """Admin login page"""
-    if is_logged_in() and get_current_user().is_admin:
-        user = get_current_user()
+    user = get_current_user()
+    if user and user.is_admin:
         if user.is_super_admin:
-            return redirect(url_for('super_admin_dashboard'))
+            return redirect(url_for('main.super_admin_dashboard'))
         else:
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
     
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data) and user.is_admin:
+        if user and user.is_admin and verify_and_update(user, form.password.data):
+            if db.session.dirty:
+                db.session.commit()
             session['user_id'] = user.id
             session['is_admin'] = True
             session['role'] = user.role
             flash(f'Welcome back, {user.first_name}!', 'success')
             
             if user.is_super_admin:
-                return redirect(url_for('super_admin_dashboard'))
+                return redirect(url_for('main.super_admin_dashboard'))
             else:
-                return redirect(url_for('admin_dashboard'))
+                return redirect(url_for('main.admin_dashboard'))
         else:
             flash('Invalid admin credentials.', 'error')
     
     return render_template('admin_login.html', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     """Logout user"""
     session.clear()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/user-dashboard')
+@bp.route('/user-dashboard')
+@replica_reads
 @login_required
 def user_dashboard():
     """User dashboard showing their tickets"""
     user = get_current_user()
     
     # Get filter parameters
-    status_filter = request.args.get('status', 'all')
-    search_query = request.args.get('search', '')
-    
-    # Build query
-    query = Ticket.query.filter_by(user_id=user.id)
-    
-    if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
-    
-    if search_query:
-        query = query.filter(Ticket.title.contains(search_query))
-    
-    tickets = query.order_by(Ticket.created_at.desc()).all()
+    filters = read_filters(request.args)
+    status_filter = filters['status']
+    search_query = filters['search']
+    cursor = request.args.get('cursor')
+    
+    def render():
+        # Build query
+        query = apply_filters(Ticket.query.filter_by(user_id=user.id),
+                              status=status_filter, search=search_query)
+        
+        page_cursor = cursor
+        try:
+            page = paginate(query, cursor=page_cursor)
+        except InvalidCursor:
+            page_cursor = None
+            page = paginate(query)
+        
+        return render_template('user_dashboard.html', user=user, tickets=page.tickets, 
+                             status_filter=status_filter, search_query=search_query,
+                             cursor=page_cursor, next_cursor=page.next_cursor)
     
-    return render_template('user_dashboard.html', user=user, tickets=tickets, 
-                         status_filter=status_filter, search_query=search_query)
+    cache_args = {'status': status_filter, 'search': search_query, 'cursor': cursor or ''}
+    return cached_page(dashboard_cache_key('user', user.id, cache_args), render)
 
-@app.route('/user-profile', methods=['GET', 'POST'])
+@bp.route('/user-profile', methods=['GET', 'POST'])
 @login_required
 def user_profile():
     """User profile management"""
     user = get_current_user()
-    form = UserProfileForm(obj=user)
+    # Refuse a too large upload before it is read, not after it is spooled
+    request.max_content_length = current_app.config['AVATAR_MAX_BYTES'] + PROFILE_FORM_OVERHEAD
+    try:
+        form = UserProfileForm(obj=user)
+    except RequestEntityTooLarge:
+        flash(f"Images can be at most {current_app.config['AVATAR_MAX_BYTES'] // 1024} KB.", 'error')
+        return redirect(url_for('main.user_profile'))
     
     if form.validate_on_submit():
+        # Handle profile image upload: stored once per distinct image, named by its hash
+        file = request.files.get('profile_image')
+        if file and file.filename:
+            try:
+                user.profile_image = get_store().save(file.stream)
+            except ImageUploadError as e:
+                flash(str(e), 'error')
+                return render_template('user_profile.html', form=form, user=user)
+        
         user.first_name = form.first_name.data
         user.last_name = form.last_name.data
         user.email = form.email.data
         user.department = form.department.data
         user.system_name = form.system_name.data
-        
-        # Handle profile image upload
-        if 'profile_image' in request.files:
-            file = request.files['profile_image']
-            if file.filename != '':
-                filename = secure_filename(file.filename)
-                # Save file logic would go here
-                user.profile_image = filename
+        invalidate_user(user.id)
         
         db.session.commit()
         flash('Profile updated successfully!', 'success')
-        return redirect(url_for('user_profile'))
+        return redirect(url_for('main.user_profile'))
     
     return render_template('user_profile.html', form=form, user=user)
 
-@app.route('/super-admin-dashboard')
+@bp.route('/avatars/<digest>/<variant>')
+@login_required
+def avatar(digest, variant):
+    """Profile image or its thumbnail; named by content, so browsers keep it for a year"""
+    if variant not in ('thumb', 'full'):
+        abort(404)
+    return send_image(digest, thumbnail=variant == 'thumb')
+
+@bp.route('/super-admin-dashboard')
+@replica_reads
 @admin_required
 def super_admin_dashboard():
     """Super Admin dashboard with full system overview"""
     user = get_current_user()
     if not user.is_super_admin:
         flash('Super Admin access required.', 'error')
-        return redirect(url_for('index'))
-    
-    # Get comprehensive statistics
-    total_tickets = Ticket.query.count()
-    open_tickets = Ticket.query.filter_by(status='Open').count()
-    in_progress_tickets = Ticket.query.filter_by(status='In Progress').count()
-    resolved_tickets = Ticket.query.filter_by(status='Resolved').count()
-    
-    # Get user statistics
-    total_users = User.query.filter_by(role='user').count()
-    total_admins = User.query.filter_by(role='admin').count()
-    
-    # Get recent tickets
-    recent_tickets = Ticket.query.order_by(Ticket.created_at.desc()).limit(10).all()
-    
-    # Get category statistics
-    hardware_tickets = Ticket.query.filter_by(category='Hardware').count()
-    software_tickets = Ticket.query.filter_by(category='Software').count()
-    network_tickets = Ticket.query.filter_by(category='Network').count()
-    other_tickets = Ticket.query.filter_by(category='Other').count()
-    
-    stats = {
-        'total_tickets': total_tickets,
-        'open_tickets': open_tickets,
-        'in_progress_tickets': in_progress_tickets,
-        'resolved_tickets': resolved_tickets,
-        'total_users': total_users,
-        'total_admins': total_admins,
-        'hardware_tickets': hardware_tickets,
-        'software_tickets': software_tickets,
-        'network_tickets': network_tickets,
-        'other_tickets': other_tickets
-    }
-    
-    return render_template('super_admin_dashboard.html', stats=stats, recent_tickets=recent_tickets)
+        return redirect(url_for('main.index'))
+    
+    def render():
+        # Get comprehensive statistics in a single grouped pass
+        stats = get_system_stats()
+        
+        # Get recent tickets
+        recent_tickets = Ticket.query.order_by(Ticket.created_at.desc()).limit(10).all()
+        
+        return render_template('super_admin_dashboard.html', stats=stats, recent_tickets=recent_tickets)
+    
+    return cached_page(dashboard_cache_key('super_admin', user.id), render)
 
-@app.route('/admin-dashboard')
+@bp.route('/admin-dashboard')
+@replica_reads
 @admin_required
 def admin_dashboard():
     """Admin dashboard showing assigned tickets"""
     user = get_current_user()
     
     # Get filter parameters
-    status_filter = request.args.get('status', 'all')
-    priority_filter = request.args.get('priority', 'all')
-    category_filter = request.args.get('category', 'all')
-    search_query = request.args.get('search', '')
+    filters = read_filters(request.args)
+    cursor = request.args.get('cursor')
     
-    # Build query - only show tickets assigned to this admin
-    query = Ticket.query.filter_by(assigned_to=user.id)
+    def render():
+        # Build query - only show tickets assigned to this admin
+        query = apply_filters(Ticket.query.filter_by(assigned_to=user.id), **filters)
+        query = query.options(*ticket_list_options())
+        
+        page_cursor = cursor
+        try:
+            page = paginate(query, cursor=page_cursor)
+        except InvalidCursor:
+            page_cursor = None
+            page = paginate(query)
+        
+        # Get statistics for assigned tickets
+        assigned_stats = get_admin_stats(user.id)
+        
+        stats = {
+            'total': assigned_stats.total,
+            'open': assigned_stats.open_tickets,
+            'in_progress': assigned_stats.in_progress_tickets,
+            'resolved': assigned_stats.resolved_tickets
+        }
+        
+        return render_template('admin_dashboard.html', tickets=page.tickets, stats=stats,
+                             status_filter=filters['status'], priority_filter=filters['priority'],
+                             category_filter=filters['category'], search_query=filters['search'],
+                             admin_user=user, cursor=page_cursor, next_cursor=page.next_cursor)
     
-    if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
+    return cached_page(dashboard_cache_key('admin', user.id, dict(filters, cursor=cursor or '')), render)
+
+@bp.route('/api/tickets')
+@replica_reads
+@login_required
+def api_list_tickets():
+    """JSON ticket listing with keyset pagination"""
+    user = get_current_user()
+    
+    # Scope the listing to what the dashboards show for this role
+    if user.is_super_admin:
+        query = Ticket.query
+    elif user.is_admin:
+        query = Ticket.query.filter_by(assigned_to=user.id)
+    else:
+        query = Ticket.query.filter_by(user_id=user.id)
     
-    if priority_filter != 'all':
-        query = query.filter_by(priority=priority_filter)
+    query = apply_filters(query, **read_filters(request.args))
     
-    if category_filter != 'all':
-        query = query.filter_by(category=category_filter)
+    try:
+        page = paginate(query, cursor=request.args.get('cursor'),
+                        page_size=get_page_size(request.args.get('limit')),
+                        sort=read_sort(request.args))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'tickets': [ticket_to_dict(ticket) for ticket in page.tickets],
+        'next_cursor': page.next_cursor,
+        'page_size': page.page_size
+    })
+
+@bp.route('/api/tickets/search')
+@replica_reads
+@login_required
+def api_search_tickets():
+    """Ranked full-text search over ticket titles, descriptions and comments"""
+    user = get_current_user()
+    search_query = request.args.get('q', '')
     
-    if search_query:
-        query = query.filter(Ticket.title.contains(search_query))
+    if user.is_admin:
+        query = Ticket.query
+        archived_query = ArchivedTicket.query
+    else:
+        query = Ticket.query.filter_by(user_id=user.id)
+        archived_query = ArchivedTicket.query.filter_by(user_id=user.id)
+    
+    # Archived tickets are ranked together with live ones
+    limit = get_page_size(request.args.get('limit'))
+    results = search_tickets(query, search_query, limit=limit) + \
+        search_tickets(archived_query, search_query, limit=limit, model=ArchivedTicket)
+    results = sorted(results, key=lambda result: (result[1], result[0].created_at), reverse=True)[:limit]
+    
+    return jsonify({
+        'query': search_query,
+        'results': [dict(ticket_to_dict(ticket), rank=rank) for ticket, rank in results]
+    })
+
+@bp.route('/download-report')
+@replica_reads
+@admin_required
+def download_report():
+    """Stream all tickets matching the dashboard filters as CSV or XLSX (Super Admin only)"""
+    user = get_current_user()
+    if not user.is_super_admin:
+        flash('Super Admin access required.', 'error')
+        return redirect(url_for('main.index'))
     
-    tickets = query.order_by(Ticket.created_at.desc()).all()
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in ('csv', 'xlsx'):
+        abort(400)
     
-    # Get statistics for assigned tickets
-    total_assigned = Ticket.query.filter_by(assigned_to=user.id).count()
-    open_assigned = Ticket.query.filter_by(assigned_to=user.id, status='Open').count()
-    in_progress_assigned = Ticket.query.filter_by(assigned_to=user.id, status='In Progress').count()
-    resolved_assigned = Ticket.query.filter_by(assigned_to=user.id, status='Resolved').count()
+    query = build_export_query(assigned_to=request.args.get('assigned_to', type=int),
+                               **read_filters(request.args))
+    rows = iter_export_rows(query, batch_size=current_app.config['EXPORT_BATCH_SIZE'])
+    filename = f"gtn_tickets_{datetime.utcnow().strftime('%Y%m%d_%H%M')}.{export_format}"
     
-    stats = {
-        'total': total_assigned,
-        'open': open_assigned,
-        'in_progress': in_progress_assigned,
-        'resolved': resolved_assigned
-    }
+    if export_format == 'csv':
+        body = stream_csv(rows, batch_size=current_app.config['EXPORT_BATCH_SIZE'])
+        mimetype = 'text/csv'
+    else:
+        body = stream_xlsx(rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     
-    return render_template('admin_dashboard.html', tickets=tickets, stats=stats,
-                         status_filter=status_filter, priority_filter=priority_filter,
-                         category_filter=category_filter, search_query=search_query, admin_user=user)
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
-@app.route('/create-ticket', methods=['GET', 'POST'])
+@bp.route('/create-ticket', methods=['GET', 'POST'])
 @login_required
 def create_ticket():
     """Create a new ticket"""
@@ -263,60 +338,91 @@ def create_ticket():
     
     if form.validate_on_submit():
         # Update user's current IP and system info
-        # Get real client IP address
-        user.ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', 
-                                            request.environ.get('HTTP_X_REAL_IP', 
-                                            request.environ.get('REMOTE_ADDR')))
-        # Get system name from form or detect from User-Agent
-        if form.system_name.data:
-            user.system_name = form.system_name.data
+        # System name comes from the form or is detected from the User-Agent
+        client = get_client_fingerprint()
+        user_changes = client_info_changes(user, client.ip_address,
+                                           form.system_name.data or client.system_name)
+        
+        # A likely duplicate of an open ticket is linked to it and goes to the
+        # admin already handling that one
+        duplicates = find_duplicates(form.title.data, form.description.data, limit=1)
+        original = duplicates[0] if duplicates else None
+        routed = None
+        if original and original.assigned_to and auto_assign_enabled():
+            assigned_to = original.assigned_to
         else:
-            user_agent = request.headers.get('User-Agent', '')
-            if 'Windows' in user_agent:
-                user.system_name = 'Windows System'
-            elif 'Mac' in user_agent:
-                user.system_name = 'Mac System'  
-            elif 'Linux' in user_agent:
-                user.system_name = 'Linux System'
-            else:
-                user.system_name = 'Unknown System'
+            # Routed to the least-loaded admin for the category (None when AUTO_ASSIGN is off)
+            assigned_to = routed = choose_assignee(form.category.data)
         
-        ticket = Ticket(
+        ticket_values = dict(
             title=form.title.data,
             description=form.description.data,
             category=form.category.data,
             priority=form.priority.data,
             user_id=user.id,
             user_name=user.full_name,
-            user_ip_address=user.ip_address,
-            user_system_name=user.system_name
+            user_ip_address=user_changes.get('ip_address', user.ip_address),
+            user_system_name=user_changes.get('system_name', user.system_name),
+            duplicate_of=original.ticket_id if original else None,
+            assigned_to=assigned_to
         )
-        db.session.add(ticket)
-        db.session.commit()
         
-        flash(f'Ticket {ticket.ticket_number} created successfully!', 'success')
-        return redirect(url_for('user_dashboard'))
+        def insert_ticket(conn):
+            if user_changes:
+                conn.execute(update(User).where(User.id == user.id).values(**user_changes))
+            ticket_id = conn.execute(insert(Ticket).values(**ticket_values)).inserted_primary_key[0]
+            enqueue_event('ticket_created', ticket_id, conn=conn, by=user.id)
+            if ticket_values['assigned_to']:
+                enqueue_event('ticket_assigned', ticket_id, conn=conn,
+                              assigned_to=ticket_values['assigned_to'], auto=True)
+            return ticket_id
+        
+        try:
+            ticket_id = run_write(insert_ticket)
+        except Exception:
+            # Not stored: don't leave it counted against the admin it was routed to
+            release_assignees([routed])
+            raise
+        record_ticket(ticket_id, ticket_values['title'], ticket_values['description'])
+        
+        flash(f'Ticket {Ticket.format_ticket_number(ticket_id)} created successfully!', 'success')
+        if original:
+            flash(f'It looks like ticket {original.ticket_number}, which is already open; '
+                  f'IT staff will handle them together.', 'info')
+        return redirect(url_for('main.user_dashboard'))
     
     return render_template('create_ticket.html', form=form)
 
-@app.route('/ticket/<int:ticket_id>')
+@bp.route('/ticket/<int:ticket_id>')
 @login_required
 def view_ticket(ticket_id):
-    """View ticket details"""
-    ticket = Ticket.query.get_or_404(ticket_id)
+    """View ticket details (archived tickets are shown read-only)"""
+    ticket = find_ticket(ticket_id)
+    if ticket is None:
+        abort(404)
     user = get_current_user()
     
     # Check if user can view this ticket
     if not user.is_admin and ticket.user_id != user.id:
         abort(403)
     
-    form = CommentForm()
-    assign_form = AssignTicketForm() if user.is_admin else None
+    def render():
+        # Only a cache miss pays for loading comments and people
+        if ticket.is_archived:
+            detail = ArchivedTicket.query.options(*archived_ticket_detail_options()) \
+                .populate_existing().get(ticket_id)
+        else:
+            detail = Ticket.query.options(*ticket_detail_options()).populate_existing().get(ticket_id)
+        form = CommentForm()
+        assign_form = AssignTicketForm() if user.is_admin and not ticket.is_archived else None
+        duplicates = linked_duplicates(ticket_id) if user.is_admin and not ticket.is_archived else []
+        
+        return render_template('view_ticket.html', ticket=detail, form=form, 
+                             assign_form=assign_form, user=user, duplicates=duplicates)
     
-    return render_template('view_ticket.html', ticket=ticket, form=form, 
-                         assign_form=assign_form, user=user)
+    return cached_page(ticket_cache_key(ticket, user), render)
 
-@app.route('/ticket/<int:ticket_id>/comment', methods=['POST'])
+@bp.route('/ticket/<int:ticket_id>/comment', methods=['POST'])
 @login_required
 def add_comment(ticket_id):
     """Add comment to ticket"""
@@ -329,24 +435,35 @@ def add_comment(ticket_id):
     
     form = CommentForm()
     if form.validate_on_submit():
-        comment = TicketComment(
-            ticket_id=ticket_id,
-            user_id=user.id,
-            comment=form.comment.data
-        )
-        db.session.add(comment)
-        ticket.updated_at = datetime.utcnow()
-        db.session.commit()
+        now = datetime.utcnow()
+        
+        def insert_comment(conn):
+            conn.execute(insert(TicketComment).values(
+                ticket_id=ticket_id,
+                user_id=user.id,
+                comment=form.comment.data,
+                created_at=now
+            ))
+            # Bump the activity columns in the database so concurrent comments don't race
+            conn.execute(update(Ticket).where(Ticket.id == ticket_id).values(
+                comment_count=Ticket.comment_count + 1,
+                last_comment_at=now,
+                last_commenter_id=user.id,
+                updated_at=now
+            ))
+            enqueue_event('comment_added', ticket_id, conn=conn, by=user.id, comment=form.comment.data)
+        
+        run_write(insert_comment)
         
         flash('Comment added successfully!', 'success')
     
-    return redirect(url_for('view_ticket', ticket_id=ticket_id))
+    return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
 
-@app.route('/ticket/<int:ticket_id>/edit', methods=['GET', 'POST'])
+@bp.route('/ticket/<int:ticket_id>/edit', methods=['GET', 'POST'])
 @admin_required
 def edit_ticket(ticket_id):
     """Edit ticket (admin only)"""
-    ticket = Ticket.query.get_or_404(ticket_id)
+    ticket = Ticket.query.options(*ticket_people_options()).get_or_404(ticket_id)
     form = UpdateTicketForm(obj=ticket)
     
     if form.validate_on_submit():
@@ -358,21 +475,26 @@ def edit_ticket(ticket_id):
         old_status = ticket.status
         ticket.status = form.status.data
         
-        # Set resolved_at if status changed to Resolved
-        if old_status != 'Resolved' and ticket.status == 'Resolved':
-            ticket.resolved_at = datetime.utcnow()
-        elif ticket.status != 'Resolved':
+        # Set resolved_at when the ticket is resolved or closed; moving between
+        # the two keeps the original time
+        if ticket.status in RESOLVED_STATUSES:
+            if old_status not in RESOLVED_STATUSES or ticket.resolved_at is None:
+                ticket.resolved_at = datetime.utcnow()
+        else:
             ticket.resolved_at = None
         
         ticket.updated_at = datetime.utcnow()
+        if ticket.status != old_status:
+            enqueue_event('status_changed', ticket.id, old_status=old_status, new_status=ticket.status,
+                          by=get_current_user().id)
         db.session.commit()
         
         flash('Ticket updated successfully!', 'success')
-        return redirect(url_for('view_ticket', ticket_id=ticket_id))
+        return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
     
     return render_template('edit_ticket.html', form=form, ticket=ticket)
 
-@app.route('/ticket/<int:ticket_id>/assign', methods=['POST'])
+@bp.route('/ticket/<int:ticket_id>/assign', methods=['POST'])
 @admin_required
 def assign_ticket(ticket_id):
     """Assign ticket to admin"""
@@ -384,33 +506,79 @@ def assign_ticket(ticket_id):
         if ticket.status == 'Open':
             ticket.status = 'In Progress'
         ticket.updated_at = datetime.utcnow()
+        enqueue_event('ticket_assigned', ticket.id, assigned_to=ticket.assigned_to, by=get_current_user().id)
         db.session.commit()
         
         assignee = User.query.get(form.assigned_to.data)
         flash(f'Ticket assigned to {assignee.full_name}!', 'success')
     
-    return redirect(url_for('view_ticket', ticket_id=ticket_id))
+    return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
+
+@bp.route('/api/tickets/bulk', methods=['POST'])
+@admin_required
+def bulk_update_tickets():
+    """Assign, change status or close many tickets in one set-based UPDATE"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    filters = payload.get('filters')
+    try:
+        results = run_bulk_operation(
+            payload.get('action'),
+            ticket_ids=payload.get('ticket_ids'),
+            filters=read_filters(filters) if isinstance(filters, dict) else None,
+            assigned_to=payload.get('assigned_to'),
+            status=payload.get('status'),
+            limit=current_app.config['BULK_MAX_TICKETS'],
+            actor_id=get_current_user().id
+        )
+    except BulkOperationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'updated': sum(1 for result in results.values() if result == 'updated'),
+        'skipped': sum(1 for result in results.values() if result == 'skipped'),
+        'results': {str(ticket_id): result for ticket_id, result in results.items()}
+    })
+
+@bp.route('/api/ingest', methods=['POST'])
+@api_token_required
+def ingest_tickets():
+    """Create a batch of tickets and comments from another system in one transaction"""
+    try:
+        result = ingest(g.api_token, request.get_json(silent=True),
+                        limit=current_app.config['INGEST_MAX_BATCH'])
+    except IngestError as e:
+        return jsonify({'error': str(e), 'errors': e.errors}), e.status
+    
+    created = result.created
+    return jsonify({
+        'created': created,
+        'tickets': result.tickets,
+        'comments': result.comments
+    }), 201 if created['tickets'] or created['comments'] else 200
 
-@app.route('/manage-users')
+@bp.route('/manage-users')
 @admin_required
 def manage_users():
     """Super Admin user management"""
     user = get_current_user()
     if not user.is_super_admin:
         flash('Super Admin access required.', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     users = User.query.all()
     return render_template('manage_users.html', users=users)
 
-@app.route('/create-user', methods=['GET', 'POST'])
+@bp.route('/create-user', methods=['GET', 'POST'])
 @admin_required
 def create_user():
     """Create new user (Super Admin only)"""
     user = get_current_user()
     if not user.is_super_admin:
         flash('Super Admin access required.', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     form = UserRegistrationForm()
     if form.validate_on_submit():
@@ -427,138 +595,108 @@ def create_user():
         db.session.add(new_user)
         db.session.commit()
         
+        # A new admin joins the routing pool straight away
+        if new_user.role == 'admin':
+            get_tracker().invalidate()
+        
         flash(f'User {new_user.username} created successfully!', 'success')
-        return redirect(url_for('manage_users'))
+        return redirect(url_for('main.manage_users'))
     
     return render_template('create_user.html', form=form)
 
-@app.route('/assign-work/<int:ticket_id>', methods=['GET', 'POST'])
+@bp.route('/assign-work/<int:ticket_id>', methods=['GET', 'POST'])
 @admin_required
 def assign_work(ticket_id):
     """Super Admin assigns work to specific admins based on category"""
     user = get_current_user()
     if not user.is_super_admin:
         flash('Super Admin access required.', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
-    ticket = Ticket.query.get_or_404(ticket_id)
+    ticket = Ticket.query.options(*ticket_people_options()).get_or_404(ticket_id)
     
-    # Get appropriate admins based on ticket category
-    if ticket.category in ['Hardware']:
-        admins = User.query.filter_by(role='admin', department='IT Hardware').all()
-    elif ticket.category in ['Software']:
-        admins = User.query.filter_by(role='admin', department='IT Software').all()
-    else:
-        admins = User.query.filter_by(role='admin').all()
+    # Admins the routing rules allow for this category, least loaded first
+    tracker = get_tracker()
+    loads = tracker.candidates(ticket.category)
+    admins = sorted(User.query.filter(User.id.in_(loads)).all(), key=lambda admin: (loads[admin.id], admin.id))
     
     form = AssignTicketForm()
-    form.assigned_to.choices = [(admin.id, f"{admin.full_name} ({admin.department})") for admin in admins]
+    form.assigned_to.choices = [(admin.id, f"{admin.full_name} ({admin.department}) - {loads[admin.id]} open")
+                                for admin in admins]
+    if request.method == 'GET':
+        form.assigned_to.data = ticket.assigned_to or tracker.suggest(ticket.category)
     
     if form.validate_on_submit():
         ticket.assigned_to = form.assigned_to.data
         ticket.status = 'In Progress'
         ticket.updated_at = datetime.utcnow()
+        enqueue_event('ticket_assigned', ticket.id, assigned_to=ticket.assigned_to, by=user.id)
         db.session.commit()
         
         assignee = User.query.get(form.assigned_to.data)
         flash(f'Work assigned to {assignee.full_name}!', 'success')
-        return redirect(url_for('super_admin_dashboard'))
+        return redirect(url_for('main.super_admin_dashboard'))
     
-    return render_template('assign_work.html', form=form, ticket=ticket, admins=admins)
+    return render_template('assign_work.html', form=form, ticket=ticket, admins=admins, loads=loads)
 
-def create_default_admin():
-    """Create default admin and super admin users if none exists"""
-    try:
-        super_admin = User.query.filter_by(role='super_admin').first()
-        if not super_admin:
-            # Create Super Admin
-            super_admin_user = User(
-                username='superadmin',
-                email='superadmin@gtnengineering.com',
-                first_name='Super',
-                last_name='Administrator',
-                department='IT',
-                role='super_admin',
-                is_admin=True
-            )
-            super_admin_user.set_password('super123')
-            db.session.add(super_admin_user)
-            db.session.commit()
-            
-            # Create Hardware Admins
-            hardware_admins = [
-                {'username': 'yuvaraj', 'first_name': 'Yuvaraj', 'last_name': 'Admin'},
-                {'username': 'jayachandran', 'first_name': 'Jayachandran', 'last_name': 'Admin'},
-                {'username': 'narainkarthik', 'first_name': 'Narain', 'last_name': 'Karthik'}
-            ]
-            
-            for admin_data in hardware_admins:
-                admin_user = User(
-                    username=admin_data['username'],
-                    email=f"{admin_data['username']}@gtnengineering.com",
-                    first_name=admin_data['first_name'],
-                    last_name=admin_data['last_name'],
-                    department='IT Hardware',
-                    role='admin',
-                    is_admin=True
-                )
-                admin_user.set_password('admin123')
-                db.session.add(admin_user)
-                db.session.commit()
-            
-            # Create Software Admins
-            software_admins = [
-                {'username': 'sathish', 'first_name': 'Sathish', 'last_name': 'SAP Admin'},
-                {'username': 'lakshmiprabha', 'first_name': 'Lakshmi', 'last_name': 'Prabha'}
-            ]
-            
-            for admin_data in software_admins:
-                admin_user = User(
-                    username=admin_data['username'],
-                    email=f"{admin_data['username']}@gtnengineering.com",
-                    first_name=admin_data['first_name'],
-                    last_name=admin_data['last_name'],
-                    department='IT Software',
-                    role='admin',
-                    is_admin=True
-                )
-                admin_user.set_password('admin123')
-                db.session.add(admin_user)
-                db.session.commit()
-            
-            # Create a test user
-            test_user = User(
-                username='testuser',
-                email='user@gtnengineering.com',
-                first_name='Test',
-                last_name='User',
-                department='Engineering',
-                role='user',
-                is_admin=False
-            )
-            test_user.set_password('test123')
-            db.session.add(test_user)
-            db.session.commit()
-            
-            logging.info("Default super admin, admins and test user created")
-    except Exception as e:
-        logging.error(f"Error creating default users: {e}")
-        db.session.rollback()
+@bp.route('/reports')
+@admin_required
+def reports():
+    """Super Admin resolution-time and backlog reports, served from the daily rollups"""
+    user = get_current_user()
+    if not user.is_super_admin:
+        flash('Super Admin access required.', 'error')
+        return redirect(url_for('main.index'))
+    
+    days = request.args.get('days', 30, type=int)
+    if days not in REPORT_PERIODS:
+        days = 30
+    
+    return render_template('reports.html', report=build_report(days), days=days, periods=REPORT_PERIODS)
 
-# Initialize default admin on first import
-with app.app_context():
-    create_default_admin()
+@bp.route('/api/events')
+@login_required
+def event_stream():
+    """Server-sent ticket events relevant to the current user, for live dashboards"""
+    info = get_auth_info()
+    # The page reopening a refused stream passes the id as a parameter
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+    
+    release = acquire_stream_slot()
+    if release is None:
+        # Every stream slot is taken: ask the page to come back later
+        return Response(f"retry: {BUSY_RETRY_MS}\n\n", status=503, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'Retry-After': str(BUSY_RETRY_MS // 1000)})
+    
+    # Release the connection before the long-lived stream starts
+    db.session.close()
+    
+    response = Response(stream_with_context(stream_events(
+                            info.user_id, info.role, last_event_id,
+                            lifetime_seconds=current_app.config['LIVE_EVENTS_STREAM_SECONDS'])),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(release)
+    return response
+
+@bp.route('/metrics')
+@admin_required
+def metrics():
+    """Request, SQL and template metrics in Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 # Error handlers
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(403)
+@bp.app_errorhandler(403)
 def forbidden_error(error):
     return render_template('403.html'), 403
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
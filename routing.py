@@ -0,0 +1,174 @@
+import json
+import logging
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from models import User, Ticket
+
+# Ticket category -> admin departments that handle it; other categories
+# (and categories whose departments have no admins) go to every admin
+DEFAULT_RULES = {
+    'Hardware': ['IT Hardware'],
+    'Software': ['IT Software'],
+}
+DEFAULT_REFRESH_SECONDS = 30
+
+# Tickets that count towards an admin's load
+ACTIVE_STATUSES = ('Open', 'In Progress')
+
+
+def parse_rules(value):
+    """Routing rules from ROUTING_RULES JSON, e.g. {"Network": ["IT Network"]}"""
+    if not value:
+        return dict(DEFAULT_RULES)
+    rules = json.loads(value)
+    return {category: [departments] if isinstance(departments, str) else list(departments)
+            for category, departments in rules.items()}
+
+
+class LoadTracker:
+    """Open/In Progress ticket count per admin, kept in memory.
+
+    Counts are reloaded from the database every refresh_seconds and bumped
+    locally for each assignment in between (and given back by release() if
+    the ticket is not stored), so picking an assignee costs no query. Each process keeps its own counts; the periodic refresh brings
+    them back in line with assignments made by other workers, reassignments
+    and resolved tickets.
+    """
+
+    def __init__(self, rules=None, refresh_seconds=DEFAULT_REFRESH_SECONDS):
+        self.rules = rules if rules is not None else dict(DEFAULT_RULES)
+        self.refresh_seconds = refresh_seconds
+        self._departments = {}  # admin id -> department
+        self._load = {}  # admin id -> active tickets
+        self._turns = {}  # category -> round-robin position
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        admins = db.session.execute(select(User.id, User.department).where(User.role == 'admin')).all()
+        counts = dict(db.session.execute(
+            select(Ticket.assigned_to, func.count(Ticket.id))
+            .where(Ticket.status.in_(ACTIVE_STATUSES), Ticket.assigned_to.isnot(None))
+            .group_by(Ticket.assigned_to)
+        ).all())
+        with self._lock:
+            self._departments = {admin_id: department for admin_id, department in admins}
+            self._load = {admin_id: counts.get(admin_id, 0) for admin_id in self._departments}
+            self._refreshed_at = time.monotonic()
+
+    def invalidate(self):
+        """Reload on next use, e.g. after admins are added or change department"""
+        with self._lock:
+            self._refreshed_at = None
+
+    def _ensure_fresh(self):
+        refreshed_at = self._refreshed_at
+        if refreshed_at is None or time.monotonic() - refreshed_at >= self.refresh_seconds:
+            self.refresh()
+
+    def _candidates(self, category):
+        departments = self.rules.get(category)
+        if departments:
+            matching = [admin_id for admin_id, department in self._departments.items()
+                        if department in departments]
+            if matching:
+                return sorted(matching)
+        return sorted(self._departments)
+
+    def _pick(self, category, take_turn):
+        candidates = self._candidates(category)
+        if not candidates:
+            return None
+        lowest = min(self._load[admin_id] for admin_id in candidates)
+        tied = [admin_id for admin_id in candidates if self._load[admin_id] == lowest]
+        turn = self._turns.get(category, 0)
+        if take_turn:
+            self._turns[category] = turn + 1
+        return tied[turn % len(tied)]
+
+    def choose(self, category):
+        """Assign the least-loaded admin for category (round-robin among ties) and count the ticket"""
+        self._ensure_fresh()
+        with self._lock:
+            admin_id = self._pick(category, take_turn=True)
+            if admin_id is not None:
+                self._load[admin_id] += 1
+        return admin_id
+
+    def release(self, admin_ids):
+        """Uncount tickets choose() counted that were never stored (their write failed)"""
+        with self._lock:
+            for admin_id in admin_ids:
+                if self._load.get(admin_id):
+                    self._load[admin_id] -= 1
+
+    def reassign(self, previous_admin_ids, admin_id):
+        """Move one active ticket from each previous admin (None: unassigned) to admin_id"""
+        with self._lock:
+            for previous in previous_admin_ids:
+                if previous == admin_id:
+                    continue
+                if self._load.get(previous):
+                    self._load[previous] -= 1
+                if admin_id in self._load:
+                    self._load[admin_id] += 1
+
+    def suggest(self, category):
+        """The admin choose() would pick, without assigning"""
+        self._ensure_fresh()
+        with self._lock:
+            return self._pick(category, take_turn=False)
+
+    def candidates(self, category):
+        """Admin ids eligible for category with their current load"""
+        self._ensure_fresh()
+        with self._lock:
+            return {admin_id: self._load[admin_id] for admin_id in self._candidates(category)}
+
+    def loads(self):
+        with self._lock:
+            return dict(self._load)
+
+
+_tracker = None
+
+
+def init_routing(app):
+    """Create the process's load tracker from ROUTING_RULES / ROUTING_REFRESH_SECONDS"""
+    global _tracker
+    try:
+        rules = parse_rules(app.config.get('ROUTING_RULES'))
+    except (ValueError, AttributeError) as e:
+        logging.error(f"Invalid ROUTING_RULES, using the default rules: {e}")
+        rules = dict(DEFAULT_RULES)
+    _tracker = LoadTracker(rules, app.config.get('ROUTING_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS))
+
+
+def get_tracker():
+    return _tracker
+
+
+def auto_assign_enabled():
+    return _tracker is not None and current_app.config.get('AUTO_ASSIGN', True)
+
+
+def choose_assignee(category):
+    """Admin id a new ticket should be routed to, or None when auto-assignment is off"""
+    if not auto_assign_enabled():
+        return None
+    return _tracker.choose(category)
+
+
+def release_assignees(admin_ids):
+    """Give back the load choose_assignee counted for tickets whose write failed"""
+    if _tracker is not None:
+        _tracker.release([admin_id for admin_id in admin_ids if admin_id is not None])
+
+
+def record_reassignments(previous_assignees, assignee_id):
+    """Count reassigned active tickets against their new admin instead of the previous ones"""
+    if _tracker is not None:
+        _tracker.reassign(previous_assignees, assignee_id)
@@ -0,0 +1,259 @@
+import logging
+import re
+from sqlalchemy import Float, Integer, column, inspect, or_, select, text
+from app import db
+from models import Ticket
+
+# Title matches outrank description matches, which outrank comment matches
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0)
+
+SEARCH_TABLE = 'ticket_search'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE}
+        USING fts5(title, description, comments, tokenize='porter unicode61')""",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_search_ai AFTER INSERT ON tickets BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, title, description, comments)
+        VALUES (new.id, new.title, new.description, '');
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_search_au AFTER UPDATE OF title, description ON tickets BEGIN
+        UPDATE {SEARCH_TABLE} SET title = new.title, description = new.description
+        WHERE rowid = new.id;
+    END""",
+    # Archived tickets stay searchable: moving a ticket to archived_tickets
+    # deletes it and its comments here but keeps its index entry
+    "DROP TRIGGER IF EXISTS ticket_search_ad",
+    f"""CREATE TRIGGER ticket_search_ad AFTER DELETE ON tickets
+        WHEN NOT EXISTS (SELECT 1 FROM archived_tickets WHERE id = old.id) BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_search_comment_ai AFTER INSERT ON ticket_comments BEGIN
+        UPDATE {SEARCH_TABLE} SET comments = comments || ' ' || new.comment
+        WHERE rowid = new.ticket_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_search_comment_au AFTER UPDATE OF comment ON ticket_comments BEGIN
+        UPDATE {SEARCH_TABLE} SET comments = coalesce(
+            (SELECT group_concat(comment, ' ') FROM ticket_comments WHERE ticket_id = new.ticket_id), '')
+        WHERE rowid = new.ticket_id;
+    END""",
+    "DROP TRIGGER IF EXISTS ticket_search_comment_ad",
+    f"""CREATE TRIGGER ticket_search_comment_ad AFTER DELETE ON ticket_comments
+        WHEN NOT EXISTS (SELECT 1 FROM archived_tickets WHERE id = old.ticket_id) BEGIN
+        UPDATE {SEARCH_TABLE} SET comments = coalesce(
+            (SELECT group_concat(comment, ' ') FROM ticket_comments WHERE ticket_id = old.ticket_id), '')
+        WHERE rowid = old.ticket_id;
+    END""",
+]
+
+SQLITE_DROP_TRIGGERS = [
+    f"DROP TRIGGER IF EXISTS {name}" for name in (
+        'ticket_search_ai', 'ticket_search_au', 'ticket_search_ad',
+        'ticket_search_comment_ai', 'ticket_search_comment_au', 'ticket_search_comment_ad',
+    )
+]
+
+SQLITE_REBUILD = [
+    f"DELETE FROM {SEARCH_TABLE}",
+    f"""INSERT INTO {SEARCH_TABLE}(rowid, title, description, comments)
+        SELECT t.id, t.title, t.description,
+               coalesce((SELECT group_concat(c.comment, ' ') FROM ticket_comments c
+                         WHERE c.ticket_id = t.id), '')
+        FROM tickets t""",
+    f"""INSERT INTO {SEARCH_TABLE}(rowid, title, description, comments)
+        SELECT t.id, t.title, t.description,
+               coalesce((SELECT group_concat(c.comment, ' ') FROM archived_ticket_comments c
+                         WHERE c.ticket_id = t.id), '')
+        FROM archived_tickets t""",
+]
+
+POSTGRES_DOCUMENT_TEMPLATE = """
+    setweight(to_tsvector('english', coalesce(t.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(t.description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(
+        (SELECT string_agg(c.comment, ' ') FROM {comments} c WHERE c.ticket_id = t.id), '')), 'C')
+"""
+POSTGRES_DOCUMENT = POSTGRES_DOCUMENT_TEMPLATE.format(comments='ticket_comments')
+POSTGRES_ARCHIVED_DOCUMENT = POSTGRES_DOCUMENT_TEMPLATE.format(comments='archived_ticket_comments')
+
+POSTGRES_SETUP = [
+    # No foreign key to tickets: archived tickets keep their entries
+    f"""CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (
+        ticket_id INTEGER PRIMARY KEY,
+        document TSVECTOR NOT NULL
+    )""",
+    f"ALTER TABLE {SEARCH_TABLE} DROP CONSTRAINT IF EXISTS {SEARCH_TABLE}_ticket_id_fkey",
+    f"CREATE INDEX IF NOT EXISTS ix_ticket_search_document ON {SEARCH_TABLE} USING GIN (document)",
+    f"""CREATE OR REPLACE FUNCTION ticket_search_refresh(tid INTEGER) RETURNS void AS $$
+        INSERT INTO {SEARCH_TABLE} (ticket_id, document)
+        SELECT t.id, {POSTGRES_DOCUMENT} FROM tickets t WHERE t.id = tid
+        ON CONFLICT (ticket_id) DO UPDATE SET document = EXCLUDED.document;
+    $$ LANGUAGE sql""",
+    f"""CREATE OR REPLACE FUNCTION ticket_search_ticket_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            IF NOT EXISTS (SELECT 1 FROM archived_tickets WHERE id = OLD.id) THEN
+                DELETE FROM {SEARCH_TABLE} WHERE ticket_id = OLD.id;
+            END IF;
+        ELSE
+            PERFORM ticket_search_refresh(NEW.id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION ticket_search_comment_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            IF NOT EXISTS (SELECT 1 FROM archived_tickets WHERE id = OLD.ticket_id) THEN
+                PERFORM ticket_search_refresh(OLD.ticket_id);
+            END IF;
+        ELSE
+            PERFORM ticket_search_refresh(NEW.ticket_id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS ticket_search_ticket ON tickets",
+    """CREATE TRIGGER ticket_search_ticket AFTER INSERT OR UPDATE OF title, description OR DELETE ON tickets
+        FOR EACH ROW EXECUTE FUNCTION ticket_search_ticket_trigger()""",
+    "DROP TRIGGER IF EXISTS ticket_search_comment ON ticket_comments",
+    """CREATE TRIGGER ticket_search_comment AFTER INSERT OR UPDATE OR DELETE ON ticket_comments
+        FOR EACH ROW EXECUTE FUNCTION ticket_search_comment_trigger()""",
+]
+
+POSTGRES_DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS ticket_search_ticket ON tickets",
+    "DROP TRIGGER IF EXISTS ticket_search_comment ON ticket_comments",
+]
+
+POSTGRES_REBUILD = [
+    f"TRUNCATE {SEARCH_TABLE}",
+    f"INSERT INTO {SEARCH_TABLE} (ticket_id, document) SELECT t.id, {POSTGRES_DOCUMENT} FROM tickets t",
+    f"""INSERT INTO {SEARCH_TABLE} (ticket_id, document)
+        SELECT t.id, {POSTGRES_ARCHIVED_DOCUMENT} FROM archived_tickets t""",
+]
+
+_search_enabled = None
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _run(statements):
+    with db.engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+
+
+def install_search():
+    """Create the full-text index and its sync triggers, populating it on first install"""
+    global _search_enabled
+
+    dialect = _dialect()
+    if dialect not in ('sqlite', 'postgresql'):
+        logging.warning(f"Full-text search is not supported on {dialect}; using LIKE search")
+        _search_enabled = False
+        return False
+
+    is_new = not inspect(db.engine).has_table(SEARCH_TABLE)
+    try:
+        _run(SQLITE_SETUP if dialect == 'sqlite' else POSTGRES_SETUP)
+    except Exception as e:
+        logging.warning(f"Could not install full-text search, using LIKE search: {e}")
+        _search_enabled = False
+        return False
+
+    if is_new:
+        rebuild_search_index()
+
+    _search_enabled = True
+    return True
+
+
+def rebuild_search_index():
+    """Repopulate the full-text index from tickets and comments"""
+    _run(SQLITE_REBUILD if _dialect() == 'sqlite' else POSTGRES_REBUILD)
+    count = db.session.execute(text(f"SELECT count(*) FROM {SEARCH_TABLE}")).scalar()
+    logging.info(f"Search index rebuilt with {count} tickets")
+    return count
+
+
+def drop_search_triggers():
+    """Stop syncing the index, e.g. around a bulk load.
+
+    Call install_search() and rebuild_search_index() afterwards.
+    """
+    dialect = _dialect()
+    if dialect in ('sqlite', 'postgresql'):
+        _run(SQLITE_DROP_TRIGGERS if dialect == 'sqlite' else POSTGRES_DROP_TRIGGERS)
+
+
+def search_enabled():
+    global _search_enabled
+    if _search_enabled is None:
+        _search_enabled = inspect(db.engine).has_table(SEARCH_TABLE)
+    return _search_enabled
+
+
+def _tokens(search_query):
+    return _TOKEN_RE.findall(search_query.lower())
+
+
+def _match_expression(tokens):
+    """Build a prefix-matching full-text query where every term must match"""
+    if _dialect() == 'sqlite':
+        return ' '.join(f'"{token}"*' for token in tokens)
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def _ranked_matches(tokens):
+    """Subquery of (ticket_id, rank) for tickets matching every token, higher rank is better"""
+    if _dialect() == 'sqlite':
+        weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+        sql = text(
+            f"SELECT rowid AS ticket_id, -bm25({SEARCH_TABLE}, {weights}) AS rank "
+            f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :search_match"
+        )
+    else:
+        sql = text(
+            f"SELECT ticket_id, ts_rank(document, to_tsquery('english', :search_match)) AS rank "
+            f"FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('english', :search_match)"
+        )
+    sql = sql.bindparams(search_match=_match_expression(tokens))
+    return sql.columns(column('ticket_id', Integer), column('rank', Float)).subquery('search_matches')
+
+
+def _like_filter(search_query, model=Ticket):
+    return or_(model.title.contains(search_query), model.description.contains(search_query))
+
+
+def filter_matching(query, search_query, model=Ticket):
+    """Restrict a Ticket (or ArchivedTicket) query to tickets matching search_query, keeping its ordering"""
+    tokens = _tokens(search_query)
+    if not tokens:
+        return query
+    if not search_enabled():
+        return query.filter(_like_filter(search_query, model))
+
+    matches = _ranked_matches(tokens)
+    return query.filter(model.id.in_(select(matches.c.ticket_id)))
+
+
+def search_tickets(query, search_query, limit=50, model=Ticket):
+    """Return (ticket, rank) pairs from a Ticket (or ArchivedTicket) query, best match first"""
+    tokens = _tokens(search_query)
+    if not tokens:
+        return []
+    if not search_enabled():
+        tickets = query.filter(_like_filter(search_query, model)) \
+            .order_by(model.created_at.desc()).limit(limit).all()
+        return [(ticket, 0.0) for ticket in tickets]
+
+    matches = _ranked_matches(tokens)
+    rows = query.join(matches, model.id == matches.c.ticket_id) \
+        .add_columns(matches.c.rank) \
+        .order_by(matches.c.rank.desc(), model.created_at.desc()) \
+        .limit(limit).all()
+    return [(ticket, rank) for ticket, rank in rows]
@@ -0,0 +1,91 @@
+import logging
+from app import db
+from models import User
+from passwords import hash_passwords
+
+
+def create_default_admin():
+    """Create default admin and super admin users if none exists.
+
+    Returns True when the accounts were created.
+    """
+    try:
+        super_admin = User.query.filter_by(role='super_admin').first()
+        if not super_admin:
+            # (user, password) pairs; passwords are hashed together at the end
+            new_users = []
+            
+            # Create Super Admin
+            super_admin_user = User(
+                username='superadmin',
+                email='superadmin@gtnengineering.com',
+                first_name='Super',
+                last_name='Administrator',
+                department='IT',
+                role='super_admin',
+                is_admin=True
+            )
+            new_users.append((super_admin_user, 'super123'))
+            
+            # Create Hardware Admins
+            hardware_admins = [
+                {'username': 'yuvaraj', 'first_name': 'Yuvaraj', 'last_name': 'Admin'},
+                {'username': 'jayachandran', 'first_name': 'Jayachandran', 'last_name': 'Admin'},
+                {'username': 'narainkarthik', 'first_name': 'Narain', 'last_name': 'Karthik'}
+            ]
+            
+            for admin_data in hardware_admins:
+                admin_user = User(
+                    username=admin_data['username'],
+                    email=f"{admin_data['username']}@gtnengineering.com",
+                    first_name=admin_data['first_name'],
+                    last_name=admin_data['last_name'],
+                    department='IT Hardware',
+                    role='admin',
+                    is_admin=True
+                )
+                new_users.append((admin_user, 'admin123'))
+            
+            # Create Software Admins
+            software_admins = [
+                {'username': 'sathish', 'first_name': 'Sathish', 'last_name': 'SAP Admin'},
+                {'username': 'lakshmiprabha', 'first_name': 'Lakshmi', 'last_name': 'Prabha'}
+            ]
+            
+            for admin_data in software_admins:
+                admin_user = User(
+                    username=admin_data['username'],
+                    email=f"{admin_data['username']}@gtnengineering.com",
+                    first_name=admin_data['first_name'],
+                    last_name=admin_data['last_name'],
+                    department='IT Software',
+                    role='admin',
+                    is_admin=True
+                )
+                new_users.append((admin_user, 'admin123'))
+            
+            # Create a test user
+            test_user = User(
+                username='testuser',
+                email='user@gtnengineering.com',
+                first_name='Test',
+                last_name='User',
+                department='Engineering',
+                role='user',
+                is_admin=False
+            )
+            new_users.append((test_user, 'test123'))
+            
+            # Hash all passwords concurrently and insert in one transaction
+            hashes = hash_passwords([password for _, password in new_users])
+            for (new_user, _), password_hash in zip(new_users, hashes):
+                new_user.password_hash = password_hash
+                db.session.add(new_user)
+            db.session.commit()
+            
+            logging.info("Default super admin, admins and test user created")
+            return True
+    except Exception as e:
+        logging.error(f"Error creating default users: {e}")
+        db.session.rollback()
+    return False
@@ -0,0 +1,84 @@
+"""Minimal local SMTP server that accepts every message and stores it.
+
+Stands in for a mail server during development and load tests: run
+`flask smtp-sink` and point MAIL_SERVER/MAIL_PORT at it. Each message is
+written to the sink directory as <timestamp>-<n>.eml and logged.
+"""
+import itertools
+import logging
+import os
+import socketserver
+import time
+
+_counter = itertools.count(1)
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP (HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for smtplib"""
+
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self._reply("220 helpdesk smtp sink ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command[:4].upper()
+
+            if verb == 'EHLO':
+                self._reply("250-helpdesk smtp sink")
+                self._reply("250 8BITMIME")
+            elif verb == 'HELO':
+                self._reply("250 helpdesk smtp sink")
+            elif verb == 'MAIL':
+                recipients = []
+                self._reply("250 OK")
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[-1].strip(' <>'))
+                self._reply("250 OK")
+            elif verb == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                self._store(self._read_data(), recipients)
+                self._reply("250 OK queued")
+            elif verb in ('RSET', 'NOOP'):
+                recipients = [] if verb == 'RSET' else recipients
+                self._reply("250 OK")
+            elif verb == 'QUIT':
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+    def _read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b'.\r\n', b'.\n'):
+                break
+            # Undo dot-stuffing
+            lines.append(line[1:] if line.startswith(b'..') else line)
+        return b''.join(lines)
+
+    def _store(self, data, recipients):
+        directory = self.server.directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{time.time():.6f}-{next(_counter)}.eml")
+            with open(path, 'wb') as f:
+                f.write(data)
+        self.server.received += 1
+        logging.info(f"SMTP sink received message #{self.server.received} for {', '.join(recipients)}")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='localhost', port=1025, directory=None):
+        super().__init__((host, port), SMTPSinkHandler)
+        self.directory = directory
+        self.received = 0
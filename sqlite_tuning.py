@@ -0,0 +1,45 @@
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_SQLITE_SETTINGS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    'SQLITE_CACHE_SIZE_KB': 20000,
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+}
+
+_pragmas = None
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements applied to every new SQLite connection"""
+    settings = {key: config.get(key, default) for key, default in DEFAULT_SQLITE_SETTINGS.items()}
+    return [
+        f"PRAGMA journal_mode={settings['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={settings['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(settings['SQLITE_BUSY_TIMEOUT_MS'])}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size=-{int(settings['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size={int(settings['SQLITE_MMAP_SIZE'])}",
+    ]
+
+
+@event.listens_for(Engine, 'connect')
+def _apply_pragmas(dbapi_connection, connection_record):
+    if _pragmas is None or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma in _pragmas:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def init_sqlite_tuning(app):
+    """Tune SQLite for concurrent gunicorn workers (set SQLITE_TUNING=False to disable)"""
+    global _pragmas
+    if app.config.get('SQLITE_TUNING', True):
+        _pragmas = sqlite_pragmas(app.config)
+    else:
+        _pragmas = None
@@ -7,7 +7,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeTooltips();
     initializeFormValidation();
     initializeSearch();
-    initializeAutoRefresh();
+    initializeLiveUpdates();
     
     // Custom nl2br filter for displaying text with line breaks
     applyNl2br();
@@ -125,56 +125,101 @@ function initializeSearch() {
 }
 
 /**
- * Initialize auto-refresh for dashboards
+ * Live dashboard updates over server-sent events
  */
-function initializeAutoRefresh() {
-    // Auto-refresh dashboard every 30 seconds if on dashboard page
-    if (window.location.pathname.includes('dashboard')) {
-        let refreshInterval = setInterval(function() {
-            // Only refresh if user is still active (not idle)
-            if (document.hasFocus()) {
-                const currentTime = new Date().getTime();
-                const lastActivity = localStorage.getItem('lastActivity') || currentTime;
-                
-                // Refresh if user was active in the last 5 minutes
-                if (currentTime - lastActivity < 300000) {
-                    refreshDashboard();
-                }
-            }
-        }, 30000);
-        
-        // Track user activity
-        ['mousedown', 'mousemove', 'keypress', 'scroll', 'touchstart'].forEach(function(event) {
-            document.addEventListener(event, function() {
-                localStorage.setItem('lastActivity', new Date().getTime());
-            });
+const STATUS_CLASSES = {
+    'Open': 'primary',
+    'In Progress': 'info',
+    'Resolved': 'success',
+    'Closed': 'secondary'
+};
+
+const EVENT_MESSAGES = {
+    'ticket_created': 'New ticket',
+    'ticket_assigned': 'Ticket assigned',
+    'status_changed': 'Status changed',
+    'comment_added': 'New comment'
+};
+
+function initializeLiveUpdates() {
+    const container = document.querySelector('[data-live-events]');
+    if (!container || !window.EventSource) {
+        return;
+    }
+    
+    // The browser reconnects on its own when a stream ends and resumes from
+    // the last event id; a refused stream (503, server busy) is closed for
+    // good, so reopen it later from the last id seen
+    let source = null;
+    let lastEventId = null;
+
+    function connect() {
+        let url = container.dataset.liveEvents;
+        if (lastEventId !== null) {
+            url += (url.includes('?') ? '&' : '?') + 'last_event_id=' + encodeURIComponent(lastEventId);
+        }
+        source = new EventSource(url);
+        source.addEventListener('ticket', function(message) {
+            lastEventId = message.lastEventId;
+            applyTicketEvent(JSON.parse(message.data));
         });
-        
-        // Clear interval when page is unloaded
-        window.addEventListener('beforeunload', function() {
-            clearInterval(refreshInterval);
+        source.addEventListener('cursor', function(message) {
+            lastEventId = message.lastEventId;
+        });
+        source.addEventListener('error', function() {
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(connect, 15000);
+            }
         });
     }
+
+    connect();
+
+    window.addEventListener('beforeunload', function() {
+        source.close();
+    });
 }
 
 /**
- * Refresh dashboard data
+ * Update the ticket's row in place, or announce tickets not on this page
  */
-function refreshDashboard() {
-    const tables = document.querySelectorAll('.table');
-    tables.forEach(function(table) {
-        table.style.opacity = '0.8';
-    });
+function applyTicketEvent(event) {
+    const row = document.querySelector(`tr[data-ticket-id="${event.ticket_id}"]`);
     
-    // Simulate data refresh (in a real app, this would be an AJAX call)
-    setTimeout(function() {
-        tables.forEach(function(table) {
-            table.style.opacity = '1';
-        });
+    if (row) {
+        const status = row.querySelector('[data-live="status"]');
+        if (status && status.textContent.trim() !== event.status) {
+            status.textContent = event.status;
+            status.className = `badge bg-${STATUS_CLASSES[event.status] || 'secondary'}`;
+        }
         
-        // Show refresh notification
-        showNotification('Dashboard updated', 'info');
-    }, 1000);
+        if (event.comment_count) {
+            let comments = row.querySelector('[data-live="comments"]');
+            if (!comments && row.cells.length > 1) {
+                comments = document.createElement('span');
+                comments.className = 'badge bg-light text-dark';
+                comments.dataset.live = 'comments';
+                row.cells[1].appendChild(comments);
+            }
+            if (comments) {
+                comments.innerHTML = `<i class="ri-chat-3-line"></i> ${event.comment_count}`;
+            }
+        }
+        
+        row.classList.add('table-warning');
+        setTimeout(function() {
+            row.classList.remove('table-warning');
+        }, 3000);
+    }
+    
+    const label = EVENT_MESSAGES[event.type] || 'Ticket updated';
+    showNotification(`${label}: <a href="/ticket/${event.ticket_id}">${event.ticket_number}</a> ${escapeHtml(event.title)}`, 'info');
+}
+
+function escapeHtml(text) {
+    const element = document.createElement('div');
+    element.textContent = text;
+    return element.innerHTML;
 }
 
 /**
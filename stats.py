@@ -0,0 +1,125 @@
+from dataclasses import dataclass, field
+from sqlalchemy import func
+from app import db
+from models import User, Ticket, ArchivedTicket
+
+TICKET_STATUSES = ['Open', 'In Progress', 'Resolved', 'Closed']
+# Statuses that carry a resolved_at time
+RESOLVED_STATUSES = ('Resolved', 'Closed')
+TICKET_CATEGORIES = ['Hardware', 'Software', 'Network', 'Other']
+TICKET_PRIORITIES = ['Low', 'Medium', 'High', 'Critical']
+USER_ROLES = ['user', 'admin', 'super_admin']
+
+
+@dataclass
+class TicketStats:
+    """Snapshot of ticket and user breakdowns built from grouped queries"""
+    total: int = 0
+    by_status: dict = field(default_factory=dict)
+    by_category: dict = field(default_factory=dict)
+    by_priority: dict = field(default_factory=dict)
+    by_role: dict = field(default_factory=dict)
+
+    def status(self, name):
+        return self.by_status.get(name, 0)
+
+    def category(self, name):
+        return self.by_category.get(name, 0)
+
+    def priority(self, name):
+        return self.by_priority.get(name, 0)
+
+    def role(self, name):
+        return self.by_role.get(name, 0)
+
+    # Names used by the dashboard templates
+    @property
+    def total_tickets(self):
+        return self.total
+
+    @property
+    def open_tickets(self):
+        return self.status('Open')
+
+    @property
+    def in_progress_tickets(self):
+        return self.status('In Progress')
+
+    @property
+    def resolved_tickets(self):
+        return self.status('Resolved')
+
+    @property
+    def closed_tickets(self):
+        return self.status('Closed')
+
+    @property
+    def total_users(self):
+        return self.role('user')
+
+    @property
+    def total_admins(self):
+        return self.role('admin')
+
+    @property
+    def hardware_tickets(self):
+        return self.category('Hardware')
+
+    @property
+    def software_tickets(self):
+        return self.category('Software')
+
+    @property
+    def network_tickets(self):
+        return self.category('Network')
+
+    @property
+    def other_tickets(self):
+        return self.category('Other')
+
+
+def _empty_counts(keys):
+    return {key: 0 for key in keys}
+
+
+def _ticket_breakdown(filters=(), include_archived=False):
+    """Run one GROUP BY over tickets (and the archive) and roll it up into a TicketStats"""
+    stats = TicketStats(
+        by_status=_empty_counts(TICKET_STATUSES),
+        by_category=_empty_counts(TICKET_CATEGORIES),
+        by_priority=_empty_counts(TICKET_PRIORITIES),
+    )
+
+    query = db.session.query(
+        Ticket.status, Ticket.category, Ticket.priority, func.count(Ticket.id)
+    ).filter(*filters).group_by(Ticket.status, Ticket.category, Ticket.priority)
+    if include_archived:
+        query = query.union_all(db.session.query(
+            ArchivedTicket.status, ArchivedTicket.category, ArchivedTicket.priority, func.count(ArchivedTicket.id)
+        ).group_by(ArchivedTicket.status, ArchivedTicket.category, ArchivedTicket.priority))
+    rows = query.all()
+
+    for status, category, priority, count in rows:
+        stats.total += count
+        stats.by_status[status] = stats.by_status.get(status, 0) + count
+        stats.by_category[category] = stats.by_category.get(category, 0) + count
+        stats.by_priority[priority] = stats.by_priority.get(priority, 0) + count
+
+    return stats
+
+
+def get_system_stats():
+    """Ticket and user breakdowns for the super admin dashboard, archived tickets included (two queries)"""
+    stats = _ticket_breakdown(include_archived=True)
+
+    stats.by_role = _empty_counts(USER_ROLES)
+    rows = db.session.query(User.role, func.count(User.id)).group_by(User.role).all()
+    for role, count in rows:
+        stats.by_role[role] = count
+
+    return stats
+
+
+def get_admin_stats(admin_id):
+    """Breakdown of tickets assigned to one admin (one query)"""
+    return _ticket_breakdown((Ticket.assigned_to == admin_id,))
@@ -0,0 +1,48 @@
+import io
+import os
+import time
+import pytest
+from avatars import ImageStore, ImageUploadError, image_type
+
+
+class TrickleStream:
+    """Returns a few bytes per read, as a slow upload can"""
+
+    def __init__(self, data, step=3):
+        self.data = io.BytesIO(data)
+        self.step = step
+
+    def read(self, size=-1):
+        return self.data.read(min(size, self.step))
+
+
+def _png():
+    PIL = pytest.importorskip('PIL.Image')
+    data = io.BytesIO()
+    PIL.new('RGB', (300, 200), 'red').save(data, 'PNG')
+    return data.getvalue()
+
+
+def test_type_checked_on_buffered_head(tmp_path):
+    store = ImageStore(str(tmp_path))
+    digest = store.save(TrickleStream(_png()))
+    assert image_type(open(store.path(digest), 'rb').read(16)) == 'image/png'
+
+    with pytest.raises(ImageUploadError):
+        store.save(TrickleStream(b'<html>not an image at all</html>'))
+    with pytest.raises(ImageUploadError):
+        store.save(TrickleStream(b'GIF'))
+
+
+def test_stored_skips_recent_images(tmp_path):
+    store = ImageStore(str(tmp_path))
+    digest = store.save(io.BytesIO(_png()))
+    assert store.stored() == {digest}
+    assert store.stored(older_than=3600) == set()
+
+    old = time.time() - 7200
+    os.utime(store.path(digest), (old, old))
+    assert store.stored(older_than=3600) == {digest}
+    # Saving the same image again restarts its grace period
+    store.save(io.BytesIO(_png()))
+    assert store.stored(older_than=3600) == set()
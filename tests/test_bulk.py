@@ -0,0 +1,55 @@
+import warnings
+import pytest
+from app import create_app, db
+from bulk import BulkOperationError, run_bulk_operation, select_ticket_ids
+from models import User, Ticket
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('HELPDESK_DATABASE_URL', f"sqlite:///{tmp_path / 'bulk.db'}")
+    app = create_app({'OUTBOX_WORKER': False, 'ANALYTICS_ROLLUP_SECONDS': 0})
+    with app.app_context():
+        db.create_all()
+        user = User(username='user', email='user@example.com', first_name='U', last_name='Ser', role='user')
+        user.password_hash = 'x'
+        db.session.add(user)
+        db.session.flush()
+        for n in range(12):
+            db.session.add(Ticket(title=f"Ticket {n}", description='Description', category='Other',
+                                  priority='Low', user_id=user.id, user_name='U Ser'))
+        db.session.commit()
+        yield app
+
+
+def test_ticket_ids_must_be_a_list(app):
+    with pytest.raises(BulkOperationError):
+        select_ticket_ids('12')
+    with pytest.raises(BulkOperationError):
+        select_ticket_ids([True])
+    assert select_ticket_ids([12, '3', 99]) == ([3, 12], [99])
+
+
+def test_assign_without_assignee(app):
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        for assigned_to in (None, 'abc', True):
+            with pytest.raises(BulkOperationError):
+                run_bulk_operation('assign', ticket_ids=[1, 2], assigned_to=assigned_to)
+
+
+def test_assign_skips_resolved_and_closed(app):
+    with app.app_context():
+        admin = User(username='admin', email='admin@example.com', first_name='A', last_name='Dmin', role='admin',
+                     is_admin=True)
+        admin.password_hash = 'x'
+        db.session.add(admin)
+        db.session.get(Ticket, 2).status = 'Resolved'
+        db.session.get(Ticket, 3).status = 'Closed'
+        db.session.commit()
+
+        results = run_bulk_operation('assign', ticket_ids=[1, 2, 3, 99], assigned_to=admin.id)
+
+        assert results == {1: 'updated', 2: 'skipped', 3: 'skipped', 99: 'not_found'}
+        assert [(t.assigned_to, t.status) for t in Ticket.query.filter(Ticket.id.in_([1, 2, 3])).order_by(Ticket.id)] \
+            == [(admin.id, 'In Progress'), (None, 'Resolved'), (None, 'Closed')]
@@ -0,0 +1,50 @@
+import pickle
+import page_cache
+from page_cache import LRUCache, RedisCache, TICKETS_VERSION_KEY
+
+
+class FakeRedis:
+    """Stores bytes the way Redis does: incr keeps a plain integer, not a pickle"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def incr(self, key):
+        value = int(self.data.get(key, b'0')) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+
+def test_redis_version_after_incr():
+    cache = RedisCache(None, client=FakeRedis())
+    assert cache.version(TICKETS_VERSION_KEY) == 0
+    cache.incr(TICKETS_VERSION_KEY)
+    cache.incr(TICKETS_VERSION_KEY)
+    assert cache.version(TICKETS_VERSION_KEY) == 2
+
+
+def test_redis_values_are_pickled():
+    client = FakeRedis()
+    cache = RedisCache(None, client=client)
+    cache.set('page', '<html>')
+    assert client.data['gtn:page'] == pickle.dumps('<html>')
+    assert cache.get('page') == '<html>'
+    assert cache.get('missing') is None
+
+
+def test_dashboard_key_changes_after_write(monkeypatch):
+    for cache in (RedisCache(None, client=FakeRedis()), LRUCache()):
+        monkeypatch.setattr(page_cache, '_cache', cache)
+        before = page_cache.dashboard_cache_key('user', 1, {'status': 'Open'})
+        page_cache.invalidate_tickets()
+        after = page_cache.dashboard_cache_key('user', 1, {'status': 'Open'})
+        assert before != after
@@ -0,0 +1,23 @@
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from passwords import needs_rehash
+
+
+def _app(method):
+    app = Flask(__name__)
+    app.config['PASSWORD_HASH_METHOD'] = method
+    return app
+
+
+def test_short_method_name_does_not_rehash():
+    with _app('pbkdf2:sha256').app_context():
+        assert not needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256'))
+    with _app('scrypt').app_context():
+        assert not needs_rehash(generate_password_hash('secret', 'scrypt'))
+
+
+def test_changed_cost_rehashes():
+    with _app('pbkdf2:sha256:2000').app_context():
+        assert not needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:2000'))
+        assert needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+        assert needs_rehash(generate_password_hash('secret', 'scrypt'))
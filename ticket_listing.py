@@ -0,0 +1,140 @@
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, or_
+from models import Ticket
+from search import filter_matching
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+# Keyset sort orders: newest tickets, or most recent comment activity
+SORT_COLUMNS = {
+    'created': 'created_at',
+    'activity': 'last_comment_at',
+}
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+@dataclass
+class TicketPage:
+    """One keyset page of tickets, newest first"""
+    tickets: list
+    next_cursor: str = None
+    page_size: int = DEFAULT_PAGE_SIZE
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(ticket, sort='created'):
+    """Encode the (sort key, id) position of a ticket as an opaque token"""
+    raw = f"{getattr(ticket, SORT_COLUMNS[sort]).isoformat()}|{ticket.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a token produced by encode_cursor back into (sort key, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, ticket_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(sort_value), int(ticket_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def read_filters(args):
+    """Pull the dashboard filter parameters out of a request args mapping"""
+    return {
+        'status': args.get('status', 'all'),
+        'priority': args.get('priority', 'all'),
+        'category': args.get('category', 'all'),
+        'search': args.get('search', ''),
+    }
+
+
+def read_sort(args):
+    """Pull the listing sort order out of a request args mapping"""
+    sort = args.get('sort', 'created')
+    return sort if sort in SORT_COLUMNS else 'created'
+
+
+def apply_filters(query, status='all', priority='all', category='all', search='', model=Ticket):
+    """Apply the dashboard filters to a Ticket (or ArchivedTicket) query"""
+    if status != 'all':
+        query = query.filter(model.status == status)
+
+    if priority != 'all':
+        query = query.filter(model.priority == priority)
+
+    if category != 'all':
+        query = query.filter(model.category == category)
+
+    if search:
+        query = filter_matching(query, search, model)
+
+    return query
+
+
+def get_page_size(requested=None):
+    """Resolve the page size from the request, falling back to app config"""
+    default = current_app.config.get('TICKETS_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    try:
+        size = int(requested) if requested else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate(query, cursor=None, page_size=None, sort='created'):
+    """Return the page of tickets that follows cursor, ordered by (sort key, id) descending.
+
+    sort='activity' orders by last comment and lists only tickets that have comments.
+    """
+    page_size = page_size or get_page_size()
+    sort_column = getattr(Ticket, SORT_COLUMNS[sort])
+
+    if sort == 'activity':
+        query = query.filter(sort_column.isnot(None))
+
+    if cursor:
+        sort_value, ticket_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, Ticket.id < ticket_id)
+        ))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(sort_column.desc(), Ticket.id.desc()).limit(page_size + 1).all()
+
+    tickets = rows[:page_size]
+    next_cursor = encode_cursor(tickets[-1], sort) if len(rows) > page_size else None
+    return TicketPage(tickets=tickets, next_cursor=next_cursor, page_size=page_size)
+
+
+def ticket_to_dict(ticket):
+    """Serialize a ticket for the JSON listing API"""
+    return {
+        'id': ticket.id,
+        'ticket_number': ticket.ticket_number,
+        'title': ticket.title,
+        'category': ticket.category,
+        'priority': ticket.priority,
+        'status': ticket.status,
+        'user_id': ticket.user_id,
+        'user_name': ticket.user_name,
+        'assigned_to': ticket.assigned_to,
+        'created_at': ticket.created_at.isoformat() if ticket.created_at else None,
+        'updated_at': ticket.updated_at.isoformat() if ticket.updated_at else None,
+        'resolved_at': ticket.resolved_at.isoformat() if ticket.resolved_at else None,
+        'comment_count': ticket.comment_count,
+        'last_comment_at': ticket.last_comment_at.isoformat() if ticket.last_comment_at else None,
+        'last_commenter_id': ticket.last_commenter_id,
+        'duplicate_of': ticket.duplicate_of,
+        'archived': ticket.is_archived,
+    }
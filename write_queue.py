@@ -0,0 +1,120 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app import db
+from db_routing import mark_write
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_BATCH_WAIT_MS = 2
+DEFAULT_RESULT_TIMEOUT = 30
+
+
+class WriteQueue:
+    """Serialize database writes on one thread and group them into shared transactions.
+
+    Each job is a callable taking a SQLAlchemy Connection. Jobs that arrive
+    within batch_wait_ms of each other (up to batch_size) are committed
+    together; if any job in a batch fails, the batch is rolled back and its
+    jobs are retried one transaction each so a bad job only fails itself.
+
+    The queue belongs to one process: it serializes the writes of that
+    process's request threads, but gunicorn workers each have their own
+    and still contend for the database lock through busy_timeout.
+    """
+
+    def __init__(self, engine, batch_size=DEFAULT_BATCH_SIZE, batch_wait_ms=DEFAULT_BATCH_WAIT_MS):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        future = Future()
+        self._jobs.put((job, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self._jobs.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch):
+        results = []
+        with self.engine.begin() as conn:
+            for job, _ in batch:
+                results.append(job(conn))
+        return results
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self._run_batch(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                logging.warning(f"Write batch of {len(batch)} failed; retrying jobs individually")
+                for item in batch:
+                    self._run_single(item)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _run_single(self, item):
+        job, future = item
+        try:
+            future.set_result(self._run_batch([item])[0])
+        except Exception as e:
+            future.set_exception(e)
+
+
+_write_queue = None
+
+
+def init_write_queue(app):
+    """Start the write queue when SQLITE_WRITE_QUEUE is enabled for a SQLite database"""
+    global _write_queue
+    if not app.config.get('SQLITE_WRITE_QUEUE', False):
+        return None
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            logging.info("SQLITE_WRITE_QUEUE ignored for non-SQLite database")
+            return None
+        _write_queue = WriteQueue(
+            db.engine,
+            batch_size=app.config.get('SQLITE_WRITE_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+            batch_wait_ms=app.config.get('SQLITE_WRITE_BATCH_WAIT_MS', DEFAULT_BATCH_WAIT_MS),
+        )
+    return _write_queue
+
+
+def run_write(job):
+    """Run job(connection) in a write transaction and return its result.
+
+    Goes through the write queue when enabled, otherwise runs on the
+    request's session and commits it.
+    """
+    mark_write()
+    if _write_queue is not None:
+        return _write_queue.submit(job).result(timeout=DEFAULT_RESULT_TIMEOUT)
+
+    try:
+        result = job(db.session.connection())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result